@@ -0,0 +1 @@
+"""Benchmarks of check-gha-pinning against synthetic workflows and a fake `git ls-remote`. See `run.py`."""
@@ -0,0 +1,70 @@
+"""Synthetic workflow corpora and the tags of the repos they use."""
+
+import hashlib
+import pathlib
+from typing import NamedTuple
+
+
+class Scale(NamedTuple):
+    files: int
+    steps: int
+    repos: int
+    tags: int
+
+
+def repo_name(index: int) -> str:
+    return f"org{index}/action{index}"
+
+
+def tags(count: int) -> dict[str, str]:
+    """`count` release tags (`v1.0.0`, `v1.0.1`, ...) plus a major tag pointing at the latest release of its major.
+
+    Maps each tag to the release whose commit it points to.
+    """
+    releases = [f"v{k // 100 + 1}.{k // 10 % 10}.{k % 10}" for k in range(count)]
+    majors = {release.split(".")[0]: release for release in releases}
+    return majors | {release: release for release in releases}
+
+
+def commit(repo: str, tag: str) -> str:
+    return hashlib.sha1(f"{repo}@{tag}".encode()).hexdigest()
+
+
+def ls_remote_lines(repo: str, count: int) -> list[str]:
+    """The `git ls-remote --tags` output of a repo with `count` releases. Every other tag is annotated."""
+    lines = []
+    for i, (tag, release) in enumerate(tags(count).items()):
+        if i % 2:
+            lines.append(f"{commit(repo, 'tag object ' + tag)}\trefs/tags/{tag}")
+            lines.append(f"{commit(repo, release)}\trefs/tags/{tag}^{{}}")
+        else:
+            lines.append(f"{commit(repo, release)}\trefs/tags/{tag}")
+    return lines
+
+
+def _step(index: int, scale: Scale) -> str:
+    repo = repo_name(index % scale.repos)
+    kind = index % 10
+    if kind == 7:
+        return f"      - uses: {repo}@{commit(repo, 'v1.0.0')} # v1.0.0\n"
+    if kind == 8:
+        return "      - uses: docker://alpine:3.19\n"
+    if kind == 9:
+        return f"      - uses: {repo}@main # noqa: gha-pinning\n"
+    return f"      - name: Step {index}\n        uses: {repo}@v1\n        with:\n          arg: '{index}'\n"
+
+
+def generate(directory: pathlib.Path, scale: Scale) -> int:
+    """Write `scale.files` workflows with `scale.steps` steps each into `directory`. Returns the number of `uses`."""
+    directory.mkdir(parents=True, exist_ok=True)
+    uses = 0
+    for f in range(scale.files):
+        steps = []
+        for s in range(scale.steps):
+            steps.append(_step(f * scale.steps + s, scale))
+            uses += "noqa" not in steps[-1]
+        text = (
+            f"name: Workflow {f}\non: [push, pull_request]\njobs:\n  build:\n    runs-on: ubuntu-latest\n    steps:\n"
+        )
+        (directory / f"workflow{f}.yml").write_text(text + "".join(steps))
+    return uses
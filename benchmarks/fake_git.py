@@ -0,0 +1,53 @@
+"""Stand-in for `git` that answers `git ls-remote` from the synthetic tags of `corpus.py`.
+
+Configured through the environment:
+
+- `FAKE_GIT_LATENCY`: seconds every `ls-remote` call takes (default: 0)
+- `FAKE_GIT_TAGS`: number of release tags of every repo (default: 100)
+- `FAKE_GIT_REAL`: the real `git`, which runs every other command
+
+Repos named `missing*` don't exist.
+"""
+
+import fnmatch
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import corpus  # noqa: E402
+
+
+def _matches(ref: str, patterns: list[str]) -> bool:
+    # Like git, a pattern matches a ref if it matches the ref's end at a path component boundary.
+    return not patterns or any(fnmatch.fnmatchcase(ref, p) or fnmatch.fnmatchcase(ref, f"*/{p}") for p in patterns)
+
+
+def ls_remote(args: list[str]) -> int:
+    positional = [arg for arg in args if not arg.startswith("-")]
+    url, patterns = positional[0], positional[1:]
+    time.sleep(float(os.getenv("FAKE_GIT_LATENCY", 0)))
+    repo = url.removeprefix("https://github.com/")
+    if repo.split("/")[-1].startswith("missing"):
+        print(f"remote: Repository not found.\nfatal: repository '{url}' not found", file=sys.stderr)
+        return 128
+    lines = [
+        line
+        for line in corpus.ls_remote_lines(repo, int(os.getenv("FAKE_GIT_TAGS", 100)))
+        if _matches(line.split("\t")[1], patterns)
+    ]
+    if lines:
+        print("\n".join(lines))
+    return 2 if not lines and "--exit-code" in args else 0
+
+
+def main() -> int:
+    args = sys.argv[1:]
+    if args[:1] == ["ls-remote"]:
+        return ls_remote(args[1:])
+    os.execv(os.environ["FAKE_GIT_REAL"], ["git", *args])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Measure the memory the looked up tags of a repo with many tags take, and check that the index stays compact.
+
+    python -m benchmarks.memory                    # a synthetic repo with 50000 releases
+    python -m benchmarks.memory --tags 100000
+
+Parses the same `git ls-remote --tags` output into the `ActionTags` the checks use, and into the dicts of tag names
+and of commits with lists of tags they used before, and reports the memory each keeps (and needed at the peak) as
+measured by `tracemalloc`. Exits with 1 if the index keeps more than `--max-ratio` of what the dicts keep.
+"""
+
+import argparse
+import os
+import re
+import sys
+import tracemalloc
+from collections.abc import Callable
+from typing import NamedTuple
+
+from benchmarks import corpus
+from check_gha_pinning import _TAG_REF, _lines, _parse_ls_remote_tags
+
+MAX_RATIO = 0.5
+
+
+class Usage(NamedTuple):
+    retained: int
+    peak: int
+
+
+def dict_tags(output: str) -> tuple[dict[str, str], dict[str, list[str]]]:
+    """The tags as dicts, built from all lines at once like before the index."""
+    by_tag: dict[str, str] = {}
+    for line in output.splitlines():
+        sha, ref = line.split("\t")
+        match = re.match(_TAG_REF, ref)
+        if match and (match.group(2) or match.group(1) not in by_tag):
+            by_tag[match.group(1)] = sha
+    by_sha: dict[str, list[str]] = {}
+    for tag, sha in by_tag.items():
+        by_sha.setdefault(sha, []).append(tag)
+    return by_tag, by_sha
+
+
+def usage(build: Callable[[], object]) -> Usage:
+    tracemalloc.start()
+    try:
+        result = build()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return Usage(retained, peak)
+
+
+def measure(tags: int) -> dict[str, Usage]:
+    output = "\n".join(corpus.ls_remote_lines(corpus.repo_name(0), tags))
+    return {
+        "dicts": usage(lambda: dict_tags(output)),
+        "index": usage(lambda: _parse_ls_remote_tags(_lines(output))),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.memory", description=__doc__.splitlines()[0])
+    parser.add_argument("--tags", type=int, default=50_000, help="releases of the repo (default: %(default)s)")
+    parser.add_argument(
+        "--max-ratio",
+        type=float,
+        default=MAX_RATIO,
+        help="part of the memory of the dicts the index may keep (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+
+    results = measure(args.tags)
+    for name, result in results.items():
+        print(f"{name:<8} {result.retained / 1e6:>8.2f} MB kept, {result.peak / 1e6:>8.2f} MB peak")
+    ratio = results["index"].retained / results["dicts"].retained
+    print(f"the index keeps {ratio:.0%} of the memory of the dicts")
+    if ratio > args.max_ratio:
+        print(f"regression: the index keeps more than {args.max_ratio:.0%} of the memory of the dicts", file=sys.stderr)
+        return 1
+    return os.EX_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
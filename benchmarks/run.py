@@ -0,0 +1,186 @@
+"""Run the benchmarks and compare them against a stored baseline.
+
+    python -m benchmarks.run                       # all scenarios, compared to benchmarks/baseline.json
+    python -m benchmarks.run -s small -s tags      # some scenarios
+    python -m benchmarks.run --update-baseline     # store the results as the new baseline
+
+Every scenario generates a corpus, puts the fake `git` of `fake_git.py` on the PATH and runs `main` (or
+`check_pinning` for each file) in this process. Throughput is the best of `--repeat` runs, peak memory is measured with
+`tracemalloc` in a separate run. Exits with 1 if a scenario is slower or needs more memory than the baseline allows.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Iterator
+from typing import NamedTuple
+from unittest.mock import patch
+
+import check_gha_pinning
+from benchmarks.corpus import Scale, generate
+
+BASELINE = pathlib.Path(__file__).with_name("baseline.json")
+FAKE_GIT = pathlib.Path(__file__).with_name("fake_git.py")
+
+
+class Scenario(NamedTuple):
+    scale: Scale
+    latency: float = 0.0
+    args: tuple[str, ...] = ("--no-cache",)
+    # Run once before measuring, e.g. to fill the caches.
+    prime: bool = False
+    # Call `check_pinning` for every file with a shared resolver instead of running `main`.
+    api: bool = False
+
+
+SCENARIOS = {
+    "small": Scenario(Scale(files=20, steps=10, repos=10, tags=50), latency=0.01),
+    "many-files": Scenario(Scale(files=500, steps=20, repos=50, tags=100), latency=0.01),
+    "long-files": Scenario(Scale(files=10, steps=1000, repos=20, tags=100), latency=0.01),
+    "many-tags": Scenario(Scale(files=50, steps=10, repos=20, tags=5000), latency=0.01),
+    "slow-remote": Scenario(Scale(files=50, steps=10, repos=50, tags=100), latency=0.2),
+    "fast-engine": Scenario(Scale(files=500, steps=20, repos=50, tags=100), args=("--no-cache", "--engine", "fast")),
+    "warm-cache": Scenario(Scale(files=500, steps=20, repos=50, tags=100), latency=0.2, args=(), prime=True),
+    "api": Scenario(Scale(files=200, steps=20, repos=50, tags=100), latency=0.01, api=True),
+}
+
+
+class Result(NamedTuple):
+    files: int
+    uses: int
+    seconds: float
+    peak_memory: int
+    subprocesses: int
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.seconds
+
+    @property
+    def uses_per_second(self) -> float:
+        return self.uses / self.seconds
+
+    def as_dict(self) -> dict:
+        return {
+            "files_per_second": round(self.files_per_second, 1),
+            "uses_per_second": round(self.uses_per_second, 1),
+            "peak_memory": self.peak_memory,
+            "subprocesses": self.subprocesses,
+        }
+
+
+@contextlib.contextmanager
+def fake_git(latency: float, tags: int) -> Iterator[None]:
+    """Put a `git` that answers `ls-remote` from the synthetic corpus first on the PATH."""
+    real_git = shutil.which("git")
+    with tempfile.TemporaryDirectory() as bin_dir:
+        wrapper = pathlib.Path(bin_dir) / "git"
+        wrapper.write_text(f'#!/bin/sh\nexec "{sys.executable}" -S "{FAKE_GIT}" "$@"\n')
+        wrapper.chmod(0o755)
+        env = {
+            "PATH": f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+            "FAKE_GIT_LATENCY": str(latency),
+            "FAKE_GIT_TAGS": str(tags),
+            "FAKE_GIT_REAL": real_git or "git",
+        }
+        with patch.dict(os.environ, env):
+            yield
+
+
+def _run_once(scenario: Scenario, corpus: pathlib.Path) -> check_gha_pinning.Stats:
+    stats = check_gha_pinning.Stats()
+    with check_gha_pinning.collect_stats(stats), contextlib.redirect_stdout(io.StringIO()):
+        if scenario.api:
+            resolver = check_gha_pinning.TagResolver()
+            for file in sorted(corpus.iterdir()):
+                check_gha_pinning.check_pinning(file, resolver)
+        else:
+            with patch.object(sys, "argv", ["check-gha-pinning", *scenario.args, str(corpus)]):
+                check_gha_pinning.main()
+    return stats
+
+
+def run(scenario: Scenario, repeat: int = 3) -> Result:
+    with tempfile.TemporaryDirectory() as tmp, fake_git(scenario.latency, scenario.scale.tags):
+        corpus = pathlib.Path(tmp) / "workflows"
+        uses = generate(corpus, scenario.scale)
+        with patch.dict(os.environ, {"GHA_PINNING_CACHE_DIR": str(pathlib.Path(tmp) / "cache")}):
+            if scenario.prime:
+                _run_once(scenario, corpus)
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                stats = _run_once(scenario, corpus)
+                best = min(best, time.perf_counter() - start)
+
+            tracemalloc.start()
+            try:
+                _run_once(scenario, corpus)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+    return Result(scenario.scale.files, uses, best, peak, stats.counters.get("subprocesses", 0))
+
+
+def regressions(name: str, result: dict, baseline: dict, tolerance: float) -> list[str]:
+    found = []
+    for key in ("files_per_second", "uses_per_second"):
+        if result[key] < baseline[key] * (1 - tolerance):
+            found.append(f"{name}: {key} dropped from {baseline[key]} to {result[key]}")
+    if result["peak_memory"] > baseline["peak_memory"] * (1 + tolerance):
+        found.append(f"{name}: peak_memory grew from {baseline['peak_memory']} to {result['peak_memory']}")
+    if result["subprocesses"] > baseline["subprocesses"]:
+        found.append(f"{name}: subprocesses grew from {baseline['subprocesses']} to {result['subprocesses']}")
+    return found
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.splitlines()[0])
+    parser.add_argument("-s", "--scenario", action="append", choices=SCENARIOS, help="scenarios to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per scenario (default: %(default)s)")
+    parser.add_argument("--baseline", type=pathlib.Path, default=BASELINE, help="baseline file (default: %(default)s)")
+    parser.add_argument("--update-baseline", action="store_true", help="store the results in the baseline file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.3,
+        help="fraction by which throughput may drop or peak memory may grow before it counts as a regression "
+        "(default: %(default)s)",
+    )
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    results = {}
+    problems = []
+    for name in args.scenario or SCENARIOS:
+        results[name] = run(SCENARIOS[name], args.repeat).as_dict()
+        if not args.json:
+            r = results[name]
+            print(
+                f"{name:<12} {r['files_per_second']:>10.1f} files/s {r['uses_per_second']:>10.1f} uses/s "
+                f"{r['peak_memory'] / 2**20:>8.1f} MiB peak {r['subprocesses']:>5} subprocesses",
+                flush=True,
+            )
+        if name in baseline and not args.update_baseline:
+            problems += regressions(name, results[name], baseline[name], args.tolerance)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(baseline | results, indent=2, sort_keys=True) + "\n")
+    for problem in problems:
+        print(f"regression: {problem}", file=sys.stderr)
+    return 1 if problems else os.EX_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
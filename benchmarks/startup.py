@@ -0,0 +1,104 @@
+"""Measure how long `check-gha-pinning` takes to start, and check that it stays under a target.
+
+    python -m benchmarks.startup                   # import time and a run on a file without `uses`
+    python -m benchmarks.startup --target 0.02     # fail if importing the package takes longer than 20 ms
+
+Every measurement starts a fresh interpreter with warm bytecode caches. Exits with 1 if importing the package takes
+longer than `--target` seconds, or if startup imports a module of `HEAVY_MODULES`.
+"""
+
+import argparse
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).parent.parent
+# Imported lazily, only by the runs that need them.
+HEAVY_MODULES = (
+    "ruamel.yaml",
+    "subprocess",
+    "concurrent.futures",
+    "importlib.metadata",
+    "http.client",
+    "sqlite3",
+    "socket",
+    "check_gha_pinning._scan",
+)
+TARGET = 0.03
+
+_RUN = f"""\
+import sys
+sys.argv = ["check-gha-pinning", "--no-cache", *sys.argv[1:]]
+from check_gha_pinning import main
+main()
+print(",".join(name for name in {HEAVY_MODULES!r} if name in sys.modules), file=sys.stderr)
+"""
+
+
+def _python(args: list[str], pycache: str) -> subprocess.CompletedProcess:
+    env = {key: value for key, value in os.environ.items() if key != "PYTHONDONTWRITEBYTECODE"}
+    env |= {"PYTHONPATH": str(ROOT), "PYTHONPYCACHEPREFIX": pycache}
+    return subprocess.run([sys.executable, *args], env=env, capture_output=True, text=True, check=True)
+
+
+def import_time(repeat: int = 5) -> float:
+    """Best time in seconds to import the package, as reported by `python -X importtime`."""
+    with tempfile.TemporaryDirectory() as pycache:
+        _python(["-c", "import check_gha_pinning"], pycache)
+        best = float("inf")
+        for _ in range(repeat):
+            stderr = _python(["-X", "importtime", "-c", "import check_gha_pinning"], pycache).stderr
+            # "import time: self [us] | cumulative | imported package", the package itself is listed last.
+            line = next(line for line in reversed(stderr.splitlines()) if line.endswith("| check_gha_pinning"))
+            best = min(best, int(line.split("|")[1]) / 1e6)
+    return best
+
+
+def run_without_uses(repeat: int = 5) -> tuple[float, list[str]]:
+    """Best wall time of a run on a file without `uses`, and the heavy modules that run imported."""
+    with tempfile.TemporaryDirectory() as tmp:
+        file = pathlib.Path(tmp) / "config.yml"
+        file.write_text("name: config\non: push\n")
+        _python(["-c", _RUN, str(file)], tmp)
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            stderr = _python(["-c", _RUN, str(file)], tmp).stderr
+            best = min(best, time.perf_counter() - start)
+    return best, [name for name in stderr.strip().split(",") if name]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup", description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (default: %(default)s)")
+    parser.add_argument(
+        "--target", type=float, default=TARGET, help="seconds importing the package may take (default: %(default)s)"
+    )
+    args = parser.parse_args(argv)
+
+    seconds = import_time(args.repeat)
+    run_seconds, heavy = run_without_uses(args.repeat)
+    interpreter = float("inf")
+    with tempfile.TemporaryDirectory() as pycache:
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            _python(["-c", "pass"], pycache)
+            interpreter = min(interpreter, time.perf_counter() - start)
+    print(f"import      {seconds * 1000:>8.1f} ms (target: {args.target * 1000:.1f} ms)")
+    print(f"run         {run_seconds * 1000:>8.1f} ms (interpreter alone: {interpreter * 1000:.1f} ms)")
+
+    problems = []
+    if seconds > args.target:
+        problems.append(f"importing the package took {seconds * 1000:.1f} ms")
+    if heavy:
+        problems.append(f"a run on a file without `uses` imported {', '.join(heavy)}")
+    for problem in problems:
+        print(f"regression: {problem}", file=sys.stderr)
+    return 1 if problems else os.EX_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import os
+import pathlib
+import subprocess
+
+import pytest
+
+from benchmarks import corpus, memory, run, startup
+from check_gha_pinning import TagResolver, check_pinning
+
+posix_only = pytest.mark.skipif(os.name == "nt", reason="the fake git is a shell script")
+
+
+def test_generate(tmp_path: pathlib.Path):
+    uses = corpus.generate(tmp_path, corpus.Scale(files=3, steps=20, repos=4, tags=10))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["workflow0.yml", "workflow1.yml", "workflow2.yml"]
+    assert uses == 3 * 18
+
+
+@posix_only
+def test_fake_git():
+    scenario = run.Scenario(corpus.Scale(files=2, steps=10, repos=2, tags=150))
+    with run.fake_git(scenario.latency, scenario.scale.tags):
+        url = "https://github.com/org1/action1"
+        cmd = ["git", "ls-remote", "--tags", "--exit-code", url]
+        assert len(subprocess.check_output(cmd, text=True).splitlines()) == 152 + 76
+        matching = subprocess.check_output([*cmd, "refs/tags/v2.0.1", "refs/tags/v2.0.1.*"], text=True)
+        assert {line.split("\t")[1].removesuffix("^{}") for line in matching.splitlines()} == {"refs/tags/v2.0.1"}
+        with pytest.raises(subprocess.CalledProcessError) as ex:
+            subprocess.check_output([*cmd, "refs/tags/v9"], text=True)
+        assert ex.value.returncode == 2
+        with pytest.raises(subprocess.CalledProcessError) as ex:
+            subprocess.check_output([*cmd[:-1], "https://github.com/org/missing"], stderr=subprocess.DEVNULL)
+        assert ex.value.returncode == 128
+        assert subprocess.check_output(["git", "--version"], text=True).startswith("git version")
+
+
+@posix_only
+def test_fake_git_check_pinning(tmp_path: pathlib.Path):
+    scale = corpus.Scale(files=1, steps=10, repos=2, tags=10)
+    corpus.generate(tmp_path, scale)
+    with run.fake_git(0, scale.tags):
+        problems = check_pinning(tmp_path / "workflow0.yml", TagResolver())
+    sha = corpus.commit("org0/action0", "v1.0.9")
+    assert problems[0] == (
+        f"{tmp_path / 'workflow0.yml'}:7: org0/action0@v1 is not pinned to commit (should be {sha} # v1.0.9)"
+    )
+    assert len(problems) == 8
+
+
+def test_regressions():
+    baseline = {"files_per_second": 100, "uses_per_second": 1000, "peak_memory": 1000, "subprocesses": 10}
+    assert run.regressions("x", baseline, baseline, 0.3) == []
+    slower = baseline | {"files_per_second": 60, "peak_memory": 1300}
+    assert run.regressions("x", slower, baseline, 0.3) == ["x: files_per_second dropped from 100 to 60"]
+    assert len(run.regressions("x", slower | {"peak_memory": 1301, "subprocesses": 11}, baseline, 0.3)) == 3
+
+
+def test_startup_is_lazy():
+    _, heavy = startup.run_without_uses(repeat=1)
+    assert heavy == []
+
+
+def test_tag_index_is_compact():
+    results = memory.measure(2000)
+    assert results["index"].retained < results["dicts"].retained * memory.MAX_RATIO
@@ -1,19 +1,76 @@
+# Modules that take long to import (`ruamel.yaml`, `subprocess`, `concurrent.futures`, `importlib.metadata`, ...) are
+# imported where they are used, so that runs which don't need them (e.g. on files without `uses`) start quickly.
+import abc
+import argparse
+import collections
+import contextlib
+import functools
+import hashlib
+import io
+import itertools
+import json
+import math
 import os
 import pathlib
 import re
-import subprocess
 import sys
-from typing import NamedTuple
+import threading
+import time
+import types
+import urllib.parse
+from collections.abc import Iterable, Iterator, Mapping
+from typing import IO, TYPE_CHECKING, NamedTuple
 
-import ruamel.yaml
-import ruamel.yaml.comments
+from check_gha_pinning import _stats
+from check_gha_pinning._cache import DEFAULT_TTL, DiskCache, MemoryCache
+from check_gha_pinning._discover import find_yaml_files, git_ls_files
+from check_gha_pinning._fetch import FetchError, GitFetcher
+from check_gha_pinning._fix import Fix, fix_file
+from check_gha_pinning._graphql import DEFAULT_URL as DEFAULT_GRAPHQL_URL
+from check_gha_pinning._graphql import BATCH_SIZE as GRAPHQL_BATCH_SIZE
+from check_gha_pinning._graphql import GraphQLClient, GraphQLError, default_token
+from check_gha_pinning._registry import ImageNotFoundError, RegistryClient, RegistryError, parse_image
+from check_gha_pinning._snapshot import (
+    STATUS_NO_TAGS,
+    STATUS_NOT_FOUND,
+    Snapshot,
+    SnapshotError,
+)
+from check_gha_pinning._stats import Stats, collect_stats
+from check_gha_pinning._tags import BranchesByName, TagIndex, TagsBySha, TagsByTag
+
+if TYPE_CHECKING:
+    import concurrent.futures
+
+    import ruamel.yaml
 
 IGNORE_PRAGMA = "noqa: gha-pinning"
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_RETRIES = 2
+DEFAULT_MAX_FAILURES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_DEPTH = 3
+ENGINES = ("ruamel", "fast")
+BACKENDS = ("git", "graphql")
+FORMATS = ("text", "json-lines")
 
-_SHA256 = re.compile(r"\b[a-fA-F0-9]{64}\b")
-_SHA1 = re.compile(r"\b[a-f0-9]{40}\b")
-_REPO = re.compile(r"^[a-zA-Z0-9-]+/[a-zA-Z0-9-]+\b")
-_TAG_REF = re.compile(r"^refs/tags/([a-zA-Z0-9-\.]+)$")
+# Patterns are kept as strings, `re` compiles (and caches) them on first use instead of when the module is imported.
+_SHA256 = r"\b[a-fA-F0-9]{64}\b"
+_SHA1 = r"\b[a-f0-9]{40}\b"
+# The whole name up to a path, a ref or the end: `owner/foo.js` must not be taken for `owner/foo`.
+_REPO = r"^[a-zA-Z0-9_.-]+/[a-zA-Z0-9_.-]+(?=/|@|$)"
+_TAG_NAME = r"[a-zA-Z0-9-\.]+"
+_TAG_REF = rf"^refs/tags/({_TAG_NAME})(\^\{{\}})?$"
+_BRANCH_PREFIX = "refs/heads/"
+# Git abbreviates commit hashes to at least 4 digits.
+_SHORT_SHA = r"[a-f0-9]{4,39}"
+# `git ls-remote` exits with 128 for repos that don't exist too, these messages tell network problems apart.
+_NETWORK_ERROR = (
+    r"Could not resolve host|Failed to connect|timed out|Connection (reset|refused)|RPC failed|early EOF|"
+    r"returned error: (429|5\d\d)"
+)
+_UTF16_BOMS = (b"\xff\xfe", b"\xfe\xff")
 
 
 class GHAPinningError(RuntimeError):
@@ -24,6 +81,10 @@ class _RefNotFoundError(GHAPinningError):
     """Git ref is not found by `git ls-remote`."""
 
 
+class _AmbiguousRefError(GHAPinningError):
+    """Short commit hash matches several commits."""
+
+
 class _RepoNotFoundError(GHAPinningError):
     """GitHub repo is not found."""
 
@@ -32,6 +93,22 @@ class _RepoHasNoTagsError(GHAPinningError):
     """GitHub repo has no tags."""
 
 
+class _NotInSnapshotError(GHAPinningError):
+    """GitHub repo is not in the snapshot used to resolve tags."""
+
+
+class _LookupFailedError(GHAPinningError):
+    """Looking up the tags failed in a way that may go away when trying again, like a timeout or a network error."""
+
+
+class _CircuitOpenError(_LookupFailedError):
+    """Tags weren't looked up because earlier lookups from the same host kept failing."""
+
+
+class _ImageNotFoundError(GHAPinningError):
+    """Container image or tag is not found in its registry."""
+
+
 class _UnpinnedContainerError(GHAPinningError):
     """Container is not pinned to a sha256 hash."""
 
@@ -40,123 +117,1575 @@ class _NotPinnedToCommitError(GHAPinningError):
     """Action is not pinned to a SHA1 commit hash."""
 
 
+class _InvalidRepoError(GHAPinningError):
+    """Action doesn't start with a GitHub repo name (`OWNER/REPO`) that can be looked up."""
+
+
 def _build_github_url(action: str) -> str:
     repo = re.match(_REPO, action)
     return f"https://github.com/{repo.group()}"
 
 
-ActionTagsByTag = dict[str, str]
-ActionTagsBySha = dict[str, list[str]]
+def _repo(action: str) -> str:
+    """The `OWNER/REPO` the action is in. Raises `_InvalidRepoError` if it doesn't start with one."""
+    if (repo := re.match(_REPO, action)) is None:
+        raise _InvalidRepoError(f"invalid repo name {action.partition('@')[0]}, expected OWNER/REPO")
+    return repo.group()
+
+
+def _repo_url(action: str) -> str:
+    """Like `_build_github_url`, but raises `_InvalidRepoError` for actions that don't start with a repo name."""
+    _repo(action)
+    return _build_github_url(action)
+
+
+ActionTagsByTag = Mapping[str, str]
+ActionTagsBySha = Mapping[str, list[str]]
+ActionTagsByBranch = Mapping[str, str]
 
 
 class ActionTags(NamedTuple):
+    """The tags of a repo by name and by the commit they point to, and its branches by name.
+
+    All of them are read-only views of one `TagIndex`.
+    """
+
     by_tag: ActionTagsByTag
     by_sha: ActionTagsBySha
+    by_branch: ActionTagsByBranch = types.MappingProxyType({})
+
+    def commits(self, prefix: str) -> list[str]:
+        """The distinct commits of tags and branches whose hashes start with `prefix`, sorted."""
+        if isinstance(self.by_tag, TagsByTag):
+            return self.by_tag.index.commits(prefix)
+        return sorted({sha for sha in (*self.by_sha, *self.by_branch.values()) if sha.startswith(prefix)})
+
+    def to_json(self) -> dict[str, dict]:
+        # Cache entries keep the format of plain dicts, the index (and `by_sha` with it) is rebuilt from them.
+        if isinstance(self.by_tag, TagsByTag):
+            index = self.by_tag.index
+            return {"by_tag": dict(index.refs()), "by_branch": dict(index.refs(branches=True))}
+        return {"by_tag": dict(self.by_tag), "by_branch": dict(self.by_branch)}
+
+    @classmethod
+    def from_json(cls, data: dict[str, dict]) -> "ActionTags":
+        return _action_tags(data["by_tag"], data["by_branch"])
+
+
+def _lines(output: str) -> Iterator[str]:
+    """The lines of `output` one by one, without splitting all of it into a list up front."""
+    start = 0
+    while (end := output.find("\n", start)) != -1:
+        yield output[start:end]
+        start = end + 1
+    if start < len(output):
+        yield output[start:]
+
+
+def _parse_ls_remote_tags(lines: Iterable[str]) -> ActionTags:
+    by_tag: dict[str, bytes] = {}
+    by_branch: dict[str, bytes] = {}
+    for line in lines:
+        sha, ref = line.split("\t")
+        if ref.startswith(_BRANCH_PREFIX):
+            by_branch[ref.removeprefix(_BRANCH_PREFIX)] = bytes.fromhex(sha)
+            continue
+        match = re.match(_TAG_REF, ref)
+        # Annotated tags point to a tag object, the peeled `^{}` entry has the commit it refers to.
+        if match and (match.group(2) or match.group(1) not in by_tag):
+            by_tag[match.group(1)] = bytes.fromhex(sha)
+    return _action_tags(by_tag, by_branch)
+
+
+def _action_tags(
+    by_tag: Mapping[str, str | bytes], by_branch: Mapping[str, str | bytes] = types.MappingProxyType({})
+) -> ActionTags:
+    index = TagIndex(by_tag.items(), by_branch.items())
+    return ActionTags(TagsByTag(index), TagsBySha(index), BranchesByName(index))
+
+
+def _get_action_tags(action: str, timeout: float | None = None) -> ActionTags:
+    """List the tags and branches of the action's repo, in one `git ls-remote`.
 
+    Raises `_LookupFailedError` if `git ls-remote` takes longer than `timeout` seconds or can't reach GitHub.
+    """
+    import subprocess
 
-def _get_action_tags(action: str) -> ActionTags:
-    repo_url = _build_github_url(action)
-    cmd = ["git", "ls-remote", "--tags", "--exit-code", repo_url]
-    by_tag: ActionTagsByTag = {}
-    by_sha: ActionTagsBySha = {}
+    repo_url = _repo_url(action)
+    cmd = ["git", "ls-remote", "--tags", "--heads", "--exit-code", repo_url]
+    _stats.count("subprocesses")
+    start = time.perf_counter()
     try:
-        lines = subprocess.check_output(cmd, text=True).splitlines()
-        if not lines:
+        output = subprocess.check_output(cmd, text=True, stderr=subprocess.PIPE, timeout=timeout)
+        if not output:
             raise _RepoHasNoTagsError(f"repo {repo_url} has no tags")
-        for line in lines:
-            sha, ref = line.split("\t")
-            match = re.match(_TAG_REF, ref)
-            if match:
-                by_tag[match.group(1)] = sha
-                if sha not in by_sha:
-                    by_sha[sha] = [match.group(1)]
-                else:
-                    by_sha[sha].append(match.group(1))
-        return by_tag, by_sha
+        return _parse_ls_remote_tags(_lines(output))
+    except subprocess.TimeoutExpired as ex:
+        raise _LookupFailedError(f"git ls-remote {repo_url} timed out after {timeout:g}s") from ex
     except subprocess.CalledProcessError as ex:
         if ex.returncode == 2:
             raise _RepoHasNoTagsError(f"repo {repo_url} has no tags") from ex
         elif ex.returncode == 128:
+            if ex.stderr and re.search(_NETWORK_ERROR, ex.stderr):
+                message = ex.stderr.strip().splitlines()[-1]
+                raise _LookupFailedError(f"git ls-remote {repo_url} failed: {message}") from ex
             raise _RepoNotFoundError(f"repo {repo_url} not found") from ex
         raise
+    finally:
+        _stats.add_repo_latency(repo_url, time.perf_counter() - start)
+
+
+def _tags_from_entry(repo_url: str, status: str, by_tag: ActionTagsByTag) -> ActionTags:
+    """Turn a looked up `(status, tags)` entry into the result `_get_action_tags` would have for it."""
+    if status == STATUS_NOT_FOUND:
+        raise _RepoNotFoundError(f"repo {repo_url} not found")
+    if status == STATUS_NO_TAGS:
+        raise _RepoHasNoTagsError(f"repo {repo_url} has no tags")
+    return _action_tags({tag: sha for tag, sha in by_tag.items() if re.fullmatch(_TAG_NAME, tag)})
+
+
+def _get_snapshot_tags(snapshot: Snapshot, action: str) -> ActionTags:
+    """Look up the tags of the action's repo in `snapshot`, with the same results as `_get_action_tags`."""
+    repo_url = _repo_url(action)
+    _stats.count("snapshot_lookups")
+    entry = snapshot.lookup(repo_url)
+    if entry is None:
+        raise _NotInSnapshotError(f"repo {repo_url} is not in snapshot {snapshot.path}")
+    return _tags_from_entry(repo_url, *entry)
+
+
+class ResolverBackend(abc.ABC):
+    """How `TagResolver` looks up the tags of a repo.
+
+    Lookups raise `GHAPinningError`s for repos that don't exist or have no tags, like `_get_action_tags`, and
+    `_LookupFailedError` for failures that may go away when trying again. These are retried and counted per `host`.
+    Backends with a `batch_size` above 1 resolve that many repos at once in `get_many`.
+    Results of `cacheable` backends are stored in the tag cache. `name` identifies the source of the results.
+    """
+
+    name = "base"
+    batch_size = 1
+    cacheable = True
+
+    @abc.abstractmethod
+    def get_action_tags(self, action: str) -> ActionTags:
+        """The tags of the action's repo."""
+
+    def get_many(self, actions: list[str]) -> list[ActionTags | GHAPinningError]:
+        results: list[ActionTags | GHAPinningError] = []
+        for action in actions:
+            try:
+                results.append(self.get_action_tags(action))
+            except GHAPinningError as ex:
+                results.append(ex)
+        return results
+
+    def host(self, action: str) -> str:
+        try:
+            return urllib.parse.urlsplit(_repo_url(action)).netloc
+        except _InvalidRepoError:
+            return ""  # Not looked up from any host, the lookup reports the name.
+
+    def close(self) -> None:
+        pass
+
+
+class GitBackend(ResolverBackend):
+    """Lists tags with one `git ls-remote` per repo. The default."""
+
+    name = "git"
+
+    def __init__(self, timeout: float | None = DEFAULT_TIMEOUT) -> None:
+        self.timeout = timeout
+
+    def get_action_tags(self, action: str) -> ActionTags:
+        return _get_action_tags(action, timeout=self.timeout)
+
+
+class SnapshotBackend(ResolverBackend):
+    """Looks up tags in a snapshot file, without network access."""
+
+    cacheable = False
+
+    def __init__(self, snapshot: Snapshot) -> None:
+        self.snapshot = snapshot
+        self.name = f"snapshot:{snapshot.path.resolve()}@{snapshot.path.stat().st_mtime_ns}"
+
+    def get_action_tags(self, action: str) -> ActionTags:
+        return _get_snapshot_tags(self.snapshot, action)
+
+    def close(self) -> None:
+        self.snapshot.close()
+
+
+class GraphQLBackend(ResolverBackend):
+    """Looks up the tags of many repos in batched queries to the GitHub GraphQL API over pooled connections."""
+
+    name = "graphql"
+    batch_size = GRAPHQL_BATCH_SIZE
+
+    def __init__(self, client: GraphQLClient | None = None) -> None:
+        self.client = client if client is not None else GraphQLClient(token=default_token())
+
+    def get_action_tags(self, action: str) -> ActionTags:
+        result = self.get_many([action])[0]
+        if isinstance(result, GHAPinningError):
+            raise result
+        return result
+
+    def get_many(self, actions: list[str]) -> list[ActionTags | GHAPinningError]:
+        repos: list[str | GHAPinningError] = []
+        for action in actions:
+            try:
+                repos.append(_repo(action))
+            except _InvalidRepoError as ex:
+                repos.append(ex)
+        # Names that aren't repos are answered without asking the API.
+        valid = [repo for repo in repos if isinstance(repo, str)]
+        start = time.perf_counter()
+        try:
+            entries = iter(self.client.fetch_tags(valid) if valid else [])
+        except GraphQLError as ex:
+            return [repo if isinstance(repo, GHAPinningError) else _LookupFailedError(str(ex)) for repo in repos]
+        elapsed = time.perf_counter() - start
+        results: list[ActionTags | GHAPinningError] = []
+        for action, repo in zip(actions, repos):
+            if isinstance(repo, GHAPinningError):
+                results.append(repo)
+                continue
+            entry = next(entries)
+            repo_url = _build_github_url(action)
+            _stats.add_repo_latency(repo_url, elapsed)
+            try:
+                results.append(_tags_from_entry(repo_url, *entry))
+            except GHAPinningError as ex:
+                results.append(ex)
+        return results
+
+    def host(self, action: str) -> str:
+        return urllib.parse.urlsplit(self.client.url).netloc
+
+    def close(self) -> None:
+        self.client.close()
+
+
+# Failures that are memoized like results, instead of being raised again on the next lookup.
+# Lookups that failed after all retries are memoized too, so the rest of the run doesn't wait for them again.
+_EXPECTED_ERRORS = (_RepoNotFoundError, _RepoHasNoTagsError, _NotInSnapshotError, _LookupFailedError, _InvalidRepoError)
+
+
+class TagResolver:
+    """Resolves action tags, memoizing the result (or failure) per repo for the lifetime of the resolver.
+
+    Tags are looked up with the `backend` (`git ls-remote` by default).
+    If a `cache` is given, successful lookups are also shared with other processes through it.
+    `prefetch` resolves repos in the background, using up to `max_workers` threads.
+    Lookups that fail with a timeout or a network error are tried `retries` more times, waiting a random part of
+    `backoff * 2**attempt` seconds in between. Once `max_failures` lookups from the same host failed in a row, the
+    remaining lookups from it fail right away with `_CircuitOpenError` (0 never gives up on a host).
+    With a `registry` client, the digests of container images are looked up as well, memoized and cached per image.
+    """
+
+    def __init__(
+        self,
+        cache: DiskCache | MemoryCache | None = None,
+        max_workers: int = DEFAULT_CONCURRENCY,
+        backend: ResolverBackend | None = None,
+        retries: int = DEFAULT_RETRIES,
+        max_failures: int = DEFAULT_MAX_FAILURES,
+        backoff: float = DEFAULT_BACKOFF,
+        registry: RegistryClient | None = None,
+    ) -> None:
+        self._cache = cache
+        self._backend = backend if backend is not None else GitBackend()
+        self._max_workers = max(1, max_workers)
+        self._retries = max(0, retries)
+        self._max_failures = max_failures
+        self._backoff = backoff
+        self._registry = registry
+        # Consecutive failed lookups per host, and the error that made the resolver give up on a host.
+        self._failures: collections.Counter[str] = collections.Counter()
+        self._open_circuits: dict[str, _CircuitOpenError] = {}
+        self._results: dict[str, ActionTags | str | GHAPinningError] = {}
+        self._futures: dict[str, concurrent.futures.Future] = {}
+        # Repos waiting for a batch to fill up, for backends that resolve several repos at once.
+        self._queued: dict[str, str] = {}
+        self._executor: concurrent.futures.ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def key(self, action: str) -> str:
+        """The key the tags of `action` are memoized under: the URL of its repo."""
+        try:
+            return _repo_url(action)
+        except _InvalidRepoError:
+            return action.partition("@")[0]  # Memoized by name, the lookup reports it.
+
+    def _cache_enabled(self) -> bool:
+        return self._cache is not None and self._backend.cacheable
+
+    def _record(self, host: str, error: _LookupFailedError | None) -> None:
+        with self._lock:
+            if error is None:
+                self._failures[host] = 0
+                return
+            self._failures[host] += 1
+            if (
+                self._max_failures > 0
+                and self._failures[host] >= self._max_failures
+                and host not in self._open_circuits
+            ):
+                _stats.count("open_circuits")
+                message = f"gave up on {host} after {self._failures[host]} failed lookups, the last one: {error}"
+                self._open_circuits[host] = _CircuitOpenError(message)
+
+    def _lookup_many(self, actions: list[str]) -> list[ActionTags | GHAPinningError]:
+        """Look up the tags of `actions` with the backend, retrying the lookups that failed with `_LookupFailedError`."""
+        results: list[ActionTags | GHAPinningError | None] = [None] * len(actions)
+        hosts = [self._backend.host(action) for action in actions]
+        pending = list(range(len(actions)))
+        for attempt in itertools.count():
+            with self._lock:
+                for i in pending:
+                    results[i] = self._open_circuits.get(hosts[i])
+            pending = [i for i in pending if results[i] is None]
+            if not pending:
+                break
+            if attempt > 0:
+                import random
+
+                _stats.count("retries", len(pending))
+                time.sleep(random.uniform(0, self._backoff * 2 ** (attempt - 1)))
+            for i, result in zip(pending, self._backend.get_many([actions[i] for i in pending])):
+                results[i] = result
+            failed = [i for i in pending if isinstance(results[i], _LookupFailedError)]
+            for host in {hosts[i] for i in pending} - {hosts[i] for i in failed}:
+                self._record(host, None)
+            if attempt >= self._retries:
+                # Count a failed batch once per host, not once per repo in it.
+                for host, i in {hosts[i]: i for i in failed}.items():
+                    self._record(host, results[i])
+                break
+            pending = failed
+        return results
+
+    def _lookup(self, action: str) -> ActionTags:
+        result = self._lookup_many([action])[0]
+        if isinstance(result, GHAPinningError):
+            raise result
+        return result
+
+    def _cache_key(self, key: str) -> str:
+        # Backends list different refs (e.g. only `git` lists branches), their results aren't interchangeable.
+        return f"{self._backend.name}:{key}"
+
+    def _peek(self, key: str) -> ActionTags | None:
+        if cached := self._cache.get(self._cache_key(key)):
+            return cached if isinstance(cached, ActionTags) else ActionTags.from_json(cached)
+        return None
+
+    def _cached(self, key: str) -> ActionTags | None:
+        if cached := self._peek(key):
+            _stats.count("tag_cache_hits")
+        return cached
+
+    def _put(self, key: str, tags: ActionTags) -> None:
+        # A `MemoryCache` that encodes what it writes to disk keeps the `ActionTags` themselves, ready to use.
+        keeps_objects = isinstance(self._cache, MemoryCache) and self._cache.encode is not None
+        self._cache.put(self._cache_key(key), tags if keeps_objects else tags.to_json())
+
+    def _resolve(self, action: str, key: str) -> ActionTags:
+        if not self._cache_enabled():
+            return self._lookup(action)
+        if cached := self._cached(key):
+            return cached
+        with self._cache.lock(self._cache_key(key)):
+            # Another process may have resolved the repo while we were waiting for the lock.
+            if cached := self._cached(key):
+                return cached
+            _stats.count("tag_cache_misses")
+            tags = self._lookup(action)
+            self._put(key, tags)
+            return tags
+
+    def _store(self, action: str, key: str) -> None:
+        try:
+            self._results[key] = self._resolve(action, key)
+        except _EXPECTED_ERRORS as ex:
+            self._results[key] = ex
+
+    def _store_batch(self, batch: list[tuple[str, str]]) -> None:
+        if len(batch) == 1:
+            self._store(*batch[0])
+            return
+        missing = []
+        for action, key in batch:
+            if self._cache_enabled() and (cached := self._cached(key)):
+                self._results[key] = cached
+            else:
+                missing.append((action, key))
+        if self._cache_enabled():
+            _stats.count("tag_cache_misses", len(missing))
+        results = self._lookup_many([action for action, _ in missing]) if missing else []
+        for (_, key), result in zip(missing, results):
+            if isinstance(result, ActionTags) and self._cache_enabled():
+                self._put(key, result)
+            if isinstance(result, (ActionTags, *_EXPECTED_ERRORS)):
+                self._results[key] = result
+
+    def _submit_queued(self) -> None:
+        """Start resolving the queued repos. Must be called with the lock held."""
+        if not self._queued:
+            return
+        if self._executor is None:
+            import concurrent.futures
+
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._max_workers)
+        batch = [(action, key) for key, action in self._queued.items()]
+        self._queued = {}
+        future = self._executor.submit(self._store_batch, batch)
+        for _, key in batch:
+            self._futures[key] = future
+
+    def get_action_tags(self, action: str) -> ActionTags:
+        key = self.key(action)
+        with self._lock:
+            if key in self._queued:
+                self._submit_queued()
+            future = self._futures.get(key)
+        if future is not None:
+            import concurrent.futures
+
+            # Unexpected errors aren't memoized, the lookup below raises them again.
+            concurrent.futures.wait([future])
+        if key not in self._results:
+            self._store(action, key)
+        result = self._results[key]
+        if isinstance(result, GHAPinningError):
+            raise result.with_traceback(None)
+        return result
+
+    def prefetch(self, actions: Iterable[str]) -> None:
+        """Start resolving the distinct repos of `actions` in the background. Lookups of them wait for the result.
+
+        With a batching backend, repos are queued until a batch is full, `flush` or a lookup of a queued repo.
+        """
+        with self._lock:
+            for action in actions:
+                key = self.key(action)
+                if key in self._results or key in self._futures or key in self._queued:
+                    continue
+                self._queued[key] = action
+                if len(self._queued) >= self._backend.batch_size:
+                    self._submit_queued()
+
+    def flush(self) -> None:
+        """Start resolving the repos that are waiting for a batch to fill up."""
+        with self._lock:
+            self._submit_queued()
+
+    def ready(self, actions: Iterable[str]) -> bool:
+        """Whether looking up the tags of all `actions` can be answered without waiting."""
+        with self._lock:
+            for action in actions:
+                key = self.key(action)
+                if key not in self._results and not (key in self._futures and self._futures[key].done()):
+                    return False
+        return True
+
+    def cached(self, action: str) -> str | None:
+        """How `action` (an entry with a tag or branch, or a `docker://` image) resolves with the tags or digest already
+        looked up, without looking them up: the pinned reference, or why the ref wasn't found.
+
+        None if they aren't looked up in this process or cached (anymore). Results that depended on the resolution
+        are still valid while it's the same.
+        """
+        if action.startswith("docker://"):
+            result = self._results.get(action)
+            if result is None and self._cache is not None and (cached := self._cache.get(action)):
+                result = cached["digest"]
+            return result if isinstance(result, str) else None
+        key = self.key(action)
+        tags = self._results.get(key)
+        if tags is None and not self._backend.cacheable:
+            # Answered locally, e.g. from a snapshot, looking them up again costs little.
+            with contextlib.suppress(GHAPinningError):
+                tags = self.get_action_tags(action)
+        elif tags is None and self._cache_enabled() and (tags := self._peek(key)):
+            self._results[key] = tags
+        if not isinstance(tags, ActionTags):
+            return None
+        try:
+            return "{} # {}".format(*_resolve_ref(tags, action.split("@")[1]))
+        except GHAPinningError as ex:
+            return str(ex)
+
+    @property
+    def resolves_digests(self) -> bool:
+        return self._registry is not None
+
+    def cache_options(self) -> str:
+        """The options of the resolver that change its results, for caches of results that depend on them."""
+        return f"{self._backend.name}:{self.resolves_digests}"
+
+    def _resolve_digest(self, image: str, key: str) -> str | GHAPinningError:
+        if self._cache is not None and (cached := self._cache.get(key)):
+            _stats.count("digest_cache_hits")
+            return cached["digest"]
+        if self._cache is not None:
+            _stats.count("digest_cache_misses")
+        try:
+            with _stats.timer("registry"):
+                digest = self._registry.digest(image)
+        except ImageNotFoundError as ex:
+            return _ImageNotFoundError(str(ex))
+        except RegistryError as ex:
+            return _LookupFailedError(str(ex))
+        if self._cache is not None:
+            self._cache.put(key, {"digest": digest})
+        return digest
+
+    def get_image_digest(self, image: str) -> str:
+        """Return the `sha256:...` digest of a container `image` (`[registry/]repository[:tag]`)."""
+        if self._registry is None:
+            raise ValueError("the resolver has no registry client")
+        key = f"docker://{image}"
+        with self._lock:
+            result = self._results.get(key)
+        if result is None:
+            result = self._resolve_digest(image, key)
+            with self._lock:
+                self._results[key] = result
+        if isinstance(result, GHAPinningError):
+            raise result.with_traceback(None)
+        return result
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        self._backend.close()
+        if self._registry is not None:
+            self._registry.close()
 
 
 def _check(line: str) -> None:
-    if "@" not in line:
-        return  # local actions (./path) don't use @ versions.
     if line.startswith("docker://"):
+        # `docker://image` and `docker://image:tag` aren't pinned either.
         if "sha256:" not in line or not re.match(_SHA256, line.split("sha256:")[1]):
             raise _UnpinnedContainerError()
+    elif "@" not in line:
+        return  # local actions (./path) don't use @ versions.
     elif not re.match(_SHA1, line.split("@")[1]):
         raise _NotPinnedToCommitError()
 
 
-def check_pinning(file: pathlib.Path) -> list[str]:
+def _needs_resolution(action: str) -> bool:
     try:
-        workflow: dict = ruamel.yaml.YAML().load(file)
-    except ruamel.yaml.YAMLError as ex:
-        return [f"Error parsing yaml: {ex}"]
+        _check(action)
+    except _NotPinnedToCommitError:
+        return not os.getenv("GHA_PINNING_SKIP_GIT_CHECK")
+    except GHAPinningError:
+        pass
+    return False
+
+
+class _Uses(NamedTuple):
+    line: int
+    action: str
+
+
+def _yaml_error() -> type[Exception]:
+    """`ruamel.yaml.YAMLError`, for `except` clauses, which only evaluate it once something was raised."""
+    import ruamel.yaml
+
+    return ruamel.yaml.YAMLError
+
+
+_parsers = threading.local()
+
+
+def _yaml() -> "ruamel.yaml.YAML":
+    """The YAML parser of the current thread. Setting one up takes a while, so it's reused for every file."""
+    if (parser := getattr(_parsers, "yaml", None)) is None:
+        import ruamel.yaml
+
+        parser = _parsers.yaml = ruamel.yaml.YAML()
+    return parser
+
+
+def _load_uses(file: pathlib.Path, engine: str = "ruamel", data: bytes | None = None) -> list[_Uses]:
+    """Return the `uses` entries of a workflow or composite action that aren't ignored with the pragma.
+
+    The "fast" engine scans the text of the file and only parses it with ruamel if the scanner can't handle it.
+    `data` is the content of the file, if it was already read. Raises `ruamel.yaml.YAMLError`.
+    """
+    if engine == "fast":
+        from check_gha_pinning._scan import scan_uses
+
+        try:
+            found = scan_uses((data if data is not None else file.read_bytes()).decode("utf-8"), IGNORE_PRAGMA)
+        except UnicodeDecodeError:
+            found = None
+        if found is not None:
+            return [_Uses(*item) for item in found]
+
+    source: pathlib.Path | IO[bytes] = file
+    if data is not None:
+        # Named like the file, so that parse errors say where they are instead of `in "<byte string>"`.
+        source = io.BytesIO(data)
+        source.name = str(file)
+    workflow: dict = _yaml().load(source)
 
     try:
         jobs: dict = workflow.get("jobs", {})
     except AttributeError:
         return []
 
-    uses = [job for job in jobs.values() if "uses" in job]
+    uses: list[ruamel.yaml.comments.CommentedMap] = [job for job in jobs.values() if "uses" in job]
     for job in jobs.values():
         for step in job.get("steps", []):
             if "uses" in step:
                 uses.append(step)
 
-    problems = []
-    for item in uses:
-        item: ruamel.yaml.comments.CommentedMap
-        action: str = item["uses"]
-        if IGNORE_PRAGMA in str(item.ca):
+    # Composite actions (`action.yml`) have their steps in `runs`.
+    runs = workflow.get("runs")
+    if isinstance(runs, dict) and runs.get("using") == "composite":
+        uses.extend(step for step in runs.get("steps") or [] if "uses" in step)
+
+    return [_Uses(item.lc.line + 1, item["uses"]) for item in uses if IGNORE_PRAGMA not in str(item.ca)]
+
+
+PROBLEM_PARSE_ERROR = "parse-error"
+PROBLEM_UNPINNED_CONTAINER = "unpinned-container"
+PROBLEM_UNPINNED_COMMIT = "unpinned-commit"
+PROBLEM_RESOLUTION_ERROR = "resolution-error"
+PROBLEM_DEPENDENCY = "dependency"
+
+
+class Problem(NamedTuple):
+    """A problem found in a workflow file. `line` and `action` are None if the file can't be parsed.
+
+    `degraded` problems were found without looking up the tags of the action, because the lookup failed.
+    """
+
+    file: str
+    line: int | None
+    action: str | None
+    kind: str
+    message: str
+    suggestion: str | None = None
+    degraded: bool = False
+
+    def __str__(self) -> str:
+        if self.line is None:
+            return self.message
+        separator = ": " if self.kind == PROBLEM_RESOLUTION_ERROR else " "
+        return f"{self.file}:{self.line}: {self.action}{separator}{self.message}"
+
+
+def _resolve_ref(tags: ActionTags, ref: str) -> tuple[str, str]:
+    """The commit `ref` (a tag, a branch or a short commit hash) points to, and the most specific name for it.
+
+    Tags take precedence over branches, like in git. Raises `_RefNotFoundError`, or `_AmbiguousRefError` for short
+    hashes of several commits.
+    """
+    if hash := tags.by_tag.get(ref):
+        return hash, max(tags.by_sha[hash], key=len)
+    if hash := tags.by_branch.get(ref):
+        # A tag of the commit names it better than the branch, which moves on.
+        return hash, max(tags.by_sha.get(hash) or [ref], key=len)
+    if not re.fullmatch(_SHORT_SHA, ref):
+        raise _RefNotFoundError(f"tag {ref} not found")
+    commits = tags.commits(ref)
+    if len(commits) > 1:
+        raise _AmbiguousRefError(f"short SHA {ref} is ambiguous, it matches {', '.join(commits)}")
+    if not commits:
+        raise _RefNotFoundError(f"no tag or branch points to a commit starting with {ref}")
+    hash = commits[0]
+    names = tags.by_sha.get(hash) or [name for name, sha in tags.by_branch.items() if sha == hash]
+    return hash, max(names, key=len)
+
+
+def _check_uses(
+    file: pathlib.Path,
+    uses: list[_Uses],
+    resolver: TagResolver,
+    dependencies: "_Dependencies | None" = None,
+    depth: int = 1,
+) -> Iterator[Problem]:
+    """Yield the problems of the `uses` entries of `file`, and of the dependencies of its pinned entries if given.
+
+    `depth` is the level of the dependencies of `file`, 1 for the files given by the user.
+    """
+    _stats.count("uses", len(uses))
+    for line, action in uses:
+        if dependencies is not None and _pinned_to_commit(action):
+            yield from dependencies.check(file, line, action, depth)
             continue
-        prefix = f"{file}:{item.lc.line+1}: {action}"
+
+        def problem(kind: str, message: str, suggestion: str | None = None, degraded: bool = False) -> Problem:
+            return Problem(str(file), line, action, kind, message, suggestion, degraded)
+
         try:
             _check(action)
         except _UnpinnedContainerError:
-            problems.append(f"{prefix} is not pinned to sha256")
+            image = action.removeprefix("docker://")
+            # References with an `@` that isn't a sha256 digest are invalid, there is nothing to look up for them.
+            if not resolver.resolves_digests or "@" in image:
+                yield problem(PROBLEM_UNPINNED_CONTAINER, "is not pinned to sha256")
+                continue
+            try:
+                suggestion = f"{resolver.get_image_digest(image)} # {parse_image(image).tag}"
+                yield problem(
+                    PROBLEM_UNPINNED_CONTAINER, f"is not pinned to sha256 (should be {suggestion})", suggestion
+                )
+            except _LookupFailedError as ex:
+                _stats.count("degraded")
+                yield problem(
+                    PROBLEM_UNPINNED_CONTAINER, f"is not pinned to sha256 (digest not looked up: {ex})", degraded=True
+                )
+            except _ImageNotFoundError as ex:
+                yield problem(PROBLEM_RESOLUTION_ERROR, str(ex))
         except _NotPinnedToCommitError:
             if os.getenv("GHA_PINNING_SKIP_GIT_CHECK"):
-                problems.append(f"{prefix} is not pinned to commit")
+                yield problem(PROBLEM_UNPINNED_COMMIT, "is not pinned to commit")
             else:
                 ref = action.split("@")[1]
                 try:
-                    tags, shas = _get_action_tags(action)
-                    hash = tags.get(ref)
-                    if not hash:
-                        raise _RefNotFoundError(f"tag {ref} not found")
-                    tags = shas.get(hash)
-                    specific_tag = max(tags, key=len)
-
-                    problems.append(f"{prefix} is not pinned to commit (should be {hash} # {specific_tag})")
-                except (_RefNotFoundError, _RepoHasNoTagsError) as ex:
-                    problems.append(f"{prefix}: {ex}")
+                    tags = resolver.get_action_tags(action)
+                    try:
+                        hash, name = _resolve_ref(tags, ref)
+                    except _RefNotFoundError:
+                        if not tags.by_tag:
+                            raise _RepoHasNoTagsError(f"repo {_build_github_url(action)} has no tags") from None
+                        raise
+                    suggestion = f"{hash} # {name}"
+                    yield problem(
+                        PROBLEM_UNPINNED_COMMIT, f"is not pinned to commit (should be {suggestion})", suggestion
+                    )
+                except _LookupFailedError as ex:
+                    # Report it like `GHA_PINNING_SKIP_GIT_CHECK` would instead of failing the whole run.
+                    _stats.count("degraded")
+                    yield problem(
+                        PROBLEM_UNPINNED_COMMIT, f"is not pinned to commit (tags not looked up: {ex})", degraded=True
+                    )
+                except (_RefNotFoundError, _AmbiguousRefError, *_EXPECTED_ERRORS) as ex:
+                    yield problem(PROBLEM_RESOLUTION_ERROR, str(ex))
         except _RepoNotFoundError:
-            problems.append(f"{prefix}: repo not found")
+            yield problem(PROBLEM_RESOLUTION_ERROR, "repo not found")
 
-    return problems
 
+def _parse_error(file: pathlib.Path, ex: Exception) -> Problem:
+    return Problem(str(file), None, None, PROBLEM_PARSE_ERROR, f"Error parsing yaml: {ex}")
 
-def main() -> int:
-    paths = sys.argv[1:] or [".github/workflows"]
 
+def _pinned_to_commit(action: str) -> bool:
+    """Whether `action` is a remote action or reusable workflow pinned to a commit."""
+    return (
+        "@" in action
+        and not action.startswith("docker://")
+        and bool(re.match(_SHA1, action.split("@")[1]))
+        and bool(re.match(_REPO, action))
+    )
+
+
+def _dependency_files(action: str) -> tuple[str, str, list[str]]:
+    """The repo URL, commit and candidate paths of the file defining a pinned action or reusable workflow."""
+    name, _, commit = action.partition("@")
+    path = name[len(re.match(_REPO, name).group()) :].strip("/")
+    if path.endswith((".yml", ".yaml")):
+        return _build_github_url(name), commit, [path]
+    prefix = f"{path}/" if path else ""
+    return _build_github_url(name), commit, [f"{prefix}action.yml", f"{prefix}action.yaml"]
+
+
+class _Dependencies:
+    """Checks the `uses` entries of the composite actions and reusable workflows that pinned entries depend on.
+
+    The file defining each action is fetched at the pinned commit and checked once however many entries use it, and
+    its own pinned entries are followed up to `max_depth` levels deep. Since the file at a commit never changes, its
+    `uses` entries are kept in `cache` for later runs.
+    """
+
+    def __init__(
+        self,
+        resolver: TagResolver,
+        max_depth: int = DEFAULT_MAX_DEPTH,
+        cache: DiskCache | MemoryCache | None = None,
+        timeout: float | None = None,
+    ) -> None:
+        self.max_depth = max_depth
+        self._resolver = resolver
+        self._cache = cache
+        self._timeout = timeout
+        self._fetcher: GitFetcher | None = None
+        self._loaded: dict[str, tuple[str, list[_Uses]] | Problem] = {}
+        self._checked: dict[tuple[str, int], list[Problem]] = {}
+
+    def _load(self, action: str) -> tuple[str, list[_Uses]] | Problem:
+        """The path and `uses` entries of the file defining `action`, or the problem if it can't be read."""
+        if (loaded := self._loaded.get(action)) is not None:
+            return loaded
+
+        def problem(message: str, degraded: bool = False) -> Problem:
+            return Problem("", None, action, PROBLEM_RESOLUTION_ERROR, message, None, degraded)
+
+        url, commit, paths = _dependency_files(action)
+        entry = self._cache.get(action) if self._cache is not None else None
+        if entry is None:
+            if self._fetcher is None:
+                self._fetcher = GitFetcher(self._timeout)
+            _stats.count("dependencies")
+            try:
+                with _stats.timer("dependencies"):
+                    found = self._fetcher.read(url, commit, paths)
+            except FetchError as ex:
+                # Not remembered, a later run may be able to fetch it.
+                return problem(f"dependencies not checked: {ex}", degraded=True)
+            if found is None:
+                entry = {"path": None}
+            else:
+                path, data = found
+                location = f"{re.match(_REPO, action).group()}/{path}"
+                try:
+                    entry = {"path": location, "uses": _load_uses(pathlib.Path(location), data=data)}
+                except _yaml_error() as ex:
+                    entry = {"path": location, "error": f"dependencies not checked, error parsing {path}: {ex}"}
+            if self._cache is not None:
+                self._cache.put(action, entry)
+
+        if entry["path"] is None:
+            loaded = problem(f"{' or '.join(paths)} not found")
+        elif "error" in entry:
+            loaded = problem(entry["error"])
+        else:
+            loaded = (entry["path"], [_Uses(*item) for item in entry["uses"]])
+        self._loaded[action] = loaded
+        return loaded
+
+    def _problems(self, action: str, depth: int) -> list[Problem]:
+        """Problems of the file defining `action` and of its own dependencies, `depth` levels below the checked file."""
+        if (problems := self._checked.get((action, depth))) is not None:
+            return problems
+        loaded = self._load(action)
+        if isinstance(loaded, Problem):
+            problems = [loaded]
+        else:
+            location, uses = loaded
+            # Its own pinned entries are only followed while the depth limit isn't reached.
+            dependencies = self if depth < self.max_depth else None
+            problems = list(_check_uses(pathlib.Path(location), uses, self._resolver, dependencies, depth + 1))
+        self._checked[(action, depth)] = problems
+        return problems
+
+    def lookups(self, action: str, depth: int = 1) -> Iterator[str]:
+        """The entries of the files the pinned `action` depends on that were checked with a lookup, like `_lookups`."""
+        loaded = self._load(action)
+        if not isinstance(loaded, Problem):
+            yield from _lookups(loaded[1], self._resolver, self if depth < self.max_depth else None, depth + 1)
+
+    def check(self, file: pathlib.Path, line: int, action: str, depth: int = 1) -> Iterator[Problem]:
+        """Problems of the dependencies of the pinned `action`, reported at its `uses` entry in `file`."""
+        for problem in self._problems(action, depth):
+            if problem.line is None:  # The file defining `action` itself couldn't be checked.
+                yield problem._replace(file=str(file), line=line)
+            else:
+                yield Problem(
+                    str(file), line, action, PROBLEM_DEPENDENCY, f"depends on {problem}", None, problem.degraded
+                )
+
+    def close(self) -> None:
+        if self._fetcher is not None:
+            self._fetcher.close()
+
+
+def _lookups(
+    uses: list[_Uses], resolver: TagResolver, dependencies: _Dependencies | None = None, depth: int = 1
+) -> Iterator[str]:
+    """The entries of `uses` that `_check_uses` checks with a lookup of tags or of a digest, and those of the
+    dependencies of its pinned entries if given."""
+    for _, action in uses:
+        if dependencies is not None and _pinned_to_commit(action):
+            yield from dependencies.lookups(action, depth)
+        elif _needs_resolution(action) or (
+            action.startswith("docker://") and resolver.resolves_digests and "@" not in action
+        ):
+            yield action
+
+
+def iter_problems(file: pathlib.Path, resolver: TagResolver | None = None, engine: str = "ruamel") -> Iterator[Problem]:
+    """Yield the problems of a workflow file one by one, as they are found."""
+    if resolver is None:
+        resolver = TagResolver()
+
+    _stats.count("files")
+    try:
+        with _stats.timer("parse"):
+            uses = _load_uses(file, engine)
+    except _yaml_error() as ex:
+        _stats.count("parse_errors")
+        yield _parse_error(file, ex)
+        return
+    yield from _check_uses(file, uses, resolver)
+
+
+def check_pinning(file: pathlib.Path, resolver: TagResolver | None = None, engine: str = "ruamel") -> list[str]:
+    return [str(problem) for problem in iter_problems(file, resolver, engine)]
+
+
+class Checker:
+    """Checks the content of workflows and composite actions that don't have to be files, e.g. fetched from an API.
+
+    The `resolver` (with its caches) is shared by all checks, and so is the YAML parser of each thread, so that a
+    long-running service can check many documents quickly, also from several threads. `engine` is like `--engine`,
+    and with `max_depth` the dependencies of pinned entries are checked like with `--recursive`.
+    """
+
+    def __init__(self, resolver: TagResolver | None = None, engine: str = "ruamel", max_depth: int = 0) -> None:
+        if engine not in ENGINES:
+            raise ValueError(f"unknown engine {engine!r}, expected one of {', '.join(ENGINES)}")
+        self.resolver = resolver if resolver is not None else TagResolver()
+        self._engine = engine
+        self._dependencies = _Dependencies(self.resolver, max_depth) if max_depth > 0 else None
+
+    def iter_problems(self, content: str | bytes | IO, name: str = "<string>") -> Iterator[Problem]:
+        """Yield the problems of `content` (text, bytes or a stream of either) one by one, reported as file `name`."""
+        if not isinstance(content, (str, bytes)):
+            content = content.read()
+        data = content.encode() if isinstance(content, str) else content
+        file = pathlib.Path(name)
+        _stats.count("files")
+        if b"uses" not in data and not data.startswith(_UTF16_BOMS):
+            _stats.count("skipped_files")
+            return
+        try:
+            with _stats.timer("parse"):
+                uses = _load_uses(file, self._engine, data)
+        except _yaml_error() as ex:
+            _stats.count("parse_errors")
+            yield _parse_error(file, ex)
+            return
+        yield from _check_uses(file, uses, self.resolver, self._dependencies)
+
+    def check(self, content: str | bytes | IO, name: str = "<string>") -> list[Problem]:
+        """Return the problems of `content` (text, bytes or a stream of either), reported as file `name`."""
+        return list(self.iter_problems(content, name))
+
+    def check_file(self, file: pathlib.Path) -> list[Problem]:
+        return self.check(file.read_bytes(), str(file))
+
+    def close(self) -> None:
+        self.resolver.close()
+        if self._dependencies is not None:
+            self._dependencies.close()
+
+    def __enter__(self) -> "Checker":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+class _ResultCache:
+    """Problems of files checked in earlier runs, reused as long as the file content is unchanged.
+
+    Results that depended on lookups of tags or digests (also those of the dependencies of pinned entries) keep how
+    each entry resolved, and are only reused while the tags and digests in the resolver's cache still resolve them the
+    same. They expire with the cached tags, and as soon as a tag moves.
+    """
+
+    def __init__(
+        self, cache: DiskCache | MemoryCache, resolver: TagResolver, dependencies: _Dependencies | None = None
+    ) -> None:
+        self._cache = cache
+        self._resolver = resolver
+        self._dependencies = dependencies
+        depth = dependencies.max_depth if dependencies is not None else 0
+        import importlib.metadata
+
+        try:
+            version = importlib.metadata.version(__name__)
+        except importlib.metadata.PackageNotFoundError:
+            version = "unknown"
+        skip_git_check = bool(os.getenv("GHA_PINNING_SKIP_GIT_CHECK"))
+        self._options = f"{version}:{skip_git_check}:{resolver.cache_options()}:{depth}"
+
+    def _key(self, file: pathlib.Path) -> str:
+        return f"{self._options}:{file.resolve()}"
+
+    def get(self, file: pathlib.Path, digest: str) -> list[Problem] | None:
+        entry = self._cache.get(self._key(file))
+        # Entries of earlier versions only noted whether there were lookups.
+        if not entry or entry["hash"] != digest or not isinstance(entry.get("lookups"), dict):
+            return None
+        for action, resolved in entry["lookups"].items():
+            if self._resolver.cached(action) != resolved:
+                return None
+        return [Problem(*problem) for problem in entry["problems"]]
+
+    def put(self, file: pathlib.Path, digest: str, uses: list[_Uses], problems: list[Problem]) -> None:
+        lookups = {}
+        for action in _lookups(uses, self._resolver, self._dependencies):
+            if (resolved := self._resolver.cached(action)) is None:
+                return  # A later run couldn't tell whether it still resolves the same.
+            lookups[action] = resolved
+        self._cache.put(self._key(file), {"hash": digest, "problems": problems, "lookups": lookups})
+
+
+def _changed_files(rev: str) -> set[pathlib.Path]:
+    """Files changed in the working tree since `rev`, including untracked files."""
+    import subprocess
+
+    diff = ["git", "diff", "--name-only", "-z", "--relative", "--diff-filter=d", rev, "--"]
+    untracked = ["git", "ls-files", "-z", "--others", "--exclude-standard"]
+    _stats.count("subprocesses", 2)
+    names = subprocess.check_output(diff, text=True) + subprocess.check_output(untracked, text=True)
+    return {pathlib.Path(name).resolve() for name in names.split("\0") if name}
+
+
+def _load_file(file: pathlib.Path, engine: str) -> list[_Uses] | Problem:
+    """Return the `uses` entries of `file`, or the problem if it can't be parsed.
+
+    Files that don't contain `uses` at all are skipped without parsing them (or importing a YAML parser).
+    """
+    with _stats.timer("parse"):
+        data = file.read_bytes()
+        if b"uses" not in data and not data.startswith(_UTF16_BOMS):
+            _stats.count("skipped_files")
+            return []
+        try:
+            return _load_uses(file, engine, data)
+        except _yaml_error() as ex:
+            return _parse_error(file, ex)
+
+
+def _load_file_in_worker(file: pathlib.Path, engine: str) -> tuple[list[_Uses] | Problem, dict]:
+    """`_load_file` in a worker process, with the stats it recorded there for the parent to merge."""
+    with _stats.collect_stats() as stats:
+        result = _load_file(file, engine)
+    return result, stats.as_dict()
+
+
+def _merge_worker_stats(loads: Iterable[tuple[list[_Uses] | Problem, dict]]) -> Iterator[list[_Uses] | Problem]:
+    """The results of `_load_file_in_worker`, adding the counters and timers recorded in the workers to the run's."""
+    for result, worker_stats in loads:
+        _stats.merge(worker_stats)
+        yield result
+
+
+class _Loaded(NamedTuple):
+    file: pathlib.Path
+    uses: list[_Uses] | None = None
+    error: Problem | None = None
+    digest: str | None = None
+    cached: list[Problem] | None = None
+
+    def actions(self) -> list[str]:
+        return [item.action for item in self.uses or [] if _needs_resolution(item.action)]
+
+
+def _open_snapshot(path: str) -> Snapshot:
+    try:
+        return Snapshot(pathlib.Path(path))
+    except SnapshotError as ex:
+        raise argparse.ArgumentTypeError(str(ex)) from ex
+
+
+def _shard(value: str) -> tuple[int, int]:
+    index, _, count = value.partition("/")
+    try:
+        shard = int(index), int(count)
+    except ValueError:
+        shard = (0, 0)
+    if not 1 <= shard[0] <= shard[1]:
+        raise argparse.ArgumentTypeError(f"invalid shard {value!r}, expected I/N with 1 <= I <= N")
+    return shard
+
+
+def _in_shard(file: pathlib.Path, shard: tuple[int, int]) -> bool:
+    """Whether `file` belongs to the shard `(i, n)`. The buckets only depend on the path, not on the machine."""
+    index, count = shard
+    digest = hashlib.sha256(file.as_posix().encode()).digest()
+    return int.from_bytes(digest[:8], "big") % count == index - 1
+
+
+def _parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="check-gha-pinning", description="Check that GitHub Actions are pinned to a commit hash."
+    )
+    parser.add_argument("paths", nargs="*", default=[".github/workflows"], help="workflow files or directories")
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=os.getenv("GHA_PINNING_CACHE_TTL", DEFAULT_TTL),
+        help="seconds a cached tag lookup stays valid (default: %(default)s, env: GHA_PINNING_CACHE_TTL)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=bool(os.getenv("GHA_PINNING_NO_CACHE")),
+        help="do not read or write the persistent tag cache (env: GHA_PINNING_NO_CACHE)",
+    )
+    parser.add_argument("--clear-cache", action="store_true", help="remove the persistent caches before checking")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=bool(os.getenv("GHA_PINNING_INCREMENTAL")),
+        help="reuse the results of files that haven't changed since an earlier run (env: GHA_PINNING_INCREMENTAL)",
+    )
+    parser.add_argument(
+        "--git-ls-files",
+        action="store_true",
+        default=bool(os.getenv("GHA_PINNING_GIT_LS_FILES")),
+        help="find the YAML files in directories with `git ls-files` instead of walking them "
+        "(env: GHA_PINNING_GIT_LS_FILES)",
+    )
+    parser.add_argument("--since", metavar="REV", help="only check files changed since the git revision REV")
+    parser.add_argument(
+        "--shard",
+        metavar="I/N",
+        type=_shard,
+        default=os.getenv("GHA_PINNING_SHARD"),
+        help="only check the I-th of N parts of the files, split by a hash of their paths, "
+        "e.g. to split a scan across machines (env: GHA_PINNING_SHARD)",
+    )
+    parser.add_argument(
+        "--recursive",
+        action="store_true",
+        default=bool(os.getenv("GHA_PINNING_RECURSIVE")),
+        help="also check the composite actions and reusable workflows that pinned entries use, fetched at the pinned "
+        "commit (env: GHA_PINNING_RECURSIVE)",
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        default=os.getenv("GHA_PINNING_MAX_DEPTH", DEFAULT_MAX_DEPTH),
+        help="levels of dependencies checked with --recursive (default: %(default)s, env: GHA_PINNING_MAX_DEPTH)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default=os.getenv("GHA_PINNING_ENGINE", "ruamel"),
+        help="how workflows are read: 'fast' scans the text and only parses files with unusual YAML with ruamel "
+        "(default: %(default)s, env: GHA_PINNING_ENGINE)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.getenv("GHA_PINNING_JOBS", 1),
+        help="number of processes used to parse files, 0 for one per CPU (default: %(default)s, env: GHA_PINNING_JOBS)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=os.getenv("GHA_PINNING_CONCURRENCY", DEFAULT_CONCURRENCY),
+        help="maximum number of repos resolved at the same time (default: %(default)s, env: GHA_PINNING_CONCURRENCY)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=os.getenv("GHA_PINNING_TIMEOUT", DEFAULT_TIMEOUT),
+        help="seconds a single tag lookup may take (default: %(default)s, env: GHA_PINNING_TIMEOUT)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=os.getenv("GHA_PINNING_RETRIES", DEFAULT_RETRIES),
+        help="times a tag lookup that timed out or failed with a network error is tried again "
+        "(default: %(default)s, env: GHA_PINNING_RETRIES)",
+    )
+    parser.add_argument(
+        "--max-failures",
+        type=int,
+        default=os.getenv("GHA_PINNING_MAX_FAILURES", DEFAULT_MAX_FAILURES),
+        help="failed lookups in a row after which the remaining actions from the same host are only checked for a "
+        "pinned commit, like with GHA_PINNING_SKIP_GIT_CHECK, 0 to never give up "
+        "(default: %(default)s, env: GHA_PINNING_MAX_FAILURES)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=os.getenv("GHA_PINNING_BACKEND", "git"),
+        help="how tags are looked up: 'git' runs `git ls-remote` per repo, 'graphql' looks up many repos per request "
+        "to the GitHub GraphQL API with the token in GITHUB_TOKEN (default: %(default)s, env: GHA_PINNING_BACKEND)",
+    )
+    parser.add_argument(
+        "--graphql-url",
+        default=os.getenv("GHA_PINNING_GRAPHQL_URL", DEFAULT_GRAPHQL_URL),
+        help="GraphQL endpoint of the 'graphql' backend (default: %(default)s, env: GHA_PINNING_GRAPHQL_URL)",
+    )
+    parser.add_argument(
+        "--resolve-digests",
+        action="store_true",
+        default=bool(os.getenv("GHA_PINNING_RESOLVE_DIGESTS")),
+        help="look up the digests of unpinned `docker://` images in their registries to suggest them "
+        "(env: GHA_PINNING_RESOLVE_DIGESTS)",
+    )
+    parser.add_argument(
+        "--snapshot",
+        metavar="FILE",
+        type=_open_snapshot,
+        default=os.getenv("GHA_PINNING_SNAPSHOT"),
+        help="look up tags only in a snapshot file created with `check-gha-pinning snapshot`, "
+        "without network access (env: GHA_PINNING_SNAPSHOT)",
+    )
+    parser.add_argument(
+        "--stats",
+        nargs="?",
+        choices=("text", "json"),
+        const="text",
+        default=os.getenv("GHA_PINNING_STATS") or None,
+        help="print timings, counters and cache hits of the run to stderr as 'text' or 'json' (env: GHA_PINNING_STATS)",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        default=bool(os.getenv("GHA_PINNING_DAEMON")),
+        help="run the check in a background process that keeps looked up tags and results in memory between runs, "
+        "started on demand (env: GHA_PINNING_DAEMON)",
+    )
+    parser.add_argument(
+        "--audit",
+        action="store_true",
+        default=bool(os.getenv("GHA_PINNING_AUDIT")),
+        help="instead of looking for unpinned entries, report the repos with entries pinned to commits that no tag "
+        "points to or that are behind the newest tag of their major version (env: GHA_PINNING_AUDIT)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        default=bool(os.getenv("GHA_PINNING_WATCH")),
+        help="keep running and re-check the files that change, printing the problems they gained and lost "
+        "(env: GHA_PINNING_WATCH)",
+    )
+    parser.add_argument(
+        "--fix",
+        action="store_true",
+        default=bool(os.getenv("GHA_PINNING_FIX")),
+        help="pin the actions to the suggested commits in place, keeping the tag as a comment (env: GHA_PINNING_FIX)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default=os.getenv("GHA_PINNING_FORMAT", "text"),
+        help="'json-lines' prints every problem as a JSON object on its own line "
+        "(default: %(default)s, env: GHA_PINNING_FORMAT)",
+    )
+    args = parser.parse_args(argv)
+    if args.watch:
+        for option in ("fix", "audit", "stats", "incremental"):
+            if getattr(args, option):
+                parser.error(f"--watch can't be combined with --{option}")
+    if args.audit and args.fix:
+        parser.error("--audit can't be combined with --fix")
+    return args
+
+
+def _find_files(paths: list[str], use_git_ls_files: bool) -> list[pathlib.Path]:
     files = []
+    directories = []
     for path in paths:
         p = pathlib.Path(path)
         if p.is_file():
             files.append(p)
         elif p.is_dir():
-            files.extend(f for f in p.rglob("*") if f.is_file())
-    files = list(set(files))
+            directories.append(p)
+    if use_git_ls_files:
+        files.extend(git_ls_files(directories))
+    else:
+        for directory in directories:
+            files.extend(find_yaml_files(directory))
+    return list(dict.fromkeys(files))
+
+
+def _fixes(problems: list[Problem]) -> list[Fix]:
+    fixes = []
+    for problem in problems:
+        if problem.suggestion is None:
+            continue
+        hash, _, tag = problem.suggestion.partition(" # ")
+        if problem.kind == PROBLEM_UNPINNED_CONTAINER:
+            # `docker://image:tag` is pinned as `docker://image@sha256:...`, a registry port stays.
+            name = problem.action
+            if ":" in name.rpartition("/")[2]:
+                name = name.rpartition(":")[0]
+        else:
+            name = problem.action.rpartition("@")[0]
+        fixes.append(Fix(problem.line, problem.action, f"{name}@{hash}", tag))
+    return fixes
+
+
+def _make_backend(args: argparse.Namespace) -> ResolverBackend:
+    if args.snapshot is not None:
+        return SnapshotBackend(args.snapshot)
+    if args.backend == "graphql":
+        client = GraphQLClient(
+            args.graphql_url, token=default_token(), pool_size=max(1, args.concurrency), timeout=args.timeout
+        )
+        return GraphQLBackend(client)
+    return GitBackend(args.timeout)
+
+
+def _make_resolver(args: argparse.Namespace, cache: DiskCache | MemoryCache) -> TagResolver:
+    return TagResolver(
+        cache=None if args.no_cache else cache,
+        max_workers=args.concurrency,
+        backend=_make_backend(args),
+        retries=args.retries,
+        max_failures=args.max_failures,
+        registry=RegistryClient(max(1, args.concurrency), args.timeout) if args.resolve_digests else None,
+    )
+
+
+def _make_dependencies(args: argparse.Namespace, resolver: TagResolver) -> _Dependencies | None:
+    if not args.recursive or args.max_depth <= 0:
+        return None
+    cache = DiskCache("dependencies", ttl=math.inf)
+    return _Dependencies(resolver, args.max_depth, None if args.no_cache else cache, timeout=args.timeout)
+
+
+def _clear_caches(*caches: DiskCache | MemoryCache) -> None:
+    """Remove `caches` for `--clear-cache`, and the dependencies of pinned entries, also without `--recursive`."""
+    for cache in (*caches, DiskCache("dependencies")):
+        cache.clear()
+
+
+def _discover(args: argparse.Namespace) -> list[pathlib.Path]:
+    """The files to check, sorted: the YAML files in `args.paths`, narrowed down by `--since` and `--shard`."""
+    files = _find_files(args.paths, args.git_ls_files)
+    if args.since:
+        changed = _changed_files(args.since)
+        files = [file for file in files if file.resolve() in changed]
+    if args.shard is not None:
+        files = [file for file in files if _in_shard(file, args.shard)]
+    files.sort(key=str)
+    return files
+
+
+def _run(
+    args: argparse.Namespace,
+    cache: DiskCache | MemoryCache | None = None,
+    results_cache: DiskCache | MemoryCache | None = None,
+) -> int:
+    if cache is None:
+        cache = DiskCache("tags", ttl=args.cache_ttl)
+    if results_cache is None:
+        results_cache = DiskCache("results", ttl=math.inf)
+    if args.clear_cache:
+        _clear_caches(cache, results_cache)
+    resolver = _make_resolver(args, cache)
+    dependencies = _make_dependencies(args, resolver)
+    results = _ResultCache(results_cache, resolver, dependencies) if args.incremental else None
+
+    with _stats.timer("discover"):
+        files = _discover(args)
+    _stats.count("files", len(files))
+
+    loaded: list[_Loaded] = []
+    pending: list[tuple[int, str | None]] = []
+    with _stats.timer("incremental"):
+        for file in files:
+            digest = None
+            if results is not None:
+                digest = hashlib.sha256(file.read_bytes()).hexdigest()
+                if (cached := results.get(file, digest)) is not None:
+                    _stats.count("result_cache_hits")
+                    loaded.append(_Loaded(file, cached=cached))
+                    continue
+                _stats.count("result_cache_misses")
+            pending.append((len(loaded), digest))
+            loaded.append(_Loaded(file))
+
+    def report(problem: Problem) -> None:
+        print(json.dumps(problem._asdict()) if args.format == "json-lines" else str(problem), flush=True)
+
+    def finish(entry: _Loaded) -> int:
+        with _stats.timer("check"):
+            if entry.cached is not None:
+                file_problems = entry.cached
+            elif entry.error is not None:
+                _stats.count("parse_errors")
+                file_problems = [entry.error]
+            else:
+                file_problems = list(_check_uses(entry.file, entry.uses, resolver, dependencies))
+            degraded.extend(problem for problem in file_problems if problem.degraded)
+            # Degraded results would hide the suggestions of a later run that can look up the tags.
+            if results is not None and entry.cached is None and not any(problem.degraded for problem in file_problems):
+                results.put(entry.file, entry.digest, entry.uses or [], file_problems)
+        if args.fix and (fixes := _fixes(file_problems)):
+            with _stats.timer("fix"):
+                applied = {(fix.line, fix.action) for fix in fix_file(entry.file, fixes, IGNORE_PRAGMA)}
+            file_problems = [problem for problem in file_problems if (problem.line, problem.action) not in applied]
+            if applied:
+                fixed.append((entry.file, len(applied)))
+                _stats.count("fixed", len(applied))
+        with _stats.timer("report"):
+            for problem in file_problems:
+                report(problem)
+        _stats.count("problems", len(file_problems))
+        return len(file_problems)
+
+    # Files are reported in order, each as soon as it is loaded and the repos it uses are resolved.
+    count = 0
+    degraded: list[Problem] = []
+    fixed: list[tuple[pathlib.Path, int]] = []
+    backlog: collections.deque[_Loaded] = collections.deque()
+    jobs = args.jobs or os.cpu_count() or 1
+    with contextlib.ExitStack() as stack:
+        stack.callback(resolver.close)
+        if dependencies is not None:
+            stack.callback(dependencies.close)
+        pending_files = [loaded[index].file for index, _ in pending]
+        loads: Iterator[list[_Uses] | Problem] = map(_load_file, pending_files, itertools.repeat(args.engine))
+        if jobs > 1 and len(pending) > 1:
+            import concurrent.futures
+
+            executor = stack.enter_context(concurrent.futures.ProcessPoolExecutor(max_workers=jobs))
+            chunksize = max(1, len(pending) // (jobs * 4))
+            worker_loads = executor.map(
+                _load_file_in_worker, pending_files, itertools.repeat(args.engine), chunksize=chunksize
+            )
+            loads = _merge_worker_stats(worker_loads)
+        results_iter = zip(pending, loads)
+        for entry in loaded:
+            if entry.cached is None:
+                (_, digest), result = next(results_iter)
+                if isinstance(result, Problem):
+                    entry = _Loaded(entry.file, error=result, digest=digest)
+                else:
+                    entry = _Loaded(entry.file, uses=sorted(result, key=lambda item: item.line), digest=digest)
+                resolver.prefetch(entry.actions())
+            backlog.append(entry)
+            while backlog and resolver.ready(backlog[0].actions()):
+                count += finish(backlog.popleft())
+        resolver.flush()
+        while backlog:
+            count += finish(backlog.popleft())
+
+    if fixed:
+        print(
+            f"Pinned {sum(count for _, count in fixed)} entries in {len(fixed)} files: "
+            + ", ".join(str(file) for file, _ in fixed),
+            file=sys.stderr,
+        )
+    if degraded:
+        print(
+            f"Tags couldn't be looked up for {len(degraded)} entries, they were only checked for a pinned commit: "
+            + ", ".join(f"{problem.file}:{problem.line}" for problem in degraded),
+            file=sys.stderr,
+        )
+    return 1 if count else os.EX_OK
+
+
+def _parse_merge_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="check-gha-pinning merge",
+        description="Combine the problems reported by several runs with `--format json-lines` into one report.",
+    )
+    parser.add_argument("reports", nargs="+", type=pathlib.Path, help="JSON lines files, `-` for stdin")
+    parser.add_argument(
+        "--format",
+        choices=(*FORMATS, "json"),
+        default=os.getenv("GHA_PINNING_FORMAT", "text"),
+        help="'text' and 'json-lines' print the problems like a check and the totals to stderr, 'json' prints one "
+        "object with the problems and the totals (default: %(default)s, env: GHA_PINNING_FORMAT)",
+    )
+    return parser.parse_args(argv)
+
+
+def _read_report(path: pathlib.Path) -> Iterator[Problem]:
+    lines = sys.stdin if str(path) == "-" else path.open(encoding="utf-8")
+    with contextlib.closing(lines):
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield Problem(**json.loads(line))
+            except (TypeError, ValueError) as ex:
+                raise GHAPinningError(f"{path}:{number}: not a problem record: {ex}") from ex
+
+
+def _merge_main(argv: list[str]) -> int:
+    args = _parse_merge_args(argv)
+    try:
+        # A file checked by more than one shard (e.g. overlapping paths) is only reported once.
+        problems = sorted(
+            {problem for path in args.reports for problem in _read_report(path)},
+            key=lambda problem: (problem.file, problem.line or 0, problem.action or "", problem.message),
+        )
+    except (OSError, GHAPinningError) as ex:
+        print(f"check-gha-pinning merge: {ex}", file=sys.stderr)
+        return 2
+
+    kinds = collections.Counter(problem.kind for problem in problems)
+    totals = {
+        "reports": len(args.reports),
+        "problems": len(problems),
+        "files": len({problem.file for problem in problems}),
+        "degraded": sum(problem.degraded for problem in problems),
+        "kinds": dict(sorted(kinds.items())),
+    }
+    if args.format == "json":
+        print(json.dumps({"problems": [problem._asdict() for problem in problems], "totals": totals}, indent=2))
+    else:
+        for problem in problems:
+            print(json.dumps(problem._asdict()) if args.format == "json-lines" else str(problem))
+        by_kind = ", ".join(f"{count} {kind}" for kind, count in totals["kinds"].items())
+        print(
+            f"{totals['problems']} problems in {totals['files']} files from {totals['reports']} reports"
+            + (f": {by_kind}" if by_kind else ""),
+            file=sys.stderr,
+        )
+    return 1 if problems else os.EX_OK
+
+
+def _check_main(
+    args: argparse.Namespace,
+    cache: DiskCache | MemoryCache | None = None,
+    results_cache: DiskCache | MemoryCache | None = None,
+) -> int:
+    if args.watch:
+        from check_gha_pinning import _watch
+
+        return _watch.main(args)
+    if args.audit:
+        from check_gha_pinning import _audit
+
+        run = functools.partial(_audit.main, args, cache)
+    else:
+        run = functools.partial(_run, args, cache, results_cache)
+    if not args.stats:
+        return run()
+
+    stats = Stats()
+    with collect_stats(stats), stats.timer("total"):
+        status = run()
+    print(stats.to_json() if args.stats == "json" else stats, file=sys.stderr)
+    return status
+
+
+def main() -> int:
+    argv = sys.argv[1:]
+    if argv[:1] == ["snapshot"]:
+        from check_gha_pinning import _snapshot
+
+        return _snapshot.main(argv[1:])
+    if argv[:1] == ["daemon"]:
+        from check_gha_pinning import _daemon
+
+        return _daemon.main(argv[1:])
+    if argv[:1] == ["merge"]:
+        return _merge_main(argv[1:])
+
+    watch = "--watch" in argv or os.getenv("GHA_PINNING_WATCH")
+    if ("--daemon" in argv or os.getenv("GHA_PINNING_DAEMON")) and not watch:
+        from check_gha_pinning import _daemon
 
-    if problems := sum((check_pinning(file) for file in files), []):
-        print("\n".join(problems))
-        return 1
-    return os.EX_OK
+        status = _daemon.request(argv, _daemon.socket_path()) if _daemon.available() else None
+        if status is not None:
+            return status
+    return _check_main(_parse_args(argv))
 
 
 if __name__ == "__main__":
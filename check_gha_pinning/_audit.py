@@ -0,0 +1,176 @@
+"""Audit of the entries that are already pinned to commits, against the tags of their repos.
+
+A pin is untagged if no tag points to its commit (e.g. a commit of a branch, or a tag that was moved or deleted since),
+and behind if the newest version tag of its major version points to another commit.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import re
+import sys
+from typing import NamedTuple
+
+from check_gha_pinning import _stats
+from check_gha_pinning._cache import DiskCache, MemoryCache
+
+_VERSION = r"v?(\d+(?:\.\d+)*)"
+
+
+class Pin(NamedTuple):
+    file: str
+    line: int
+    sha: str
+
+
+def version(tag: str) -> tuple[int, ...] | None:
+    """The numbers of a version tag like `v4.2.1` or `1.0`, None for other tags (including pre-releases)."""
+    match = re.fullmatch(_VERSION, tag)
+    return tuple(int(part) for part in match[1].split(".")) if match else None
+
+
+class RepoAudit(NamedTuple):
+    """The pins of one repo, and the commits among them that are behind or untagged, with their locations."""
+
+    repo: str
+    pins: int
+    files: int
+    behind: list[dict]
+    untagged: list[dict]
+    error: str | None = None
+    degraded: bool = False
+
+    @classmethod
+    def not_audited(cls, repo: str, pins: list[Pin], error: str, degraded: bool = False) -> "RepoAudit":
+        return cls(repo, len(pins), len({pin.file for pin in pins}), [], [], error, degraded)
+
+    @property
+    def findings(self) -> int:
+        return sum(len(entry["pins"]) for entry in self.behind + self.untagged)
+
+    def __str__(self) -> str:
+        summary = f"{self.repo}: {self.pins} pins in {self.files} files"
+        if self.error is not None:
+            return f"{summary}, not audited: {self.error}"
+        parts = [summary]
+        if self.behind:
+            count = sum(len(entry["pins"]) for entry in self.behind)
+            updates = ", ".join(f"{entry['tag']} -> {entry['newest']}" for entry in self.behind)
+            parts.append(f"{count} behind ({updates})")
+        if self.untagged:
+            count = sum(len(entry["pins"]) for entry in self.untagged)
+            parts.append(f"{count} untagged ({', '.join(entry['sha'][:8] for entry in self.untagged)})")
+        return ", ".join(parts)
+
+
+def _locations(pins: list[Pin]) -> list[str]:
+    return [f"{pin.file}:{pin.line}" for pin in pins]
+
+
+def audit_repo(repo: str, pins: list[Pin], by_tag: dict[str, str], by_sha: dict[str, list[str]]) -> RepoAudit:
+    """Audit the `pins` of `repo` against its tags, looking up every pinned commit in the `by_sha` index."""
+    newest: dict[int, tuple[tuple[int, ...], str]] = {}
+    for tag in by_tag:
+        if (numbers := version(tag)) is not None and (numbers, tag) > newest.get(numbers[0], ((), "")):
+            newest[numbers[0]] = (numbers, tag)
+
+    by_commit: dict[str, list[Pin]] = {}
+    for pin in pins:
+        by_commit.setdefault(pin.sha, []).append(pin)
+    behind = []
+    untagged = []
+    for sha, sha_pins in sorted(by_commit.items()):
+        tags = by_sha.get(sha)
+        if not tags:
+            untagged.append({"sha": sha, "pins": _locations(sha_pins)})
+            continue
+        versions = [(numbers, tag) for tag in tags if (numbers := version(tag)) is not None]
+        if not versions:
+            continue  # Only tagged with names that aren't versions, there is nothing newer to compare with.
+        # The most specific tag, e.g. `v4.2.1` rather than `v4`, which may have been moved on since.
+        numbers, tag = max(versions)
+        _, newest_tag = newest[numbers[0]]
+        if by_tag[newest_tag] != sha:
+            behind.append({"sha": sha, "tag": tag, "newest": newest_tag, "pins": _locations(sha_pins)})
+    return RepoAudit(repo, len(pins), len({pin.file for pin in pins}), behind, untagged)
+
+
+def main(args: argparse.Namespace, cache: DiskCache | MemoryCache | None = None) -> int:
+    """Audit the entries pinned to commits instead of looking for unpinned ones, printing a line per repo with pins
+    that are behind or untagged.
+
+    Every distinct repo is looked up once (in batches with the 'graphql' backend), for all its pins.
+    """
+    from check_gha_pinning import (
+        _EXPECTED_ERRORS,
+        _REPO,
+        ActionTags,
+        Problem,
+        _clear_caches,
+        _discover,
+        _load_file,
+        _LookupFailedError,
+        _make_resolver,
+        _pinned_to_commit,
+        _RepoHasNoTagsError,
+    )
+
+    if cache is None:
+        cache = DiskCache("tags", ttl=args.cache_ttl)
+    if args.clear_cache:
+        _clear_caches(cache)
+    resolver = _make_resolver(args, cache)
+
+    with _stats.timer("discover"):
+        files = _discover(args)
+    _stats.count("files", len(files))
+    pins: dict[str, list[Pin]] = {}
+    actions: dict[str, str] = {}
+    parse_errors = 0
+    for file in files:
+        result = _load_file(file, args.engine)
+        if isinstance(result, Problem):
+            _stats.count("parse_errors")
+            parse_errors += 1
+            print(result, file=sys.stderr)
+            continue
+        for line, action in result:
+            if _pinned_to_commit(action):
+                repo = re.match(_REPO, action).group()
+                pins.setdefault(repo, []).append(Pin(str(file), line, action.split("@")[1]))
+                actions.setdefault(repo, action)
+
+    audits: list[RepoAudit] = []
+    with contextlib.closing(resolver):
+        resolver.prefetch(actions.values())
+        resolver.flush()
+        for repo in sorted(pins):
+            try:
+                tags = resolver.get_action_tags(actions[repo])
+            except _RepoHasNoTagsError:
+                tags = ActionTags({}, {})
+            except _LookupFailedError as ex:
+                _stats.count("degraded")
+                audits.append(RepoAudit.not_audited(repo, pins[repo], str(ex), degraded=True))
+                continue
+            except _EXPECTED_ERRORS as ex:
+                audits.append(RepoAudit.not_audited(repo, pins[repo], str(ex)))
+                continue
+            audits.append(audit_repo(repo, pins[repo], tags.by_tag, tags.by_sha))
+
+    for audit in audits:
+        if audit.findings or audit.error is not None:
+            print(json.dumps(audit._asdict()) if args.format == "json-lines" else str(audit), flush=True)
+    behind = sum(len(entry["pins"]) for audit in audits for entry in audit.behind)
+    untagged = sum(len(entry["pins"]) for audit in audits for entry in audit.untagged)
+    not_audited = sum(1 for audit in audits if audit.error is not None)
+    print(
+        f"Audited {sum(audit.pins for audit in audits)} pins of {len(audits)} repos in {len(files)} files: "
+        f"{behind} behind, {untagged} untagged" + (f", {not_audited} repos not audited" if not_audited else ""),
+        file=sys.stderr,
+    )
+    failed = (
+        parse_errors or behind or untagged or any(audit.error is not None and not audit.degraded for audit in audits)
+    )
+    return 1 if failed else os.EX_OK
@@ -0,0 +1,170 @@
+"""Persistent key/value cache in the user's cache directory, shared safely between concurrent processes."""
+
+import contextlib
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import time
+from collections.abc import Callable, Iterator
+from typing import Any
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+DEFAULT_TTL = 3600
+
+
+def default_cache_dir() -> pathlib.Path:
+    if cache_dir := os.getenv("GHA_PINNING_CACHE_DIR"):
+        return pathlib.Path(cache_dir)
+    if xdg_cache_home := os.getenv("XDG_CACHE_HOME"):
+        base = pathlib.Path(xdg_cache_home)
+    elif os.name == "nt" and os.getenv("LOCALAPPDATA"):
+        base = pathlib.Path(os.environ["LOCALAPPDATA"])
+    else:
+        base = pathlib.Path.home() / ".cache"
+    return base / "check-gha-pinning"
+
+
+@contextlib.contextmanager
+def _exclusive_lock(path: pathlib.Path) -> Iterator[None]:
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK gives up after 10 seconds, keep waiting like flock does.
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class DiskCache:
+    """JSON entries stored one file per key, written atomically and expired after `ttl` seconds."""
+
+    def __init__(self, namespace: str, ttl: float = DEFAULT_TTL, directory: pathlib.Path | None = None) -> None:
+        self.namespace = namespace
+        self.ttl = ttl
+        self._directory = directory
+
+    @property
+    def directory(self) -> pathlib.Path:
+        if self._directory is None:
+            self._directory = default_cache_dir()
+        return self._directory / self.namespace
+
+    def _path(self, key: str, suffix: str) -> pathlib.Path:
+        return self.directory / (hashlib.sha256(key.encode()).hexdigest() + suffix)
+
+    def entry(self, key: str) -> tuple[float, Any] | None:
+        """The time the entry of `key` was stored and its value, unless it's missing or expired."""
+        try:
+            entry = json.loads(self._path(key, ".json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or entry.get("key") != key:
+            return None
+        if time.time() - entry.get("time", 0) > self.ttl:
+            return None
+        return entry.get("time", 0), entry.get("value")
+
+    def get(self, key: str) -> Any | None:
+        entry = self.entry(key)
+        return entry[1] if entry is not None else None
+
+    def put(self, key: str, value: Any) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        import tempfile
+
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"key": key, "time": time.time(), "value": value}, f)
+            os.replace(tmp, self._path(key, ".json"))
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+            raise
+
+    @contextlib.contextmanager
+    def lock(self, key: str) -> Iterator[None]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with _exclusive_lock(self._path(key, ".lock")):
+            yield
+
+    def clear(self) -> None:
+        import shutil
+
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class MemoryCache:
+    """In-memory entries expired after `ttl` seconds, written through to an optional `backing` cache.
+
+    Has the interface of `DiskCache`, for processes that keep running between checks. Misses are looked up in `backing`
+    and kept in memory from then on. With `encode` and `decode`, values are kept in memory as they were put, e.g. objects
+    that are expensive to rebuild, and only converted to and from JSON for `backing`.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        backing: DiskCache | None = None,
+        encode: Callable[[Any], Any] | None = None,
+        decode: Callable[[Any], Any] | None = None,
+    ) -> None:
+        self.ttl = ttl
+        self.backing = backing
+        self.encode = encode
+        self.decode = decode
+        self._entries: dict[str, tuple[float, Any]] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def entry(self, key: str) -> tuple[float, Any] | None:
+        """The time the entry of `key` was stored and its value, unless it's missing or expired."""
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry[0] <= self.ttl:
+            return entry
+        if self.backing is None or (entry := self.backing.entry(key)) is None or time.time() - entry[0] > self.ttl:
+            return None
+        # Keeps the time it was stored on disk, so that it doesn't live longer in memory than there.
+        entry = (entry[0], self.decode(entry[1]) if self.decode is not None else entry[1])
+        self._entries[key] = entry
+        return entry
+
+    def get(self, key: str) -> Any | None:
+        entry = self.entry(key)
+        return entry[1] if entry is not None else None
+
+    def put(self, key: str, value: Any) -> None:
+        self._entries[key] = (time.time(), value)
+        if self.backing is not None:
+            self.backing.put(key, self.encode(value) if self.encode is not None else value)
+
+    @contextlib.contextmanager
+    def lock(self, key: str) -> Iterator[None]:
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock, self.backing.lock(key) if self.backing is not None else contextlib.nullcontext():
+            yield
+
+    def clear(self) -> None:
+        self._entries.clear()
+        if self.backing is not None:
+            self.backing.clear()
@@ -0,0 +1,220 @@
+"""Background process that runs checks for thin clients over a Unix socket, keeping its caches in memory between them.
+
+A client sends its arguments, working directory and environment as one JSON line. The daemon answers with a JSON line
+per chunk of output (`{"stdout": text}` or `{"stderr": text}`) and a last `{"exit": status}` line. Requests are handled
+one at a time, and the daemon exits after `idle_timeout` seconds without requests.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import math
+import os
+import pathlib
+import socket
+import sys
+import time
+from collections.abc import Callable
+from typing import TextIO
+
+from check_gha_pinning._cache import DiskCache, MemoryCache, _exclusive_lock, default_cache_dir
+
+DEFAULT_IDLE_TIMEOUT = 600.0
+_START_TIMEOUT = 5.0
+
+
+def available() -> bool:
+    return hasattr(socket, "AF_UNIX")
+
+
+def socket_path() -> pathlib.Path:
+    """Socket of the daemon for this installation. Another Python or an updated package gets its own daemon."""
+    package = pathlib.Path(__file__).parent
+    install = f"{sys.executable}:{package}:{(package / '__init__.py').stat().st_mtime_ns}"
+    return default_cache_dir() / f"daemon-{hashlib.sha256(install.encode()).hexdigest()[:12]}.sock"
+
+
+def _connect(path: pathlib.Path) -> socket.socket | None:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path))
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+class _Output:
+    """Text stream sending what is written to it to the client as a `{name: text}` message when it is flushed."""
+
+    def __init__(self, file: TextIO, name: str) -> None:
+        self._file = file
+        self._name = name
+        self._buffer: list[str] = []
+
+    def write(self, text: str) -> int:
+        self._buffer.append(text)
+        return len(text)
+
+    def flush(self) -> None:
+        if text := "".join(self._buffer):
+            self._buffer = []
+            self._file.write(json.dumps({self._name: text}) + "\n")
+            self._file.flush()
+
+
+def _answer(file: TextIO, handle: Callable[[list[str]], int]) -> None:
+    try:
+        request = json.loads(file.readline())
+    except ValueError:
+        return
+    environ = dict(os.environ)
+    cwd = os.getcwd()
+    # A client that went away can't be answered anymore, but the daemon keeps serving the others.
+    with contextlib.suppress(OSError):
+        try:
+            os.environ.clear()
+            os.environ.update(request["env"])
+            os.chdir(request["cwd"])
+            stdout, stderr = _Output(file, "stdout"), _Output(file, "stderr")
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                try:
+                    status = handle(request["argv"])
+                except SystemExit as ex:  # Raised by argparse for invalid arguments and --help.
+                    status = ex.code if isinstance(ex.code, int) else int(ex.code is not None)
+                except Exception:
+                    import traceback
+
+                    traceback.print_exc()
+                    status = 1
+            stdout.flush()
+            stderr.flush()
+        finally:
+            os.chdir(cwd)
+            os.environ.clear()
+            os.environ.update(environ)
+        file.write(json.dumps({"exit": status}) + "\n")
+        file.flush()
+
+
+def serve(path: pathlib.Path, handle: Callable[[list[str]], int], idle_timeout: float = DEFAULT_IDLE_TIMEOUT) -> None:
+    """Answer the requests on the socket at `path` with `handle(argv)` until none came for `idle_timeout` seconds.
+
+    Returns right away if another daemon is already listening on `path`.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        with _exclusive_lock(path.with_suffix(".lock")):
+            if (other := _connect(path)) is not None:
+                other.close()
+                return
+            path.unlink(missing_ok=True)  # Left behind by a daemon that was killed.
+            server.bind(str(path))
+            server.listen()
+        server.settimeout(idle_timeout)
+        try:
+            while True:
+                try:
+                    connection, _ = server.accept()
+                except TimeoutError:
+                    return
+                connection.settimeout(None)
+                with connection, connection.makefile("rw", encoding="utf-8") as file:
+                    _answer(file, handle)
+        finally:
+            path.unlink(missing_ok=True)
+
+
+def _start(path: pathlib.Path) -> None:
+    import subprocess
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # The daemon must run this copy of the package, even if it isn't installed.
+    python_path = [str(pathlib.Path(__file__).parent.parent), *filter(None, [os.getenv("PYTHONPATH")])]
+    subprocess.Popen(
+        [sys.executable, "-m", "check_gha_pinning", "daemon", "--socket", str(path)],
+        cwd=path.parent,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(python_path)},
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def request(argv: list[str], path: pathlib.Path) -> int | None:
+    """Run a check with `argv` in the daemon at `path`, starting it if needed, and print its output.
+
+    Returns the exit status of the check, or None if the daemon couldn't be reached and the check should run here.
+    """
+    connection = _connect(path)
+    if connection is None:
+        _start(path)
+        deadline = time.monotonic() + _START_TIMEOUT
+        while connection is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+            connection = _connect(path)
+        if connection is None:
+            return None
+
+    answered = False
+    # A daemon that is just exiting after its idle timeout may close the connection without answering.
+    with connection, connection.makefile("rw", encoding="utf-8") as file, contextlib.suppress(OSError):
+        file.write(json.dumps({"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}) + "\n")
+        file.flush()
+        for line in file:
+            message = json.loads(line)
+            if "exit" in message:
+                return message["exit"]
+            stream = sys.stdout if "stdout" in message else sys.stderr
+            stream.write(message.get("stdout", message.get("stderr")))
+            stream.flush()
+            answered = True
+    if not answered:
+        return None
+    print("check-gha-pinning: the daemon stopped before finishing the check", file=sys.stderr)
+    return 1
+
+
+class Session:
+    """What the daemon keeps between the checks it runs: the looked up tags and the results of files, in memory."""
+
+    def __init__(self) -> None:
+        from check_gha_pinning import ActionTags
+
+        self._tags = MemoryCache(encode=ActionTags.to_json, decode=ActionTags.from_json)
+        self._results = MemoryCache(ttl=math.inf)
+
+    def check(self, argv: list[str]) -> int:
+        from check_gha_pinning import _check_main, _parse_args
+
+        args = _parse_args(argv)
+        self._tags.ttl = args.cache_ttl
+        self._tags.backing = DiskCache("tags", ttl=args.cache_ttl)
+        # Results of unchanged files are always reused from memory, but only shared on disk with --incremental.
+        self._results.backing = DiskCache("results", ttl=math.inf) if args.incremental else None
+        args.incremental = True
+        return _check_main(args, self._tags, self._results)
+
+
+def _parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="check-gha-pinning daemon",
+        description="Run the checks of `check-gha-pinning --daemon` clients. Started by the clients when needed.",
+    )
+    parser.add_argument("--socket", type=pathlib.Path, help="Unix socket to listen on (default: one per installation)")
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=os.getenv("GHA_PINNING_DAEMON_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT),
+        help="seconds without checks after which the daemon exits "
+        "(default: %(default)s, env: GHA_PINNING_DAEMON_IDLE_TIMEOUT)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str]) -> int:
+    args = _parse_args(argv)
+    serve(args.socket or socket_path(), Session().check, args.idle_timeout)
+    return os.EX_OK
@@ -0,0 +1,158 @@
+"""Discovery of the workflow and action files to check in a directory tree.
+
+Directories are walked with `os.scandir`, and directories ignored by git are pruned before they are entered, so the
+cost depends on the size of the tracked tree, not e.g. on the size of `node_modules`.
+"""
+
+import os
+import pathlib
+import re
+from collections.abc import Iterable, Iterator
+
+from check_gha_pinning import _stats
+
+SUFFIXES = (".yml", ".yaml")
+
+
+class _Pattern:
+    """A single `.gitignore` pattern, matched against paths relative to the directory of its `.gitignore` file."""
+
+    __slots__ = ("regex", "negated", "dir_only")
+
+    def __init__(self, regex: re.Pattern, negated: bool, dir_only: bool) -> None:
+        self.regex = regex
+        self.negated = negated
+        self.dir_only = dir_only
+
+
+def _translate(pattern: str) -> str:
+    i = 0
+    regex = ""
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("**", i) and i + 2 == len(pattern):
+            regex += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        elif pattern[i] == "[" and (end := pattern.find("]", i + 2)) != -1:
+            group = pattern[i + 1 : end].replace("\\", "\\\\")
+            regex += "[^" + group[1:] + "]" if group[0] in "!^" else "[" + group + "]"
+            i = end + 1
+        elif pattern[i] == "\\" and i + 1 < len(pattern):
+            regex += re.escape(pattern[i + 1])
+            i += 2
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return regex
+
+
+def _parse_pattern(line: str) -> _Pattern | None:
+    line = line.rstrip("\n\r")
+    if line.endswith(" ") and not line.endswith("\\ "):
+        line = line.rstrip(" ")
+    if not line or line.startswith("#"):
+        return None
+    negated = line.startswith("!")
+    if negated or line.startswith(("\\!", "\\#")):
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    # Patterns with a slash at the start or in the middle only match relative to the `.gitignore` file.
+    anchored = "/" in line
+    regex = _translate(line.lstrip("/"))
+    if not anchored:
+        regex = "(?:.*/)?" + regex
+    return _Pattern(re.compile(regex, re.DOTALL), negated, dir_only)
+
+
+def _read_patterns(file: pathlib.Path) -> list[_Pattern]:
+    try:
+        lines = file.read_text(errors="replace").splitlines()
+    except OSError:
+        return []
+    return [pattern for line in lines if (pattern := _parse_pattern(line)) is not None]
+
+
+class _IgnoreRules:
+    """The `.gitignore` patterns in effect for a directory, from the repo root down to the directory itself."""
+
+    def __init__(self, levels: list[tuple[pathlib.Path, list[_Pattern]]]) -> None:
+        self._levels = levels
+
+    @classmethod
+    def for_directory(cls, directory: pathlib.Path) -> "_IgnoreRules":
+        """Collect the rules of the repo containing the absolute `directory`, up to and including the directory."""
+        for root in (directory, *directory.parents):
+            if (root / ".git").exists():
+                break
+        else:
+            return cls([(directory, _read_patterns(directory / ".gitignore"))])
+        levels = [(root, _read_patterns(root / ".git" / "info" / "exclude"))]
+        relative = directory.relative_to(root)
+        for parent in (*reversed(relative.parents), relative):
+            levels.append((root / parent, _read_patterns(root / parent / ".gitignore")))
+        return cls(levels)
+
+    def child(self, directory: pathlib.Path) -> "_IgnoreRules":
+        patterns = _read_patterns(directory / ".gitignore")
+        return _IgnoreRules([*self._levels, (directory, patterns)]) if patterns else self
+
+    def ignored(self, path: pathlib.Path, is_dir: bool) -> bool:
+        ignored = False
+        for base, patterns in self._levels:
+            relative = path.relative_to(base).as_posix()
+            for pattern in patterns:
+                if (is_dir or not pattern.dir_only) and pattern.regex.fullmatch(relative):
+                    ignored = not pattern.negated
+        return ignored
+
+
+def _is_candidate(name: str) -> bool:
+    return name.endswith(SUFFIXES)
+
+
+def find_yaml_files(directory: pathlib.Path) -> Iterator[pathlib.Path]:
+    """Yield the YAML files below `directory` that aren't ignored by git, without entering ignored directories."""
+    absolute = directory.resolve()
+    # Ignore rules are matched against absolute paths, the yielded paths keep the form of `directory`.
+    stack = [(directory, absolute, _IgnoreRules.for_directory(absolute))]
+    while stack:
+        current, current_absolute, rules = stack.pop()
+        try:
+            entries = list(os.scandir(current))
+        except OSError:
+            continue
+        for entry in entries:
+            path, path_absolute = current / entry.name, current_absolute / entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name != ".git" and not rules.ignored(path_absolute, is_dir=True):
+                    stack.append((path, path_absolute, rules.child(path_absolute)))
+            elif _is_candidate(entry.name) and entry.is_file() and not rules.ignored(path_absolute, is_dir=False):
+                yield path
+
+
+def git_ls_files(directories: Iterable[pathlib.Path]) -> list[pathlib.Path]:
+    """Return the YAML files below `directories` that are tracked by git, listed in a single `git ls-files` call."""
+    directories = list(directories)
+    if not directories:
+        return []
+    import subprocess
+
+    _stats.count("subprocesses")
+    output = subprocess.check_output(["git", "ls-files", "-z", "--", *map(str, directories)], text=True)
+    # Tracked files can be deleted in the working tree.
+    return [path for name in output.split("\0") if _is_candidate(name) and (path := pathlib.Path(name)).is_file()]
@@ -0,0 +1,66 @@
+"""Read files of remote git repos at a commit, fetching nothing but that commit."""
+
+import threading
+
+from check_gha_pinning import _stats
+
+
+class FetchError(Exception):
+    """The commit couldn't be fetched."""
+
+
+class GitFetcher:
+    """Fetches commits with `git fetch --depth 1` into a temporary bare repo, each commit only once.
+
+    Remotes have to allow fetching commits by hash, which GitHub does for every commit of a repo.
+    """
+
+    def __init__(self, timeout: float | None = None) -> None:
+        import tempfile
+
+        self._timeout = timeout
+        self._directory = tempfile.TemporaryDirectory(prefix="check-gha-pinning-")
+        self._fetched: set[tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _git(self, *args: str) -> bytes:
+        import subprocess
+
+        _stats.count("subprocesses")
+        cmd = ["git", "-C", self._directory.name, *args]
+        try:
+            return subprocess.check_output(cmd, stderr=subprocess.PIPE, timeout=self._timeout)
+        except subprocess.TimeoutExpired as ex:
+            raise FetchError(f"git {args[0]} timed out after {ex.timeout:g}s") from ex
+        except subprocess.CalledProcessError as ex:
+            lines = ex.stderr.decode(errors="replace").splitlines()
+            fatal = [line.removeprefix("fatal: ") for line in lines if line.startswith("fatal: ")]
+            raise FetchError(fatal[0] if fatal else f"git {args[0]} failed with exit code {ex.returncode}") from ex
+
+    def _fetch(self, url: str, commit: str) -> None:
+        # One fetch at a time, they would race for the shallow file of the repo.
+        with self._lock:
+            if (url, commit) in self._fetched:
+                return
+            if not self._initialized:
+                self._git("init", "--quiet", "--bare")
+                self._initialized = True
+            self._git("fetch", "--quiet", "--depth=1", "--no-tags", url, commit)
+            self._fetched.add((url, commit))
+
+    def read(self, url: str, commit: str, paths: list[str]) -> tuple[str, bytes] | None:
+        """Return the first of `paths` that exists in the repo at `url` at `commit`, and its content.
+
+        Returns None if none of them exist. Raises `FetchError` if the commit can't be fetched or read, e.g. on a timeout,
+        so that failures aren't taken for missing files.
+        """
+        self._fetch(url, commit)
+        existing = set(self._git("ls-tree", "-z", "--name-only", commit, "--", *paths).split(b"\0"))
+        for path in paths:
+            if path.encode() in existing:
+                return path, self._git("cat-file", "blob", f"{commit}:{path}")
+        return None
+
+    def close(self) -> None:
+        self._directory.cleanup()
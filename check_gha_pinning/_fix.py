@@ -0,0 +1,90 @@
+"""Rewrite the `uses:` entries of a workflow file in place, keeping everything else of the file as it is."""
+
+import os
+import pathlib
+import re
+from collections.abc import Iterable
+from typing import NamedTuple
+
+
+class Fix(NamedTuple):
+    """Replace `action` in the `uses:` entry reported at `line` with `pinned`, and add a `# comment` after it.
+
+    `line` is where the entry starts, which for a step written as a mapping can be a line before the `uses:` key.
+    """
+
+    line: int
+    action: str
+    pinned: str
+    comment: str
+
+    def pattern(self) -> str:
+        # The value may be quoted, and is followed by whitespace, the end of the line or the end of a flow mapping.
+        return rf"(\buses:\s*)([\"']?){re.escape(self.action)}\2(?=[\s,}}]|$)"
+
+
+def _fix_line(line: str, fix: Fix) -> str | None:
+    """Return `line` with `fix` applied, or None if its `uses:` entry isn't on that line."""
+    match = re.search(fix.pattern(), line)
+    if match is None:
+        return None
+    quote = match[2]
+    head = f"{line[: match.start()]}{match[1]}{quote}{fix.pinned}{quote}"
+    rest = line[match.end() :]
+    comment = re.search(r"(^|\s)#", rest)
+    if comment is None:
+        return f"{head}{rest.rstrip()} # {fix.comment}"
+    # A comment with the old ref (or the new tag) is the one this replaces, any other comment is kept after it.
+    if rest[comment.end() :].strip() in (fix.action.rpartition("@")[2], fix.comment):
+        return f"{head}{rest[: comment.end()]} {fix.comment}"
+    return f"{head}{rest[: comment.start()]} # {fix.comment}{rest[comment.start() :]}"
+
+
+def fix_file(file: pathlib.Path, fixes: Iterable[Fix], ignore: str | None = None) -> list[Fix]:
+    """Apply `fixes` to `file` in one pass over its lines, and return the fixes that were applied.
+
+    The file is rewritten atomically, and only if a fix was applied. Lines containing `ignore` are left alone.
+    Line endings, indentation, quotes and comments are kept.
+    """
+    pending = sorted(fixes)
+    applied: list[Fix] = []
+    if not pending:
+        return applied
+
+    import shutil
+    import tempfile
+
+    fd, tmp = tempfile.mkstemp(dir=file.parent, prefix=f".{file.name}.", suffix=".tmp")
+    try:
+        with file.open("rb") as source, os.fdopen(fd, "wb") as target:
+            for number, data in enumerate(source, start=1):
+                if pending and pending[0].line <= number and (ignore is None or ignore.encode() not in data):
+                    data = _fix_data(data, number, pending, applied)
+                target.write(data)
+        if applied:
+            shutil.copymode(file, tmp)
+            os.replace(tmp, file)
+            return applied
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    os.unlink(tmp)
+    return applied
+
+
+def _fix_data(data: bytes, number: int, pending: list[Fix], applied: list[Fix]) -> bytes:
+    """Apply the first pending fixes that match the line `data`, moving them from `pending` to `applied`."""
+    try:
+        line = data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data
+    ending = line[len(line.rstrip("\r\n")) :]
+    line = line[: len(line) - len(ending)]
+    for fix in list(pending):
+        if fix.line > number:
+            break
+        if (fixed := _fix_line(line, fix)) is not None:
+            line = fixed
+            pending.remove(fix)
+            applied.append(fix)
+    return f"{line}{ending}".encode()
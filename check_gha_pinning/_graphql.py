@@ -0,0 +1,109 @@
+"""Client for looking up the tags of many repos with few requests to the GitHub GraphQL API.
+
+The tags of up to `BATCH_SIZE` repos are requested in a single query, and the HTTP connections are kept open and
+reused for later requests.
+"""
+
+import json
+import os
+import urllib.parse
+
+from check_gha_pinning._http import ConnectionPool, HTTPError
+from check_gha_pinning._snapshot import STATUS_NO_TAGS, STATUS_NOT_FOUND, STATUS_OK
+
+DEFAULT_URL = "https://api.github.com/graphql"
+BATCH_SIZE = 50
+_PAGE_SIZE = 100
+
+_REPO_QUERY = (
+    "r{i}: repository(owner: $owner{i}, name: $name{i}) {{"
+    ' refs(refPrefix: "refs/tags/", first: {page_size}, after: $after{i}) {{'
+    " pageInfo {{ hasNextPage endCursor }} nodes {{ name target {{ oid ... on Tag {{ target {{ oid }} }} }} }} }} }}"
+)
+
+
+class GraphQLError(Exception):
+    """The GraphQL API returned an error that isn't about a single repo."""
+
+
+def _query(count: int) -> str:
+    params = ", ".join(f"$owner{i}: String!, $name{i}: String!, $after{i}: String" for i in range(count))
+    fields = "\n".join(_REPO_QUERY.format(i=i, page_size=_PAGE_SIZE) for i in range(count))
+    return f"query({params}) {{\n{fields}\n}}"
+
+
+def default_token() -> str | None:
+    return os.getenv("GITHUB_TOKEN") or os.getenv("GH_TOKEN")
+
+
+class GraphQLClient:
+    """Sends GraphQL queries over a pool of up to `pool_size` idle keep-alive connections. Safe to use from threads."""
+
+    def __init__(
+        self, url: str = DEFAULT_URL, token: str | None = None, pool_size: int = 4, timeout: float = 30.0
+    ) -> None:
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"unsupported GraphQL URL {url}")
+        self.url = url
+        self._pool = ConnectionPool(parts.scheme, parts.netloc, size=pool_size, timeout=timeout)
+        self._path = urllib.parse.urlunsplit(("", "", parts.path or "/", parts.query, ""))
+        self._token = token
+
+    def post(self, payload: dict) -> dict:
+        headers = {"Content-Type": "application/json"}
+        if self._token:
+            headers["Authorization"] = f"bearer {self._token}"
+        try:
+            response = self._pool.request("POST", self._path, json.dumps(payload).encode(), headers)
+        except HTTPError as ex:
+            raise GraphQLError(f"GraphQL request to {self.url} failed: {ex}") from ex
+        if response.status != 200:
+            raise GraphQLError(f"GraphQL request to {self.url} failed: HTTP {response.status} {response.body[:200]!r}")
+        return json.loads(response.body)
+
+    def fetch_tags(self, repos: list[str]) -> list[tuple[str, dict[str, str]]]:
+        """Return the status and the tags of each `owner/name` repo, in as few queries as possible."""
+        statuses = [STATUS_OK] * len(repos)
+        tags: list[dict[str, str]] = [{} for _ in repos]
+        cursors: list[str | None] = [None] * len(repos)
+        pending = list(range(len(repos)))
+        while pending:
+            more = []
+            for start in range(0, len(pending), BATCH_SIZE):
+                batch = pending[start : start + BATCH_SIZE]
+                variables = {}
+                for i, index in enumerate(batch):
+                    owner, name = repos[index].split("/", 1)
+                    variables |= {f"owner{i}": owner, f"name{i}": name, f"after{i}": cursors[index]}
+                response = self.post({"query": _query(len(batch)), "variables": variables})
+                data = response.get("data") or {}
+                errors = response.get("errors") or []
+                not_found = {
+                    error["path"][0] for error in errors if error.get("type") == "NOT_FOUND" and error.get("path")
+                }
+                for i, index in enumerate(batch):
+                    repo = data.get(f"r{i}")
+                    if repo is None:
+                        if f"r{i}" not in not_found:
+                            message = errors[0].get("message") if errors else "no data"
+                            raise GraphQLError(f"GraphQL query to {self.url} failed: {message}")
+                        statuses[index] = STATUS_NOT_FOUND
+                        continue
+                    for node in repo["refs"]["nodes"]:
+                        # Annotated tags point to a tag object, which points to the commit.
+                        tags[index][node["name"]] = (node["target"].get("target") or node["target"])["oid"]
+                    if repo["refs"]["pageInfo"]["hasNextPage"]:
+                        cursors[index] = repo["refs"]["pageInfo"]["endCursor"]
+                        more.append(index)
+            pending = more
+
+        results = []
+        for status, repo_tags in zip(statuses, tags):
+            if status == STATUS_OK and not repo_tags:
+                status = STATUS_NO_TAGS
+            results.append((status, repo_tags))
+        return results
+
+    def close(self) -> None:
+        self._pool.close()
@@ -0,0 +1,77 @@
+"""Pool of keep-alive HTTP connections to one server, shared by the clients of web APIs."""
+
+import queue
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    import http.client
+
+from check_gha_pinning import _stats
+
+
+class HTTPError(Exception):
+    """The request couldn't be sent or the response couldn't be read."""
+
+
+class Response(NamedTuple):
+    status: int
+    headers: "http.client.HTTPMessage"
+    body: bytes
+
+
+class ConnectionPool:
+    """Sends requests over up to `size` idle keep-alive connections to `host`. Safe to use from threads."""
+
+    def __init__(self, scheme: str, host: str, size: int = 4, timeout: float = 30.0) -> None:
+        import http.client
+
+        if scheme not in ("http", "https"):
+            raise ValueError(f"unsupported URL scheme {scheme}")
+        self.host = host
+        self._connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        self._timeout = timeout
+        self._idle: queue.LifoQueue[http.client.HTTPConnection] = queue.LifoQueue(maxsize=size)
+
+    def _acquire(self) -> "tuple[http.client.HTTPConnection, bool]":
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            _stats.count("http_connections")
+            return self._connection_class(self.host, timeout=self._timeout), False
+
+    def _release(self, connection: "http.client.HTTPConnection") -> None:
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def request(
+        self, method: str, path: str, body: bytes | None = None, headers: dict[str, str] | None = None
+    ) -> Response:
+        import http.client
+
+        headers = {"User-Agent": "check-gha-pinning", **(headers or {})}
+        while True:
+            connection, reused = self._acquire()
+            _stats.count("http_requests")
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError) as ex:
+                connection.close()
+                if reused:
+                    continue  # The server may have closed the idle connection, retry on a new one.
+                raise HTTPError(str(ex)) from ex
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(connection)
+            return Response(response.status, response.headers, data)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
@@ -0,0 +1,137 @@
+"""Client for looking up the digests of container images with the Docker Registry HTTP API V2.
+
+The digest of `image:tag` is the `Docker-Content-Digest` of its manifest (or manifest list, for multi-platform
+images), which is what `image@sha256:...` pins. Connections are kept open and reused for later requests.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import urllib.parse
+from typing import NamedTuple
+
+from check_gha_pinning._http import ConnectionPool, HTTPError, Response
+
+DOCKER_HUB = "registry-1.docker.io"
+_DOCKER_HUB_NAMES = ("docker.io", "index.docker.io", DOCKER_HUB)
+_LOOPBACK = ("localhost", "127.0.0.1", "::1")
+_MANIFEST_TYPES = (
+    "application/vnd.oci.image.index.v1+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+    "application/vnd.oci.image.manifest.v1+json",
+    "application/vnd.docker.distribution.manifest.v2+json",
+)
+_DIGEST = r"^sha256:[0-9a-f]{64}$"
+
+
+class RegistryError(Exception):
+    """The registry couldn't be asked for the digest."""
+
+
+class ImageNotFoundError(RegistryError):
+    """The registry doesn't have the image or tag."""
+
+
+class ImageReference(NamedTuple):
+    registry: str
+    repository: str
+    tag: str
+
+
+def parse_image(image: str) -> ImageReference:
+    """Split `[registry/]repository[:tag]` like docker does, e.g. `alpine` is `library/alpine:latest` on Docker Hub."""
+    name, tag = image, "latest"
+    if ":" in image.rpartition("/")[2]:
+        name, _, tag = image.rpartition(":")
+    first, _, rest = name.partition("/")
+    if rest and ("." in first or ":" in first or first == "localhost"):
+        registry, repository = first, rest
+    else:
+        registry, repository = DOCKER_HUB, name
+    if registry in _DOCKER_HUB_NAMES:
+        registry = DOCKER_HUB
+        if "/" not in repository:
+            repository = f"library/{repository}"
+    return ImageReference(registry, repository, tag)
+
+
+class RegistryClient:
+    """Looks up manifest digests over pools of up to `pool_size` idle keep-alive connections per host.
+
+    Where a registry asks for a token, an anonymous pull token is requested and reused for the same repository.
+    Registries on the loopback interface are spoken to over plain HTTP, like docker does. Safe to use from threads.
+    """
+
+    def __init__(self, pool_size: int = 4, timeout: float = 30.0) -> None:
+        self._pool_size = pool_size
+        self._timeout = timeout
+        self._pools: dict[tuple[str, str], ConnectionPool] = {}
+        self._tokens: dict[tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, scheme: str, host: str) -> ConnectionPool:
+        with self._lock:
+            if (pool := self._pools.get((scheme, host))) is None:
+                pool = self._pools[(scheme, host)] = ConnectionPool(scheme, host, self._pool_size, self._timeout)
+            return pool
+
+    def _request(self, url: str, method: str = "GET", headers: dict[str, str] | None = None) -> Response:
+        parts = urllib.parse.urlsplit(url)
+        path = urllib.parse.urlunsplit(("", "", parts.path or "/", parts.query, ""))
+        try:
+            return self._pool(parts.scheme, parts.netloc).request(method, path, headers=headers)
+        except (HTTPError, ValueError) as ex:
+            raise RegistryError(f"request to {parts.netloc} failed: {ex}") from ex
+
+    def _token(self, challenge: str) -> str:
+        """Request an anonymous token as described by a `WWW-Authenticate: Bearer realm=...` challenge."""
+        params = dict(re.findall(r'(\w+)="([^"]*)"', challenge))
+        if not challenge.lower().startswith("bearer ") or "realm" not in params:
+            raise RegistryError(f"unsupported authentication: {challenge}")
+        query = urllib.parse.urlencode({key: value for key, value in params.items() if key in ("service", "scope")})
+        response = self._request(f"{params['realm']}?{query}")
+        if response.status != 200:
+            raise RegistryError(f"token request to {params['realm']} failed: HTTP {response.status}")
+        try:
+            data = json.loads(response.body)
+            token = data.get("token") or data.get("access_token")
+        except (ValueError, AttributeError) as ex:
+            raise RegistryError(f"token request to {params['realm']} returned invalid JSON") from ex
+        if not isinstance(token, str) or not token:
+            raise RegistryError(f"token request to {params['realm']} returned no token")
+        return token
+
+    def _manifest(self, url: str, method: str, reference: ImageReference) -> Response:
+        key = (reference.registry, reference.repository)
+        headers = {"Accept": ", ".join(_MANIFEST_TYPES)}
+        if token := self._tokens.get(key):
+            headers["Authorization"] = f"Bearer {token}"
+        response = self._request(url, method, headers)
+        if response.status == 401 and "Authorization" not in headers:
+            self._tokens[key] = self._token(response.headers.get("WWW-Authenticate", ""))
+            headers["Authorization"] = f"Bearer {self._tokens[key]}"
+            response = self._request(url, method, headers)
+        if response.status == 404:
+            raise ImageNotFoundError(f"{reference.repository}:{reference.tag} not found on {reference.registry}")
+        if response.status != 200:
+            raise RegistryError(f"manifest request to {reference.registry} failed: HTTP {response.status}")
+        return response
+
+    def digest(self, image: str) -> str:
+        """Return the `sha256:...` digest `image` (`[registry/]repository[:tag]`) currently points to."""
+        reference = parse_image(image)
+        scheme = "http" if urllib.parse.urlsplit(f"//{reference.registry}").hostname in _LOOPBACK else "https"
+        url = f"{scheme}://{reference.registry}/v2/{reference.repository}/manifests/{reference.tag}"
+        digest = self._manifest(url, "HEAD", reference).headers.get("Docker-Content-Digest", "")
+        if not re.match(_DIGEST, digest):
+            # Not every registry sends the header, the digest is the hash of the manifest as the registry stores it.
+            response = self._manifest(url, "GET", reference)
+            digest = f"sha256:{hashlib.sha256(response.body).hexdigest()}"
+        return digest
+
+    def close(self) -> None:
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
+            self._pools.clear()
@@ -0,0 +1,324 @@
+"""Line scanner that finds the `uses` entries of a workflow without building a full YAML document.
+
+It understands the subset of block YAML that workflows are normally written in. For anything else (flow-style
+collections in the jobs tree, anchors and aliases, tags, multi-line plain or quoted scalars, duplicate keys, ...)
+`scan_uses` returns None, and the caller has to fall back to a real YAML parser.
+"""
+
+import functools
+import re
+
+_KEY = re.compile(r"([A-Za-z0-9_][A-Za-z0-9_.\-/ ]*?) *:(?: +|$)")
+_BLOCK_SCALAR_HEADER = re.compile(r"[|>][-+]?(?:[ \t]+#.*)?[ \t]*")
+_NON_STRING = re.compile(
+    r"~|null|Null|NULL|true|True|TRUE|false|False|FALSE"
+    r"|[-+]?(?:[0-9][0-9_]*(?:\.[0-9_]*)?|\.[0-9_]+)(?:[eE][-+]?[0-9]+)?"
+    r"|[-+]?\.(?:inf|Inf|INF)|\.(?:nan|NaN|NAN)|0o[0-7_]+|0x[0-9a-fA-F_]+"
+    r"|[0-9]{4}-[0-9][0-9]?-[0-9][0-9]?(?:[Tt ].*)?"
+)
+
+
+@functools.cache
+def _non_printable() -> re.Pattern[str]:
+    # Compiling this pattern takes milliseconds, don't pay for it when importing the module.
+    return re.compile("[^\x09\x0a\x0d\x20-\x7e\x85\xa0-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]")
+
+
+class _Fallback(Exception):
+    """The document uses YAML the scanner doesn't handle."""
+
+
+class _Map:
+    __slots__ = ("line", "entries")
+
+    def __init__(self, line: int) -> None:
+        self.line = line
+        self.entries: dict[str, tuple[int, object]] = {}
+
+
+class _Seq:
+    __slots__ = ("items",)
+
+    def __init__(self) -> None:
+        self.items: list[object] = []
+
+
+class _Scalar:
+    """A single-line scalar. `value` is None if it isn't a plain string (e.g. a number or an escaped string)."""
+
+    __slots__ = ("value", "comment")
+
+    def __init__(self, value: str | None, comment: str) -> None:
+        self.value = value
+        self.comment = comment
+
+
+_OTHER = object()  # Block scalars and flow collections, which are never needed to find `uses` entries.
+
+
+def _is_seq_item(content: str) -> bool:
+    return content == "-" or content.startswith(("- ", "-\t"))
+
+
+def _split_comment(text: str) -> tuple[str, str]:
+    match = re.search(r"[ \t]#", text)
+    if not match:
+        return text.rstrip(" \t"), ""
+    return text[: match.start()].rstrip(" \t"), text[match.start() :].strip(" \t")
+
+
+def _tab_before_comment(text: str) -> bool:
+    """Whether `text` has a tab outside its comment, e.g. trailing a scalar, which ruamel rejects."""
+    match = re.search(r"[ \t]#", text)
+    return "\t" in (text[: match.end() - 1] if match else text)
+
+
+def _quoted_end(text: str) -> int:
+    quote = text[0]
+    i = 1
+    while i < len(text):
+        if quote == '"' and text[i] == "\\":
+            i += 2
+        elif text[i] == quote:
+            if quote == "'" and text[i + 1 : i + 2] == "'":
+                i += 2
+            else:
+                return i
+        else:
+            i += 1
+    raise _Fallback("multi-line quoted scalar")
+
+
+def _flow_end(text: str) -> int:
+    depth = 0
+    i = 0
+    while i < len(text):
+        if text[i] in "\"'":
+            i = _quoted_end(text[i:]) + i
+        elif text[i] in "[{":
+            depth += 1
+        elif text[i] in "]}":
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    raise _Fallback("multi-line flow collection")
+
+
+class _Parser:
+    def __init__(self, lines: list[str]) -> None:
+        self.lines = lines
+        self.pos = 0
+        # Content after a "- " indicator, parsed as if it was on its own line at that column.
+        self.virtual: tuple[int, str] | None = None
+
+    def peek(self) -> tuple[int, str] | None:
+        """Return indentation and content of the next line that isn't blank or a comment."""
+        if self.virtual is not None:
+            return self.virtual
+        while self.pos < len(self.lines):
+            line = self.lines[self.pos]
+            content = line.lstrip(" ")
+            if content.strip(" \t") and not content.lstrip(" \t").startswith("#"):
+                if content.startswith("\t"):
+                    raise _Fallback("tab indentation")
+                return len(line) - len(content), content
+            self.pos += 1
+        return None
+
+    def advance(self) -> None:
+        self.virtual = None
+        self.pos += 1
+
+    def parse_document(self) -> object:
+        nxt = self.peek()
+        if nxt is not None and re.fullmatch(r"---(?:[ \t]+#.*)?[ \t]*", nxt[1]) and nxt[0] == 0:
+            self.advance()
+        root = self.parse_node(-1)
+        if self.peek() is not None:
+            raise _Fallback("content after the root node")
+        return root
+
+    def parse_node(self, parent_indent: int, indentless_seq: bool = False) -> object:
+        nxt = self.peek()
+        if nxt is None:
+            return None
+        indent, content = nxt
+        if indent > parent_indent or (indentless_seq and indent == parent_indent and _is_seq_item(content)):
+            if _is_seq_item(content):
+                return self.parse_seq(indent)
+            if _KEY.match(content):
+                return self.parse_map(indent)
+            raise _Fallback("multi-line scalar")
+        return None
+
+    def parse_map(self, indent: int) -> _Map:
+        node = _Map(self.pos)
+        while (nxt := self.peek()) is not None:
+            line_indent, content = nxt
+            if line_indent < indent:
+                break
+            if line_indent > indent:
+                raise _Fallback("unexpected indentation")
+            match = _KEY.match(content)
+            if not match:
+                raise _Fallback("not a simple key")
+            key = match.group(1)
+            if key in node.entries or _NON_STRING.fullmatch(key):
+                raise _Fallback("duplicate or non-string key")
+            key_line = self.pos
+            node.entries[key] = (key_line, self.parse_value(content[match.end() :], indent))
+        return node
+
+    def parse_seq(self, indent: int) -> _Seq:
+        node = _Seq()
+        while (nxt := self.peek()) is not None:
+            line_indent, content = nxt
+            if line_indent < indent:
+                break
+            if line_indent > indent:
+                raise _Fallback("unexpected indentation")
+            if not _is_seq_item(content):
+                break  # The mapping that contains this indentless sequence continues.
+            rest = content[1:].lstrip(" ")
+            if rest.startswith("\t"):
+                raise _Fallback("tab indentation")
+            if not rest or rest.startswith("#"):
+                self.advance()
+                node.items.append(self.parse_node(indent))
+                continue
+            column = line_indent + len(content) - len(rest)
+            self.virtual = (column, rest)
+            if _is_seq_item(rest):
+                node.items.append(self.parse_seq(column))
+            elif _KEY.match(rest):
+                node.items.append(self.parse_map(column))
+            else:
+                node.items.append(self.parse_value(rest, indent))
+        return node
+
+    def parse_value(self, text: str, indent: int) -> object:
+        """Parse the value `text` that follows a key or sequence indicator in a node indented by `indent`."""
+        if not text or text.startswith("#"):
+            self.advance()
+            return self.parse_node(indent, indentless_seq=True)
+        first = text[0]
+        if first in "|>":
+            if not _BLOCK_SCALAR_HEADER.fullmatch(text):
+                raise _Fallback("unsupported block scalar header")
+            self.advance()
+            self.skip_block_scalar(indent)
+            return _OTHER
+        if first in "[{":
+            end = _flow_end(text)
+            if _split_comment(" " + text[end + 1 :])[0]:
+                raise _Fallback("content after flow collection")
+            if _tab_before_comment(text[end + 1 :]):
+                raise _Fallback("tab after flow collection")
+            self.advance()
+            return _OTHER
+        if first in "\"'":
+            end = _quoted_end(text)
+            rest, comment = _split_comment(" " + text[end + 1 :])
+            if rest:
+                raise _Fallback("content after quoted scalar")
+            if _tab_before_comment(text[end + 1 :]):
+                raise _Fallback("tab after quoted scalar")
+            inner = text[1:end]
+            if first == "'":
+                value = inner.replace("''", "'")
+            else:
+                value = None if "\\" in inner else inner
+            self.advance()
+            return _Scalar(value, comment)
+        if first in "&*!%@`,]}?:#" or _is_seq_item(text):
+            raise _Fallback("anchor, alias, tag or reserved indicator")
+        if _tab_before_comment(text):
+            raise _Fallback("tab in or after plain scalar")
+        value, comment = _split_comment(text)
+        if ": " in value or ":\t" in value or value.endswith(":"):
+            raise _Fallback("mapping in plain scalar")
+        self.advance()
+        return _Scalar(None if _NON_STRING.fullmatch(value) else value, comment)
+
+    def skip_block_scalar(self, indent: int) -> None:
+        content_indent = None
+        leading_blank = 0
+        while self.pos < len(self.lines):
+            line = self.lines[self.pos]
+            stripped = line.lstrip(" ")
+            if not stripped:
+                if content_indent is None:
+                    leading_blank = max(leading_blank, len(line))
+                self.pos += 1
+                continue
+            line_indent = len(line) - len(stripped)
+            if content_indent is None:
+                if line_indent <= indent:
+                    break
+                if leading_blank > line_indent:
+                    raise _Fallback("leading blank lines are indented more than the block scalar")
+                content_indent = line_indent
+            elif line_indent < content_indent:
+                break
+            self.pos += 1
+
+
+def _steps_with_uses(steps: object) -> list[_Map]:
+    if not isinstance(steps, _Seq) or not all(isinstance(step, _Map) for step in steps.items):
+        raise _Fallback("unexpected steps")
+    return [step for step in steps.items if "uses" in step.entries]
+
+
+def _find_uses(root: object) -> list[tuple[int, _Scalar]]:
+    """Mirror of the ruamel based lookup: `jobs.*.uses`, then `jobs.*.steps[*].uses`, then `runs.steps[*].uses`."""
+    if not isinstance(root, _Map):
+        return []
+    uses: list[_Map] = []
+    if "jobs" in root.entries:
+        jobs = root.entries["jobs"][1]
+        if not isinstance(jobs, _Map) or not all(isinstance(job, _Map) for _, job in jobs.entries.values()):
+            raise _Fallback("unexpected jobs")
+        uses.extend(job for _, job in jobs.entries.values() if "uses" in job.entries)
+        for _, job in jobs.entries.values():
+            if "steps" in job.entries:
+                uses.extend(_steps_with_uses(job.entries["steps"][1]))
+
+    runs = root.entries.get("runs", (None, None))[1]
+    if isinstance(runs, _Map) and "using" in runs.entries:
+        using = runs.entries["using"][1]
+        if not isinstance(using, _Scalar) or using.value is None:
+            raise _Fallback("using is not a string")
+        if using.value == "composite" and runs.entries.get("steps", (None, None))[1] is not None:
+            uses.extend(_steps_with_uses(runs.entries["steps"][1]))
+
+    found = []
+    for item in uses:
+        value = item.entries["uses"][1]
+        if not isinstance(value, _Scalar) or value.value is None:
+            raise _Fallback("uses is not a string")
+        found.append((item.line, value))
+    return found
+
+
+def scan_uses(text: str, pragma: str) -> list[tuple[int, str]] | None:
+    """Return the 1-based line and action of each `uses` entry that isn't ignored with `pragma`.
+
+    The line is the first line of the job or step mapping, like `ruamel.yaml` reports it.
+    Returns None if the document can't be handled by the scanner.
+    """
+    text = text.removeprefix("\ufeff")
+    if _non_printable().search(text) or "\r" in text.replace("\r\n", ""):
+        return None
+    lines = text.replace("\r\n", "\n").split("\n")
+    try:
+        found = _find_uses(_Parser(lines).parse_document())
+    except _Fallback:
+        return None
+
+    # The pragma is only understood in the comment of the `uses` line itself. Elsewhere (e.g. on other lines of the
+    # same step), ruamel decides which entry the comment belongs to.
+    ignored = sum(pragma in value.comment for _, value in found)
+    if ignored != sum(pragma in line for line in lines):
+        return None
+    return [(line + 1, value.value) for line, value in found if pragma not in value.comment]
@@ -0,0 +1,201 @@
+"""Snapshot files holding the tags of many repos, so checks can resolve refs without network access, and the
+`snapshot` command that writes them.
+
+A snapshot is an SQLite database with one row per repo and one row per tag, indexed by repo and tag name. Lookups only
+read the pages they need (memory-mapped), so opening a large snapshot doesn't load it.
+"""
+
+import argparse
+import contextlib
+import os
+import pathlib
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Iterable
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from check_gha_pinning import ActionTagsByTag, TagResolver
+
+FORMAT_VERSION = 1
+
+STATUS_OK = "ok"
+STATUS_NOT_FOUND = "not-found"
+STATUS_NO_TAGS = "no-tags"
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE repos (repo TEXT PRIMARY KEY, status TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE tags (repo TEXT NOT NULL, tag TEXT NOT NULL, sha TEXT NOT NULL, PRIMARY KEY (repo, tag)) WITHOUT ROWID;
+"""
+
+
+class SnapshotError(Exception):
+    """The snapshot file can't be read."""
+
+
+class Snapshot:
+    """Read-only view of a snapshot file. Safe to use from several threads."""
+
+    def __init__(self, path: pathlib.Path) -> None:
+        import sqlite3
+
+        self.path = path
+        try:
+            self._db = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+            self._db.execute("PRAGMA mmap_size = 1073741824")
+            version = self._db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        except sqlite3.Error as ex:
+            raise SnapshotError(f"can't read snapshot {path}: {ex}") from ex
+        if version is None or int(version[0]) != FORMAT_VERSION:
+            raise SnapshotError(f"snapshot {path} has an unsupported format, create it again")
+        self._lock = threading.Lock()
+
+    def lookup(self, repo: str) -> tuple[str, dict[str, str]] | None:
+        """Return the status and the tags of `repo`, or None if the repo isn't in the snapshot."""
+        with self._lock:
+            row = self._db.execute("SELECT status FROM repos WHERE repo = ?", (repo,)).fetchone()
+            if row is None:
+                return None
+            rows = self._db.execute("SELECT tag, sha FROM tags WHERE repo = ?", (repo,))
+            return row[0], dict(rows.fetchall())
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def write_snapshot(path: pathlib.Path, repos: Iterable[tuple[str, str, dict[str, str]]]) -> None:
+    """Atomically write a snapshot of `(repo, status, tags)` entries to `path`."""
+    import sqlite3
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        with contextlib.closing(sqlite3.connect(tmp)) as db:
+            db.executescript(_SCHEMA)
+            with db:
+                db.executemany(
+                    "INSERT INTO meta VALUES (?, ?)", [("version", str(FORMAT_VERSION)), ("created", str(time.time()))]
+                )
+                for repo, status, tags in repos:
+                    db.execute("INSERT OR REPLACE INTO repos VALUES (?, ?)", (repo, status))
+                    db.executemany(
+                        "INSERT OR REPLACE INTO tags VALUES (?, ?, ?)", [(repo, *tag) for tag in tags.items()]
+                    )
+            db.execute("VACUUM")
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _repo_name(name: str) -> str:
+    from check_gha_pinning import _REPO
+
+    if not re.fullmatch(_REPO, name):
+        raise argparse.ArgumentTypeError(f"invalid repo {name!r}, expected OWNER/REPO")
+    return name
+
+
+def _parse_args(argv: list[str]) -> argparse.Namespace:
+    from check_gha_pinning import DEFAULT_CONCURRENCY
+
+    parser = argparse.ArgumentParser(
+        prog="check-gha-pinning snapshot",
+        description="Save the tags of the repos used by the workflows in a snapshot file for offline checks.",
+    )
+    parser.add_argument("paths", nargs="*", default=[".github/workflows"], help="workflow files or directories")
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=pathlib.Path,
+        default=pathlib.Path(os.getenv("GHA_PINNING_SNAPSHOT", "gha-pinning-snapshot.db")),
+        help="snapshot file to write (default: %(default)s, env: GHA_PINNING_SNAPSHOT)",
+    )
+    parser.add_argument(
+        "--repo",
+        action="append",
+        type=_repo_name,
+        default=[],
+        metavar="OWNER/REPO",
+        help="also include the tags of this repo, can be given multiple times",
+    )
+    parser.add_argument(
+        "--git-ls-files",
+        action="store_true",
+        default=bool(os.getenv("GHA_PINNING_GIT_LS_FILES")),
+        help="find the YAML files in directories with `git ls-files` instead of walking them "
+        "(env: GHA_PINNING_GIT_LS_FILES)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=os.getenv("GHA_PINNING_CONCURRENCY", DEFAULT_CONCURRENCY),
+        help="maximum number of repos resolved at the same time (default: %(default)s, env: GHA_PINNING_CONCURRENCY)",
+    )
+    return parser.parse_args(argv)
+
+
+def _entry(action: str, resolver: "TagResolver") -> tuple[str, str, "ActionTagsByTag"]:
+    from check_gha_pinning import _build_github_url, _RepoHasNoTagsError, _RepoNotFoundError
+
+    repo_url = _build_github_url(action)
+    try:
+        by_tag = resolver.get_action_tags(action).by_tag
+    except _RepoNotFoundError:
+        return repo_url, STATUS_NOT_FOUND, {}
+    except _RepoHasNoTagsError:
+        return repo_url, STATUS_NO_TAGS, {}
+    # Repos with branches but no tags are listed too, the snapshot only keeps tags.
+    return (repo_url, STATUS_OK, by_tag) if by_tag else (repo_url, STATUS_NO_TAGS, {})
+
+
+def main(argv: list[str]) -> int:
+    import subprocess
+
+    from check_gha_pinning import (
+        _REPO,
+        Problem,
+        TagResolver,
+        _build_github_url,
+        _find_files,
+        _load_file,
+        _LookupFailedError,
+    )
+
+    args = _parse_args(argv)
+    actions = {_build_github_url(repo): repo for repo in args.repo}
+    for file in _find_files(args.paths, args.git_ls_files):
+        result = _load_file(file, "fast")
+        if isinstance(result, Problem):
+            print(result, file=sys.stderr)
+            continue
+        for item in result:
+            if "@" in item.action and not item.action.startswith("docker://") and re.match(_REPO, item.action):
+                actions.setdefault(_build_github_url(item.action), item.action)
+
+    # Lookups that time out or fail with a network error are retried like in checks, the repos that still fail are
+    # left out of the snapshot instead of losing the others.
+    entries = []
+    failed = []
+    with contextlib.closing(TagResolver(max_workers=args.concurrency)) as resolver:
+        resolver.prefetch(actions.values())
+        for repo_url, action in actions.items():
+            try:
+                entries.append(_entry(action, resolver))
+            except (_LookupFailedError, subprocess.CalledProcessError) as ex:
+                failed.append(f"{repo_url}: {ex}")
+    write_snapshot(args.output, entries)
+    print(f"Saved the tags of {len(entries)} repos to {args.output}")
+    if failed:
+        print(
+            f"The tags of {len(failed)} repos couldn't be looked up, they are not in the snapshot:\n"
+            + "\n".join(failed),
+            file=sys.stderr,
+        )
+        return 1
+    return os.EX_OK
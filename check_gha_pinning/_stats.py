@@ -0,0 +1,99 @@
+"""Counters and timers describing where a run spends its time.
+
+Nothing is recorded unless a `Stats` collector is active, see `collect_stats`.
+"""
+
+import contextlib
+import json
+import threading
+import time
+from collections.abc import Iterator
+
+
+class Stats:
+    """Time spent per phase, per-repo resolution latency and event counters of a run. Safe to update from threads."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.phases: dict[str, float] = {}
+        self.repos: dict[str, float] = {}
+        self.counters: dict[str, int] = {}
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def add_repo_latency(self, repo: str, seconds: float) -> None:
+        with self._lock:
+            self.repos[repo] = self.repos.get(repo, 0.0) + seconds
+
+    def merge(self, data: dict) -> None:
+        """Add the phases, repo latencies and counters of another collector's `as_dict()`, e.g. from a worker."""
+        with self._lock:
+            for name, totals in (("phases", self.phases), ("repos", self.repos), ("counters", self.counters)):
+                for key, value in data[name].items():
+                    totals[key] = totals.get(key, 0) + value
+
+    @contextlib.contextmanager
+    def timer(self, phase: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {"phases": dict(self.phases), "repos": dict(self.repos), "counters": dict(self.counters)}
+
+    def to_json(self) -> str:
+        return json.dumps(self.as_dict(), sort_keys=True)
+
+    def __str__(self) -> str:
+        data = self.as_dict()
+        lines = ["phases:"]
+        lines += [f"  {phase}: {seconds:.3f}s" for phase, seconds in data["phases"].items()]
+        lines.append("counters:")
+        lines += [f"  {name}: {value}" for name, value in sorted(data["counters"].items())]
+        if data["repos"]:
+            lines.append("repo resolution:")
+            slowest = sorted(data["repos"].items(), key=lambda item: item[1], reverse=True)
+            lines += [f"  {repo}: {seconds:.3f}s" for repo, seconds in slowest]
+        return "\n".join(lines)
+
+
+_active: Stats | None = None
+
+
+@contextlib.contextmanager
+def collect_stats(stats: Stats | None = None) -> Iterator[Stats]:
+    """Record the counters and timers of everything run in this block (in any thread of this process) in `stats`."""
+    global _active
+    previous, _active = _active, stats if stats is not None else Stats()
+    try:
+        yield _active
+    finally:
+        _active = previous
+
+
+def count(name: str, n: int = 1) -> None:
+    if _active is not None:
+        _active.count(name, n)
+
+
+def add_repo_latency(repo: str, seconds: float) -> None:
+    if _active is not None:
+        _active.add_repo_latency(repo, seconds)
+
+
+def merge(data: dict) -> None:
+    if _active is not None:
+        _active.merge(data)
+
+
+def timer(phase: str) -> contextlib.AbstractContextManager:
+    return _active.timer(phase) if _active is not None else contextlib.nullcontext()
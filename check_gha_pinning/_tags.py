@@ -0,0 +1,165 @@
+"""Compact index of the tags and branches of a repo and the commits they point to.
+
+Repos can have tens of thousands of tags, and the daemon and `--watch` keep the tags of many repos in memory. Instead of
+a dict of tag names and a dict of commits with lists of tags, the names are stored sorted in one string with an array
+of offsets, the commits as 20-byte hashes in one `bytes`, and the tags of a commit are found by bisecting an array
+of positions sorted by commit, which also finds the commits starting with a short hash. The lookups are read as
+mappings, like the dicts they replace.
+"""
+
+import bisect
+import itertools
+from array import array
+from collections.abc import Iterable, Iterator, Mapping
+
+_SHA_SIZE = 20
+
+
+class TagIndex:
+    """The tags and branches of a repo, from `(name, sha)` pairs with hex or 20-byte hashes, in which later pairs
+    replace earlier ones with the same name.
+
+    The tags come first, then the branches, each sorted by name.
+    """
+
+    __slots__ = ("_names", "_offsets", "_shas", "_by_sha", "_tags", "_commits")
+
+    def __init__(
+        self, tags: Iterable[tuple[str, str | bytes]], branches: Iterable[tuple[str, str | bytes]] = ()
+    ) -> None:
+        parts = [
+            {name: bytes.fromhex(sha) if isinstance(sha, str) else sha for name, sha in refs}
+            for refs in (tags, branches)
+        ]
+        names = [sorted(part) for part in parts]
+        self._tags = len(names[0])
+        self._names = "".join(itertools.chain(*names))
+        self._offsets = array("I", [0])
+        for name in itertools.chain(*names):
+            self._offsets.append(self._offsets[-1] + len(name))
+        self._shas = b"".join(itertools.chain(*(map(part.pop, part_names) for part, part_names in zip(parts, names))))
+        del names  # Only the joined copies are kept, free the separate strings before sorting by commit.
+        self._by_sha = array("I", sorted(range(len(self._offsets) - 1), key=self._sha))
+        self._commits = sum(1 for _ in self.shas())
+
+    def _range(self, branches: bool) -> range:
+        return range(self._tags, len(self._offsets) - 1) if branches else range(self._tags)
+
+    def _name(self, position: int) -> str:
+        return self._names[self._offsets[position] : self._offsets[position + 1]]
+
+    def _sha(self, position: int) -> bytes:
+        return self._shas[position * _SHA_SIZE : (position + 1) * _SHA_SIZE]
+
+    def count(self, branches: bool = False) -> int:
+        return len(self._range(branches))
+
+    def names(self, branches: bool = False) -> Iterator[str]:
+        return map(self._name, self._range(branches))
+
+    def refs(self, branches: bool = False) -> Iterator[tuple[str, str]]:
+        """The names of the tags (or branches) and their commits, sorted by name."""
+        for position in self._range(branches):
+            yield self._name(position), self._sha(position).hex()
+
+    def shas(self) -> Iterator[str]:
+        """The distinct commits of tags, in the order of their hashes."""
+        previous = None
+        for position in self._by_sha:
+            if position < self._tags and (sha := self._sha(position)) != previous:
+                previous = sha
+                yield sha.hex()
+
+    def sha(self, name: str, branches: bool = False) -> str | None:
+        """The commit of tag (or branch) `name`."""
+        refs = self._range(branches)
+        position = bisect.bisect_left(refs, name, key=self._name)
+        if position < len(refs) and self._name(refs[position]) == name:
+            return self._sha(refs[position]).hex()
+        return None
+
+    def _positions(self, key: bytes) -> Iterator[int]:
+        """The positions of the refs pointing to the commit `key`, or to commits starting with it."""
+        for index in range(bisect.bisect_left(self._by_sha, key, key=self._sha), len(self._by_sha)):
+            if not self._sha(self._by_sha[index]).startswith(key):
+                return
+            yield self._by_sha[index]
+
+    def tags(self, sha: str, branches: bool = False) -> list[str]:
+        """The names of the tags (or branches) pointing to commit `sha`, sorted."""
+        try:
+            key = bytes.fromhex(sha)
+        except ValueError:
+            return []
+        if len(key) != _SHA_SIZE:
+            return []
+        refs = self._range(branches)
+        return sorted(self._name(position) for position in self._positions(key) if position in refs)
+
+    def commits(self, prefix: str) -> list[str]:
+        """The distinct commits of tags and branches whose hashes start with the hex `prefix`, sorted."""
+        try:
+            key = bytes.fromhex(prefix[: len(prefix) // 2 * 2])
+        except ValueError:
+            return []
+        return sorted(
+            {sha for position in self._positions(key) if (sha := self._sha(position).hex()).startswith(prefix)}
+        )
+
+
+class _RefsByName(Mapping[str, str]):
+    __slots__ = ("index",)
+    _branches = False
+
+    def __init__(self, index: TagIndex) -> None:
+        self.index = index
+
+    def __getitem__(self, name: str) -> str:
+        if (sha := self.index.sha(name, self._branches)) is None:
+            raise KeyError(name)
+        return sha
+
+    def __iter__(self) -> Iterator[str]:
+        return self.index.names(self._branches)
+
+    def __len__(self) -> int:
+        return self.index.count(self._branches)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class TagsByTag(_RefsByName):
+    """The commit of every tag of a `TagIndex`."""
+
+    __slots__ = ()
+
+
+class BranchesByName(_RefsByName):
+    """The commit of every branch of a `TagIndex`."""
+
+    __slots__ = ()
+    _branches = True
+
+
+class TagsBySha(Mapping[str, list[str]]):
+    """The tags of every commit of a `TagIndex`."""
+
+    __slots__ = ("index",)
+
+    def __init__(self, index: TagIndex) -> None:
+        self.index = index
+
+    def __getitem__(self, sha: str) -> list[str]:
+        if not (names := self.index.tags(sha)):
+            raise KeyError(sha)
+        return names
+
+    def __iter__(self) -> Iterator[str]:
+        return self.index.shas()
+
+    def __len__(self) -> int:
+        return self.index._commits
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
@@ -0,0 +1,265 @@
+"""`--watch`: re-check files as they change, which are waited for with inotify on Linux and by polling their
+modification times elsewhere."""
+
+import abc
+import argparse
+import collections
+import contextlib
+import json
+import os
+import pathlib
+import struct
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterable
+from typing import TYPE_CHECKING
+
+from check_gha_pinning._cache import DiskCache, MemoryCache
+from check_gha_pinning._discover import SUFFIXES
+
+if TYPE_CHECKING:
+    from check_gha_pinning import Problem
+
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_ISDIR = 0x40000000
+_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT = struct.Struct("iIII")
+
+
+class Watcher(abc.ABC):
+    @abc.abstractmethod
+    def wait(self, timeout: float | None = None) -> set[pathlib.Path]:
+        """Block until something changed or `timeout` seconds passed, and return the paths that changed (if any)."""
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher(Watcher):
+    """Watches `directories` and their subdirectories (also ones created later) with inotify."""
+
+    def __init__(self, directories: Iterable[pathlib.Path]) -> None:
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._directories: dict[int, pathlib.Path] = {}
+        for directory in directories:
+            self._add(directory)
+
+    def _add(self, directory: pathlib.Path) -> None:
+        for root, dirs, _ in os.walk(directory):
+            dirs[:] = [name for name in dirs if name != ".git"]
+            descriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(root), _MASK)
+            if descriptor >= 0:
+                self._directories[descriptor] = pathlib.Path(root)
+
+    def wait(self, timeout: float | None = None) -> set[pathlib.Path]:
+        import select
+
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return set()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                descriptor, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size : offset + _EVENT.size + length].rstrip(b"\0")
+                offset += _EVENT.size + length
+                if (directory := self._directories.get(descriptor)) is None or not name:
+                    continue
+                path = directory / os.fsdecode(name)
+                changed.add(path)
+                if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                    self._add(path)
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class PollingWatcher(Watcher):
+    """Compares the modification times and sizes of the files `list_files` returns every `interval` seconds."""
+
+    def __init__(self, list_files: Callable[[], Iterable[pathlib.Path]], interval: float = 0.5) -> None:
+        self._list_files = list_files
+        self._interval = interval
+        self._state = self._scan()
+
+    def _scan(self) -> dict[pathlib.Path, tuple[int, int]]:
+        state = {}
+        for file in self._list_files():
+            try:
+                stat = file.stat()
+            except OSError:
+                continue
+            state[file] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def wait(self, timeout: float | None = None) -> set[pathlib.Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            delay = self._interval if deadline is None else min(self._interval, max(0.0, deadline - time.monotonic()))
+            time.sleep(delay)
+            state = self._scan()
+            changed = {file for file in state.keys() | self._state.keys() if state.get(file) != self._state.get(file)}
+            self._state = state
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+
+def watcher(
+    directories: Iterable[pathlib.Path], list_files: Callable[[], Iterable[pathlib.Path]], poll: bool = False
+) -> Watcher:
+    """An inotify watcher for `directories` where available, else one polling the files `list_files` returns."""
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError):
+            pass  # No inotify (e.g. in some containers), or the limit of instances is reached.
+    return PollingWatcher(list_files)
+
+
+def _changes(old: list["Problem"], new: list["Problem"]) -> tuple[list["Problem"], list["Problem"]]:
+    """The problems only in `new` and the ones only in `old`, regardless of their lines, which edits above shift."""
+
+    def key(problem: "Problem") -> tuple:
+        return problem._replace(line=None)
+
+    def only_in(problems: list["Problem"], others: list["Problem"]) -> list["Problem"]:
+        remaining = collections.Counter(map(key, others))
+        result = []
+        for problem in problems:
+            if remaining[key(problem)] > 0:
+                remaining[key(problem)] -= 1
+            else:
+                result.append(problem)
+        return result
+
+    return only_in(new, old), only_in(old, new)
+
+
+def main(args: argparse.Namespace, stop: threading.Event | None = None) -> int:
+    """Check the files, then re-check the files that change until interrupted (or `stop` is set), printing the
+    problems they gained (`+`) and lost (`-`).
+
+    Looked up tags and the problems of every file are kept in memory, so that re-checking an edited file costs little
+    more than parsing it.
+    """
+    from check_gha_pinning import (
+        ActionTags,
+        Problem,
+        _check_uses,
+        _clear_caches,
+        _discover,
+        _load_file,
+        _make_dependencies,
+        _make_resolver,
+        _needs_resolution,
+        _Uses,
+    )
+
+    if stop is None:
+        stop = threading.Event()
+    cache = DiskCache("tags", ttl=args.cache_ttl)
+    if args.clear_cache:
+        _clear_caches(cache)
+    resolver = _make_resolver(args, MemoryCache(args.cache_ttl, cache, ActionTags.to_json, ActionTags.from_json))
+    dependencies = _make_dependencies(args, resolver)
+    problems: dict[pathlib.Path, list[Problem]] = {}
+    known: dict[pathlib.Path, pathlib.Path] = {}
+
+    def report(problem: Problem, change: str | None = None) -> None:
+        if args.format == "json-lines":
+            print(json.dumps({**problem._asdict(), **({"change": change} if change else {})}), flush=True)
+        else:
+            print(f"{'+' if change == 'added' else '-'} {problem}" if change else str(problem), flush=True)
+
+    def check(files: list[pathlib.Path]) -> dict[pathlib.Path, list[Problem] | None]:
+        """The problems of `files`, None for the ones that are gone."""
+        loaded: dict[pathlib.Path, list[_Uses] | Problem | None] = {}
+        for file in files:
+            try:
+                loaded[file] = _load_file(file, args.engine)
+            except OSError:
+                loaded[file] = None
+        actions = [item.action for uses in loaded.values() if isinstance(uses, list) for item in uses]
+        resolver.prefetch(action for action in actions if _needs_resolution(action))
+        resolver.flush()
+        checked: dict[pathlib.Path, list[Problem] | None] = {}
+        for file, uses in loaded.items():
+            if uses is None:
+                checked[file] = None
+            elif isinstance(uses, Problem):
+                checked[file] = [uses]
+            else:
+                checked[file] = list(
+                    _check_uses(file, sorted(uses, key=lambda item: item.line), resolver, dependencies)
+                )
+        return checked
+
+    def summary() -> None:
+        count = sum(map(len, problems.values()))
+        files = sum(1 for file_problems in problems.values() if file_problems)
+        print(f"{count} problems in {files} files, watching {len(problems)} files for changes", file=sys.stderr)
+
+    with contextlib.ExitStack() as stack:
+        stack.callback(resolver.close)
+        if dependencies is not None:
+            stack.callback(dependencies.close)
+        # Watched from the start, so that no change made during the first check is missed.
+        directories = {
+            path if path.is_dir() else path.parent for path in map(pathlib.Path, args.paths) if path.exists()
+        }
+        file_watcher = watcher(directories, lambda: _discover(args), poll=bool(os.getenv("GHA_PINNING_WATCH_POLL")))
+        stack.callback(file_watcher.close)
+        files = _discover(args)
+        for file, file_problems in check(files).items():
+            problems[file] = file_problems or []
+            known[file.resolve()] = file
+            for problem in problems[file]:
+                report(problem)
+        summary()
+        try:
+            while not stop.is_set():
+                if not (changed := file_watcher.wait(timeout=0.5)):
+                    continue
+                # Editors save in several steps (e.g. writing a temporary file and renaming it), take them together.
+                while more := file_watcher.wait(timeout=0.01):
+                    changed |= more
+                changed = {path.resolve() for path in changed}
+                recheck = {known[path] for path in changed if path in known}
+                gone = set()
+                # Only new YAML files and directories need another discovery, edits of known files don't.
+                if any(path not in known and (path.suffix in SUFFIXES or path.is_dir()) for path in changed):
+                    discovered = {file.resolve(): file for file in _discover(args)}
+                    recheck.update(file for path, file in discovered.items() if path not in known)
+                    gone.update(file for path, file in known.items() if path not in discovered)
+                    known = discovered
+                results = check(sorted(recheck - gone, key=str))
+                results.update(dict.fromkeys(gone))
+                for file in sorted(results, key=str):
+                    if results[file] is None:
+                        known.pop(file.resolve(), None)
+                    added, removed = _changes(problems.pop(file, []), results[file] or [])
+                    if results[file] is not None:
+                        problems[file] = results[file]
+                    for problem in removed:
+                        report(problem, "removed")
+                    for problem in added:
+                        report(problem, "added")
+                summary()
+        except KeyboardInterrupt:
+            pass
+    return 1 if any(problems.values()) else os.EX_OK
@@ -0,0 +1,51 @@
+import pytest
+
+from check_gha_pinning._audit import Pin, RepoAudit, audit_repo, version
+
+_OLD = "1" * 40
+_NEW = "2" * 40
+_V3 = "3" * 40
+_BRANCH = "4" * 40
+
+
+@pytest.mark.parametrize(
+    "tag, expected",
+    [("v4", (4,)), ("v4.2.1", (4, 2, 1)), ("1.0", (1, 0)), ("v4.0.0-beta", None), ("latest", None)],
+)
+def test_version(tag: str, expected: tuple[int, ...] | None):
+    assert version(tag) == expected
+
+
+def test_audit_repo():
+    by_tag = {"v3": _V3, "v3.0.0": _V3, "v4.0.0": _OLD, "v4": _NEW, "v4.1.0": _NEW, "v4.10.0-rc": _BRANCH}
+    by_sha = {_V3: ["v3", "v3.0.0"], _OLD: ["v4.0.0"], _NEW: ["v4", "v4.1.0"], _BRANCH: ["v4.10.0-rc"]}
+    pins = [
+        Pin("a.yml", 3, _OLD),
+        Pin("b.yml", 5, _OLD),
+        Pin("a.yml", 7, _NEW),
+        # The newest tag of the major version 3, even though v4 exists.
+        Pin("a.yml", 9, _V3),
+        Pin("c.yml", 2, "5" * 40),
+        # Only tagged with a pre-release, which isn't compared.
+        Pin("c.yml", 4, _BRANCH),
+    ]
+    audit = audit_repo("org/repo", pins, by_tag, by_sha)
+    assert audit == RepoAudit(
+        "org/repo",
+        6,
+        3,
+        [{"sha": _OLD, "tag": "v4.0.0", "newest": "v4.1.0", "pins": ["a.yml:3", "b.yml:5"]}],
+        [{"sha": "5" * 40, "pins": ["c.yml:2"]}],
+    )
+    assert audit.findings == 3
+    assert str(audit) == "org/repo: 6 pins in 3 files, 2 behind (v4.0.0 -> v4.1.0), 1 untagged (55555555)"
+
+    assert audit_repo("org/repo", pins[2:4], by_tag, by_sha).findings == 0
+    # Repos without tags have only untagged pins.
+    assert audit_repo("org/repo", pins[:1], {}, {}).untagged == [{"sha": _OLD, "pins": ["a.yml:3"]}]
+
+
+def test_repo_audit_not_audited():
+    audit = RepoAudit.not_audited("org/repo", [Pin("a.yml", 3, _OLD), Pin("a.yml", 4, _NEW)], "repo not found")
+    assert audit.findings == 0
+    assert str(audit) == "org/repo: 2 pins in 1 files, not audited: repo not found"
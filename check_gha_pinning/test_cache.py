@@ -0,0 +1,108 @@
+import multiprocessing
+import pathlib
+import time
+from unittest.mock import patch
+
+import pytest
+
+from check_gha_pinning._cache import DiskCache, MemoryCache, default_cache_dir
+
+
+@pytest.mark.parametrize(
+    "env, expected",
+    [
+        ({"GHA_PINNING_CACHE_DIR": "/custom"}, pathlib.Path("/custom")),
+        ({"XDG_CACHE_HOME": "/xdg"}, pathlib.Path("/xdg/check-gha-pinning")),
+    ],
+)
+def test_default_cache_dir(env: dict[str, str], expected: pathlib.Path):
+    with patch("os.environ", env):
+        assert default_cache_dir() == expected
+
+
+def test_disk_cache_roundtrip(tmp_path: pathlib.Path):
+    cache = DiskCache("tags", directory=tmp_path)
+    assert cache.get("key") is None
+    cache.put("key", {"by_tag": {"v1": "abc"}})
+    assert cache.get("key") == {"by_tag": {"v1": "abc"}}
+    assert DiskCache("tags", directory=tmp_path).get("key") == {"by_tag": {"v1": "abc"}}
+    assert DiskCache("other", directory=tmp_path).get("key") is None
+    assert not list(cache.directory.glob("*.tmp"))
+
+
+def test_disk_cache_ttl(tmp_path: pathlib.Path):
+    cache = DiskCache("tags", ttl=10, directory=tmp_path)
+    cache.put("key", "value")
+    with patch("time.time", return_value=time.time() + 11):
+        assert cache.get("key") is None
+
+
+def test_disk_cache_ignores_corrupt_entries(tmp_path: pathlib.Path):
+    cache = DiskCache("tags", directory=tmp_path)
+    cache.put("key", "value")
+    for entry in cache.directory.glob("*.json"):
+        entry.write_text("{not json")
+    assert cache.get("key") is None
+
+
+def test_disk_cache_clear(tmp_path: pathlib.Path):
+    cache = DiskCache("tags", directory=tmp_path)
+    cache.put("key", "value")
+    cache.clear()
+    assert cache.get("key") is None
+    cache.clear()
+
+
+def _increment(directory: pathlib.Path) -> None:
+    cache = DiskCache("counter", directory=directory)
+    for _ in range(20):
+        with cache.lock("counter"):
+            cache.put("counter", (cache.get("counter") or 0) + 1)
+
+
+def test_disk_cache_lock_across_processes(tmp_path: pathlib.Path):
+    processes = [multiprocessing.Process(target=_increment, args=(tmp_path,)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert DiskCache("counter", directory=tmp_path).get("counter") == 80
+
+
+def test_memory_cache(tmp_path: pathlib.Path):
+    backing = DiskCache("tags", directory=tmp_path)
+    backing.put("on-disk", 1)
+    cache = MemoryCache(ttl=60, backing=backing)
+    assert cache.get("on-disk") == 1
+    cache.put("key", {"v1": "abc"})
+    assert cache.get("key") == {"v1": "abc"}
+    assert backing.get("key") == {"v1": "abc"}
+    with cache.lock("key"):
+        pass
+
+    cache.ttl = 0
+    with patch("time.time", return_value=time.time() + 1):
+        cache.backing = None
+        assert cache.get("key") is None
+    cache.clear()
+    assert MemoryCache().get("key") is None
+
+
+def test_memory_cache_encode(tmp_path: pathlib.Path):
+    backing = DiskCache("tags", directory=tmp_path)
+    cache = MemoryCache(ttl=60, backing=backing, encode=sorted, decode=set)
+    value = {"b", "a"}
+    cache.put("key", value)
+    assert cache.get("key") is value
+    assert backing.get("key") == ["a", "b"]
+
+    # Entries found in `backing` are decoded once, and expire in memory when they would have expired on disk.
+    cache = MemoryCache(ttl=60, backing=backing, encode=sorted, decode=set)
+    with patch("check_gha_pinning._cache.DiskCache.entry", wraps=backing.entry) as entry:
+        assert cache.get("key") == {"a", "b"}
+        assert cache.get("key") is cache.get("key")
+    entry.assert_called_once()
+    stored = cache.entry("key")[0]
+    assert stored == backing.entry("key")[0]
+    with patch("time.time", return_value=stored + 61):
+        assert cache.get("key") is None
@@ -1,5 +1,12 @@
+import concurrent.futures
+import io
+import json
+import pathlib
+import re
 import subprocess
 import sys
+import threading
+import time
 from contextlib import nullcontext as does_not_raise
 from unittest.mock import MagicMock, call, patch
 
@@ -7,20 +14,40 @@ import pytest
 import ruamel.yaml
 
 from check_gha_pinning import (
+    DEFAULT_TIMEOUT,
+    ActionTags,
     ActionTagsBySha,
     ActionTagsByTag,
+    Checker,
+    GraphQLBackend,
+    Problem,
+    ResolverBackend,
+    TagResolver,
     _build_github_url,
+    _action_tags,
     _check,
+    _AmbiguousRefError,
+    _CircuitOpenError,
     _get_action_tags,
+    _load_uses,
+    _LookupFailedError,
     _NotPinnedToCommitError,
+    _RefNotFoundError,
     _RepoHasNoTagsError,
     _RepoNotFoundError,
+    _resolve_ref,
+    _parse_args,
     _UnpinnedContainerError,
     check_pinning,
+    iter_problems,
 )
 from check_gha_pinning import (
     main as check_gha_pinning_main,
 )
+from check_gha_pinning import _snapshot, _watch
+from check_gha_pinning._cache import DiskCache, MemoryCache
+from check_gha_pinning._graphql import GraphQLClient
+from check_gha_pinning._snapshot import STATUS_NO_TAGS
 
 
 def _build_ls_remote_output(by_sha: ActionTagsBySha) -> str:
@@ -38,6 +65,9 @@ def _build_by_tags_from_by_sha(by_sha: ActionTagsBySha) -> ActionTagsByTag:
         ("actions/checkout@v4", "https://github.com/actions/checkout"),
         ("actions/checkout@aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d", "https://github.com/actions/checkout"),
         ("actions/something/else@v4", "https://github.com/actions/something"),
+        ("owner/my_repo@v1", "https://github.com/owner/my_repo"),
+        ("owner/foo.js@v1", "https://github.com/owner/foo.js"),
+        ("owner/foo.js/sub@v1", "https://github.com/owner/foo.js"),
     ],
 )
 def test_build_github_url(action: str, expected: str):
@@ -61,7 +91,9 @@ def test_get_action_tags_success(mock_check_output: MagicMock):
     expected_by_tag = _build_by_tags_from_by_sha(expected_by_sha)
     mock_check_output.return_value = _build_ls_remote_output(expected_by_sha)
 
-    by_tag, by_sha = _get_action_tags(action)
+    # Copies of the read-only views, emptied below.
+    tags = _get_action_tags(action)
+    by_tag, by_sha = dict(tags.by_tag), dict(tags.by_sha)
     for tag, sha in expected_by_tag.items():
         assert tag in by_tag.keys()
         assert sha == by_tag.pop(tag)
@@ -72,7 +104,146 @@ def test_get_action_tags_success(mock_check_output: MagicMock):
         assert set(tags) == set(by_sha.pop(sha))
     assert not by_sha
 
-    mock_check_output.assert_called_once_with(["git", "ls-remote", "--tags", "--exit-code", repo_url], text=True)
+    mock_check_output.assert_called_once_with(
+        ["git", "ls-remote", "--tags", "--heads", "--exit-code", repo_url],
+        text=True,
+        stderr=subprocess.PIPE,
+        timeout=None,
+    )
+
+
+@patch("subprocess.check_output")
+def test_get_action_tags_annotated_tags(mock_check_output: MagicMock):
+    mock_check_output.return_value = """\
+5ea8c25bca80f051ccfffa8fffe3620f02b5a77c\trefs/tags/v1
+75e06c12e2c63710cfaa75bf5a5e60b98da6ff4b\trefs/tags/v1^{}
+75e06c12e2c63710cfaa75bf5a5e60b98da6ff4b\trefs/tags/v1.2.3
+"""
+    by_tag, by_sha, _ = _get_action_tags("example/repo")
+    assert by_tag == {
+        "v1": "75e06c12e2c63710cfaa75bf5a5e60b98da6ff4b",
+        "v1.2.3": "75e06c12e2c63710cfaa75bf5a5e60b98da6ff4b",
+    }
+    assert by_sha == {"75e06c12e2c63710cfaa75bf5a5e60b98da6ff4b": ["v1", "v1.2.3"]}
+
+
+def _git(*args: str, cwd=None) -> str:
+    env_args = ["-c", "user.name=test", "-c", "user.email=test@example.com"]
+    return subprocess.check_output(["git", *env_args, *args], cwd=cwd, text=True).strip()
+
+
+def test_get_action_tags_annotated_local_repo(tmp_path):
+    work = tmp_path / "work"
+    _git("init", "-q", str(work))
+    _git("commit", "-q", "--allow-empty", "-m", "first", cwd=work)
+    _git("tag", "-a", "v1", "-m", "v1", cwd=work)
+    _git("tag", "v1.0.1", cwd=work)
+    _git("tag", "v10", cwd=work)
+    first = _git("rev-parse", "HEAD", cwd=work)
+    _git("commit", "-q", "--allow-empty", "-m", "second", cwd=work)
+    _git("tag", "v2", cwd=work)
+    bare = tmp_path / "repo.git"
+    _git("clone", "-q", "--bare", str(work), str(bare))
+
+    with patch("check_gha_pinning._build_github_url", return_value=str(bare)):
+        tags = _get_action_tags("example/repo")
+    # The annotated tag v1 resolves to the commit, not to the tag object.
+    assert tags.by_tag["v1"] == first
+    assert tags.by_sha[first] == ["v1", "v1.0.1", "v10"]
+
+
+def test_check_pinning_branches_and_short_shas(tmp_path):
+    work = tmp_path / "work"
+    _git("init", "-q", "--initial-branch=main", str(work))
+    _git("commit", "-q", "--allow-empty", "-m", "first", cwd=work)
+    _git("tag", "v1", cwd=work)
+    first = _git("rev-parse", "HEAD", cwd=work)
+    _git("commit", "-q", "--allow-empty", "-m", "second", cwd=work)
+    second = _git("rev-parse", "HEAD", cwd=work)
+    _git("branch", "release/v1", first, cwd=work)
+    bare = tmp_path / "repo.git"
+    _git("clone", "-q", "--bare", str(work), str(bare))
+    missing = next(prefix for prefix in ("0000000", "1111111") if not first.startswith(prefix))
+    file = tmp_path / "ci.yml"
+    file.write_text(f"""\
+jobs:
+  a:
+    steps:
+      - uses: example/repo@v1
+      - uses: example/repo@main
+      - uses: example/repo@release/v1
+      - uses: example/repo@{first[:7]}
+      - uses: example/repo@{second[:7]}
+      - uses: example/repo@{missing}
+""")
+    with (
+        patch("check_gha_pinning._build_github_url", return_value=str(bare)),
+        patch("subprocess.check_output", wraps=subprocess.check_output) as check_output,
+    ):
+        problems = check_pinning(file, TagResolver())
+    # Tags, branches and the commits they point to all come from one `git ls-remote` of the repo.
+    assert check_output.call_count == 1
+    assert problems == [
+        f"{file}:4: example/repo@v1 is not pinned to commit (should be {first} # v1)",
+        f"{file}:5: example/repo@main is not pinned to commit (should be {second} # main)",
+        f"{file}:6: example/repo@release/v1 is not pinned to commit (should be {first} # v1)",
+        f"{file}:7: example/repo@{first[:7]} is not pinned to commit (should be {first} # v1)",
+        f"{file}:8: example/repo@{second[:7]} is not pinned to commit (should be {second} # main)",
+        f"{file}:9: example/repo@{missing}: no tag or branch points to a commit starting with {missing}",
+    ]
+
+
+def test_check_pinning_repo_with_branches_and_no_tags(tmp_path):
+    work = tmp_path / "work"
+    _git("init", "-q", "--initial-branch=main", str(work))
+    _git("commit", "-q", "--allow-empty", "-m", "first", cwd=work)
+    head = _git("rev-parse", "HEAD", cwd=work)
+    bare = tmp_path / "repo.git"
+    _git("clone", "-q", "--bare", str(work), str(bare))
+    missing = next(prefix for prefix in ("0000000", "1111111") if not head.startswith(prefix))
+    file = tmp_path / "ci.yml"
+    file.write_text(f"""\
+jobs:
+  a:
+    steps:
+      - uses: example/repo@v1
+      - uses: example/repo@main
+      - uses: example/repo@{missing}
+""")
+    with patch("check_gha_pinning._build_github_url", return_value=str(bare)):
+        assert check_pinning(file, TagResolver()) == [
+            f"{file}:4: example/repo@v1: repo {bare} has no tags",
+            f"{file}:5: example/repo@main is not pinned to commit (should be {head} # main)",
+            f"{file}:6: example/repo@{missing}: repo {bare} has no tags",
+        ]
+        assert _snapshot._entry("example/repo", TagResolver()) == (str(bare), STATUS_NO_TAGS, {})
+
+
+@pytest.mark.parametrize(
+    "ref, expected",
+    [
+        ("v1", ("a" * 40, "v1.0.0")),
+        ("main", ("b" * 40, "main")),
+        # Tags take precedence over branches with the same name.
+        ("dev", ("a" * 40, "v1.0.0")),
+        ("feature", ("c" * 40, "feature")),
+        ("cccc", ("c" * 40, "feature")),
+        ("abab", _AmbiguousRefError(f"short SHA abab is ambiguous, it matches {'ab' * 20}, {'aba' + 'b' * 37}")),
+        ("dddd", _RefNotFoundError("no tag or branch points to a commit starting with dddd")),
+        ("v2", _RefNotFoundError("tag v2 not found")),
+        ("abc", _RefNotFoundError("tag abc not found")),
+    ],
+)
+def test_resolve_ref(ref: str, expected: tuple[str, str] | Exception):
+    tags = _action_tags(
+        {"v1": "a" * 40, "v1.0.0": "a" * 40, "dev": "a" * 40, "x": "ab" * 20},
+        {"main": "b" * 40, "dev": "b" * 40, "feature": "c" * 40, "other": "aba" + "b" * 37},
+    )
+    if isinstance(expected, Exception):
+        with pytest.raises(type(expected), match=re.escape(str(expected))):
+            _resolve_ref(tags, ref)
+    else:
+        assert _resolve_ref(tags, ref) == expected
 
 
 @patch("subprocess.check_output")
@@ -83,7 +254,12 @@ def test_get_action_tags_repo_has_no_tags(mock_check_output: MagicMock):
     with pytest.raises(_RepoHasNoTagsError) as cm:
         _get_action_tags(action)
     assert str(cm.value) == f"repo {repo_url} has no tags"
-    mock_check_output.assert_called_once_with(["git", "ls-remote", "--tags", "--exit-code", repo_url], text=True)
+    mock_check_output.assert_called_once_with(
+        ["git", "ls-remote", "--tags", "--heads", "--exit-code", repo_url],
+        text=True,
+        stderr=subprocess.PIPE,
+        timeout=None,
+    )
 
 
 @patch("subprocess.check_output")
@@ -96,7 +272,12 @@ def test_get_action_tags_repo_not_found(mock_check_output: MagicMock):
     with pytest.raises(_RepoNotFoundError) as cm:
         _get_action_tags(action)
     assert str(cm.value) == f"repo {repo_url} not found"
-    mock_check_output.assert_called_once_with(["git", "ls-remote", "--tags", "--exit-code", repo_url], text=True)
+    mock_check_output.assert_called_once_with(
+        ["git", "ls-remote", "--tags", "--heads", "--exit-code", repo_url],
+        text=True,
+        stderr=subprocess.PIPE,
+        timeout=None,
+    )
 
 
 @patch("subprocess.check_output")
@@ -108,7 +289,256 @@ def test_get_action_tags_other_error(mock_check_output: MagicMock):
     )
     with pytest.raises(subprocess.CalledProcessError):
         _get_action_tags(action)
-    mock_check_output.assert_called_once_with(["git", "ls-remote", "--tags", "--exit-code", repo_url], text=True)
+    mock_check_output.assert_called_once_with(
+        ["git", "ls-remote", "--tags", "--heads", "--exit-code", repo_url],
+        text=True,
+        stderr=subprocess.PIPE,
+        timeout=None,
+    )
+
+
+@patch("subprocess.check_output")
+def test_get_action_tags_timeout(mock_check_output: MagicMock):
+    mock_check_output.side_effect = subprocess.TimeoutExpired(["git"], 5)
+    with pytest.raises(_LookupFailedError, match="timed out after 5s"):
+        _get_action_tags("example/repo", timeout=5)
+
+
+@pytest.mark.parametrize(
+    "stderr, error",
+    [
+        (
+            "remote: Repository not found.\nfatal: repository 'https://github.com/example/repo/' not found\n",
+            _RepoNotFoundError,
+        ),
+        (
+            "fatal: unable to access 'https://github.com/example/repo/': Could not resolve host: github.com\n",
+            _LookupFailedError,
+        ),
+        ("fatal: unable to access '...': The requested URL returned error: 502\n", _LookupFailedError),
+    ],
+)
+@patch("subprocess.check_output")
+def test_get_action_tags_network_error(mock_check_output: MagicMock, stderr: str, error: type[Exception]):
+    mock_check_output.side_effect = subprocess.CalledProcessError(128, cmd=["git"], stderr=stderr)
+    with pytest.raises(error):
+        _get_action_tags("example/repo")
+
+
+@patch("check_gha_pinning._get_action_tags")
+def test_tag_resolver_memoizes_per_repo(mock__get_action_tags: MagicMock):
+    by_sha = {"aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d": ["v3", "v3.1"]}
+    mock__get_action_tags.return_value = ActionTags(_build_by_tags_from_by_sha(by_sha), by_sha)
+    resolver = TagResolver()
+    first = resolver.get_action_tags("actions/checkout@v3")
+    assert resolver.get_action_tags("actions/checkout@v3.1") is first
+    assert resolver.get_action_tags("actions/checkout/sub@v3") is first
+    resolver.get_action_tags("actions/setup-python@v3")
+    assert mock__get_action_tags.call_args_list == [
+        call("actions/checkout@v3", timeout=DEFAULT_TIMEOUT),
+        call("actions/setup-python@v3", timeout=DEFAULT_TIMEOUT),
+    ]
+
+
+@pytest.mark.parametrize("error", [_RepoNotFoundError("not found"), _RepoHasNoTagsError("no tags")])
+@patch("check_gha_pinning._get_action_tags")
+def test_tag_resolver_memoizes_negative_results(mock__get_action_tags: MagicMock, error: Exception):
+    mock__get_action_tags.side_effect = error
+    resolver = TagResolver()
+    for _ in range(3):
+        with pytest.raises(type(error)):
+            resolver.get_action_tags("example/repo@v1")
+    mock__get_action_tags.assert_called_once()
+
+
+@patch("check_gha_pinning._get_action_tags")
+def test_tag_resolver_memory_cache(mock__get_action_tags: MagicMock, tmp_path):
+    tags = _action_tags({"v3": "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d"}, {"main": "b" * 40})
+    mock__get_action_tags.return_value = tags
+    backing = DiskCache("tags", directory=tmp_path)
+    cache = MemoryCache(backing=backing, encode=ActionTags.to_json, decode=ActionTags.from_json)
+    assert TagResolver(cache).get_action_tags("actions/checkout@v3") is tags
+    # The tags are kept in memory as they are, and written to disk without the tags by commit.
+    assert TagResolver(cache).get_action_tags("actions/checkout@v3") is tags
+    assert backing.get("git:https://github.com/actions/checkout") == {
+        "by_tag": {"v3": "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d"},
+        "by_branch": {"main": "b" * 40},
+    }
+    assert TagResolver(backing).get_action_tags("actions/checkout@v3") == tags
+    mock__get_action_tags.assert_called_once()
+
+
+@patch("check_gha_pinning._get_action_tags")
+def test_tag_resolver_cached(mock__get_action_tags: MagicMock, tmp_path):
+    sha = "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d"
+    mock__get_action_tags.return_value = _action_tags({"v3": sha, "v3.1": sha})
+    cache = DiskCache("tags", directory=tmp_path)
+    resolver = TagResolver(cache)
+    assert resolver.cached("actions/checkout@v3") is None
+    resolver.get_action_tags("actions/checkout@v3")
+    assert resolver.cached("actions/checkout@v3") == f"{sha} # v3.1"
+    # Answered from the cache in later runs, without looking the tags up again.
+    assert TagResolver(cache).cached("actions/checkout@v4") == "tag v4 not found"
+    assert TagResolver(DiskCache("tags", ttl=0, directory=tmp_path)).cached("actions/checkout@v3") is None
+    assert TagResolver().cached("actions/checkout@v3") is None
+    cache.put("docker://alpine:3", {"digest": "sha256:abc"})
+    assert TagResolver(cache).cached("docker://alpine:3") == "sha256:abc"
+    assert TagResolver(cache).cached("docker://alpine:4") is None
+    mock__get_action_tags.assert_called_once()
+
+
+@patch("check_gha_pinning._get_action_tags")
+def test_tag_resolver_persistent_cache(mock__get_action_tags: MagicMock, tmp_path):
+    by_sha = {"aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d": ["v3", "v3.1"]}
+    mock__get_action_tags.return_value = ActionTags(_build_by_tags_from_by_sha(by_sha), by_sha)
+    assert TagResolver(DiskCache("tags", directory=tmp_path)).get_action_tags("actions/checkout@v3").by_sha == by_sha
+    mock__get_action_tags.assert_called_once()
+
+    mock__get_action_tags.reset_mock()
+    tags = TagResolver(DiskCache("tags", directory=tmp_path)).get_action_tags("actions/checkout@v3")
+    assert tags == ActionTags(_build_by_tags_from_by_sha(by_sha), by_sha)
+    mock__get_action_tags.assert_not_called()
+
+    TagResolver(DiskCache("tags", ttl=0, directory=tmp_path)).get_action_tags("actions/checkout@v3")
+    mock__get_action_tags.assert_called_once()
+
+
+@patch("check_gha_pinning._get_action_tags")
+def test_tag_resolver_prefetch_concurrency(mock__get_action_tags: MagicMock):
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def get_action_tags(action: str, timeout: float | None) -> ActionTags:
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        if action.startswith("missing/"):
+            raise _RepoNotFoundError("not found")
+        return ActionTags({"v1": action}, {action: ["v1"]})
+
+    mock__get_action_tags.side_effect = get_action_tags
+    actions = [f"org/repo{i}@v1" for i in range(6)] + ["org/repo0@v2", "missing/repo@v1"]
+    resolver = TagResolver(max_workers=3)
+    resolver.prefetch(actions)
+    assert not resolver.ready(actions)
+    assert resolver.get_action_tags("org/repo5@v1").by_tag == {"v1": "org/repo5@v1"}
+    with pytest.raises(_RepoNotFoundError):
+        resolver.get_action_tags("missing/repo@v1")
+    assert resolver.ready(actions)
+    assert mock__get_action_tags.call_count == 7
+    assert max_running == 3
+
+    assert resolver.get_action_tags("org/repo1@v1").by_tag == {"v1": "org/repo1@v1"}
+    with pytest.raises(_RepoNotFoundError):
+        resolver.get_action_tags("missing/repo@v1")
+    resolver.prefetch(actions)
+    assert mock__get_action_tags.call_count == 7
+
+
+@patch("check_gha_pinning._get_action_tags")
+def test_tag_resolver_does_not_memoize_unexpected_errors(mock__get_action_tags: MagicMock):
+    mock__get_action_tags.side_effect = subprocess.CalledProcessError(1, cmd=["git"])
+    resolver = TagResolver()
+    for _ in range(2):
+        with pytest.raises(subprocess.CalledProcessError):
+            resolver.get_action_tags("example/repo@v1")
+    assert mock__get_action_tags.call_count == 2
+
+
+@patch("time.sleep")
+@patch("check_gha_pinning._get_action_tags")
+def test_tag_resolver_retries(mock__get_action_tags: MagicMock, mock_sleep: MagicMock):
+    tags = ActionTags({"v1": "a" * 40}, {"a" * 40: ["v1"]})
+    mock__get_action_tags.side_effect = [_LookupFailedError("timed out"), _LookupFailedError("timed out"), tags]
+    resolver = TagResolver(retries=2, backoff=1)
+    assert resolver.get_action_tags("example/repo@v1") == tags
+    assert mock__get_action_tags.call_count == 3
+    assert [0 <= c.args[0] <= 2**i for i, c in enumerate(mock_sleep.call_args_list)] == [True, True]
+
+    mock__get_action_tags.side_effect = _LookupFailedError("timed out")
+    for _ in range(2):
+        with pytest.raises(_LookupFailedError, match="timed out"):
+            resolver.get_action_tags("example/other@v1")
+    # Failures are memoized after the last retry.
+    assert mock__get_action_tags.call_count == 6
+
+
+@patch("time.sleep")
+@patch("check_gha_pinning._get_action_tags")
+def test_tag_resolver_circuit_breaker(mock__get_action_tags: MagicMock, mock_sleep: MagicMock):
+    tags = ActionTags({"v1": "a" * 40}, {"a" * 40: ["v1"]})
+
+    def get_action_tags(action: str, timeout: float | None) -> ActionTags:
+        if action.startswith("slow/"):
+            raise _LookupFailedError("timed out")
+        return tags
+
+    mock__get_action_tags.side_effect = get_action_tags
+    resolver = TagResolver(retries=1, max_failures=2)
+    with pytest.raises(_LookupFailedError):
+        resolver.get_action_tags("slow/a@v1")
+    # A successful lookup resets the count, the breaker needs two failures in a row.
+    resolver.get_action_tags("fine/a@v1")
+    for repo in ("slow/b", "slow/c"):
+        with pytest.raises(_LookupFailedError) as ex:
+            resolver.get_action_tags(f"{repo}@v1")
+        assert not isinstance(ex.value, _CircuitOpenError)
+    assert mock__get_action_tags.call_count == 7
+    with pytest.raises(_CircuitOpenError, match="gave up on github.com after 2 failed lookups"):
+        resolver.get_action_tags("fine/b@v1")
+    assert mock__get_action_tags.call_count == 7
+
+    resolver = TagResolver(retries=0, max_failures=0)
+    for i in range(5):
+        with pytest.raises(_LookupFailedError):
+            resolver.get_action_tags(f"slow/{i}@v1")
+    assert resolver.get_action_tags("fine/a@v1") == tags
+
+
+@patch("check_gha_pinning._get_action_tags")
+def test_check_pinning_degraded(mock__get_action_tags: MagicMock, tmp_path):
+    mock__get_action_tags.side_effect = _LookupFailedError(
+        "git ls-remote https://github.com/actions/checkout timed out"
+    )
+    file = tmp_path / "workflow.yml"
+    file.write_text("jobs:\n  a:\n    steps:\n      - uses: actions/checkout@v3\n      - uses: actions/cache@v4\n")
+    problems = list(iter_problems(file, TagResolver(retries=0, max_failures=1)))
+    assert [str(problem) for problem in problems] == [
+        f"{file}:4: actions/checkout@v3 is not pinned to commit (tags not looked up: git ls-remote "
+        "https://github.com/actions/checkout timed out)",
+        f"{file}:5: actions/cache@v4 is not pinned to commit (tags not looked up: gave up on github.com after 1 "
+        "failed lookups, the last one: git ls-remote https://github.com/actions/checkout timed out)",
+    ]
+    assert all(problem.degraded and problem.kind == "unpinned-commit" for problem in problems)
+
+
+@patch("check_gha_pinning._get_action_tags")
+def test_main_degraded(mock__get_action_tags: MagicMock, tmp_path, monkeypatch, capsys):
+    mock__get_action_tags.side_effect = _LookupFailedError("timed out")
+    monkeypatch.setenv("GHA_PINNING_CACHE_DIR", str(tmp_path / "cache"))
+    file = tmp_path / "workflow.yml"
+    file.write_text("jobs:\n  a:\n    steps:\n      - uses: actions/checkout@v3\n      - uses: actions/cache@v3\n")
+    # One lookup at a time, so that the second repo isn't looked up before the first one opened the circuit.
+    argv = ["check_gha_pinning", "--retries=0", "--max-failures=1", "--concurrency=1", "--incremental", str(tmp_path)]
+    with patch.object(sys, "argv", argv):
+        assert check_gha_pinning_main() == 1
+    out, err = capsys.readouterr()
+    assert len(out.splitlines()) == 2
+    assert (
+        err
+        == f"Tags couldn't be looked up for 2 entries, they were only checked for a pinned commit: {file}:4, {file}:5\n"
+    )
+    assert mock__get_action_tags.call_count == 1
+
+    # Degraded results aren't reused by incremental runs.
+    with patch.object(sys, "argv", argv):
+        check_gha_pinning_main()
+    assert mock__get_action_tags.call_count == 2
 
 
 @pytest.mark.parametrize(
@@ -117,6 +547,8 @@ def test_get_action_tags_other_error(mock_check_output: MagicMock):
         ("./path", does_not_raise()),
         ("docker://image@sha256:5891b5b522d5df086d0ff0b110fbd9d21bb4fc7163af34d08286a2e846f6be03", does_not_raise()),
         ("docker://image@sha256:not_a_hash", pytest.raises(_UnpinnedContainerError)),
+        ("docker://image:1.0", pytest.raises(_UnpinnedContainerError)),
+        ("docker://image", pytest.raises(_UnpinnedContainerError)),
         ("actions/checkout@f572d396fae9206628714fb2ce00f72e94f2258f", does_not_raise()),
         ("actions/checkout@v4.1.1", pytest.raises(_NotPinnedToCommitError)),
         ("actions/checkout@main", pytest.raises(_NotPinnedToCommitError)),
@@ -139,6 +571,19 @@ def test_check_pinning_yaml_parsing_failure():
         assert check_pinning(file) == ["Error parsing yaml: Parsing error"]
 
 
+@pytest.mark.parametrize("engine", ["ruamel", "fast"])
+@patch("builtins.print")
+def test_main_parse_error_names_file(mock_print: MagicMock, engine, tmp_path, monkeypatch):
+    monkeypatch.setenv("GHA_PINNING_SKIP_GIT_CHECK", "1")
+    file = tmp_path / "invalid.yml"
+    file.write_text("jobs: [uses")
+    with patch.object(sys, "argv", ["check_gha_pinning", "--engine", engine, str(file)]):
+        assert check_gha_pinning_main() == 1
+    output = "\n".join(c.args[0] for c in mock_print.call_args_list)
+    assert f'in "{file}"' in output
+    assert "<byte string>" not in output
+
+
 def test_check_pinning_yaml_parsing_success_no_jobs():
     file = MagicMock()
     file_contents = {"some_key": "some_value"}
@@ -232,13 +677,33 @@ jobs:
         "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d": ["v3", "v3.1", "v3.1.5"],
     }
     by_tag = _build_by_tags_from_by_sha(by_sha)
-    mock__get_action_tags.return_value = (by_tag, by_sha)
+    mock__get_action_tags.return_value = ActionTags(by_tag, by_sha)
     with patch("ruamel.yaml.YAML.load", return_value=yaml.load(yaml_str)):
         assert check_pinning(file) == [
             f".github/workflows/test.yaml:4: {action} is not pinned to commit (should be aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d # v3.1.5)"
         ]
 
 
+@patch("subprocess.check_output")
+def test_check_pinning_invalid_repo_name(mock_check_output: MagicMock, tmp_path):
+    file = tmp_path / "ci.yml"
+    file.write_text(f"""\
+jobs:
+  a:
+    steps:
+      - uses: owner/my+repo@v1
+      - uses: owner/my+repo@{"a" * 40}
+""")
+    with patch("check_gha_pinning.GraphQLClient.fetch_tags") as fetch_tags:
+        for backend in (None, GraphQLBackend(GraphQLClient("http://127.0.0.1:9/graphql"))):
+            checker = Checker(TagResolver(backend=backend), max_depth=1)
+            assert [str(problem) for problem in checker.check_file(file)] == [
+                f"{file}:4: owner/my+repo@v1: invalid repo name owner/my+repo, expected OWNER/REPO"
+            ]
+    mock_check_output.assert_not_called()
+    fetch_tags.assert_not_called()
+
+
 @patch("check_gha_pinning._check")
 @patch("check_gha_pinning._get_action_tags")
 def test_check_pinning_ref_not_found(
@@ -261,12 +726,49 @@ jobs:
         "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d": ["v3", "v3.1", "v3.1.5"],
     }
     by_tag = _build_by_tags_from_by_sha(by_sha)
-    mock__get_action_tags.return_value = (by_tag, by_sha)
+    mock__get_action_tags.return_value = ActionTags(by_tag, by_sha)
 
     with patch("ruamel.yaml.YAML.load", return_value=yaml.load(yaml_str)):
         assert check_pinning(file) == [".github/workflows/test.yaml:4: actions/checkout@v2: tag v2 not found"]
 
 
+@patch("check_gha_pinning._get_action_tags")
+def test_check_pinning_shared_resolver(mock__get_action_tags: MagicMock):
+    yaml = ruamel.yaml.YAML()
+    yaml_str = """\
+jobs:
+  some_job:
+    steps:
+      - uses: actions/checkout@v3
+      - uses: actions/checkout@v3.1
+"""
+    by_sha = {"aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d": ["v3", "v3.1"]}
+    mock__get_action_tags.return_value = ActionTags(_build_by_tags_from_by_sha(by_sha), by_sha)
+    resolver = TagResolver()
+    for _ in range(2):
+        with patch("ruamel.yaml.YAML.load", return_value=yaml.load(yaml_str)):
+            assert len(check_pinning(MagicMock(), resolver)) == 2
+    mock__get_action_tags.assert_called_once()
+
+
+@patch("check_gha_pinning._get_action_tags")
+def test_check_pinning_lookup_repo_not_found(mock__get_action_tags: MagicMock):
+    file = MagicMock()
+    file.__str__.return_value = ".github/workflows/test.yaml"
+    yaml = ruamel.yaml.YAML()
+    yaml_str = """\
+jobs:
+  some_job:
+    steps:
+      - uses: example/repo@v2
+"""
+    mock__get_action_tags.side_effect = _RepoNotFoundError("repo https://github.com/example/repo not found")
+    with patch("ruamel.yaml.YAML.load", return_value=yaml.load(yaml_str)):
+        assert check_pinning(file) == [
+            ".github/workflows/test.yaml:4: example/repo@v2: repo https://github.com/example/repo not found"
+        ]
+
+
 @patch("check_gha_pinning._check")
 @patch("check_gha_pinning._get_action_tags")
 def test_check_pinning_repo_not_found(
@@ -289,76 +791,594 @@ jobs:
         "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d": ["v3", "v3.1", "v3.1.5"],
     }
     by_tag = _build_by_tags_from_by_sha(by_sha)
-    mock__get_action_tags.return_value = (by_tag, by_sha)
+    mock__get_action_tags.return_value = ActionTags(by_tag, by_sha)
 
     with patch("ruamel.yaml.YAML.load", return_value=yaml.load(yaml_str)):
         assert check_pinning(file) == [".github/workflows/test.yaml:4: actions/checkout@v2: repo not found"]
 
 
+@pytest.mark.parametrize(
+    "env, value, option, expected",
+    [
+        ("GHA_PINNING_CACHE_TTL", "60", "cache_ttl", 60.0),
+        ("GHA_PINNING_JOBS", "4", "jobs", 4),
+        ("GHA_PINNING_TIMEOUT", "soon", "timeout", "argument --timeout: invalid float value: 'soon'"),
+        ("GHA_PINNING_MAX_DEPTH", "deep", "max_depth", "argument --max-depth: invalid int value: 'deep'"),
+    ],
+)
+def test_parse_args_env_defaults(env: str, value: str, option: str, expected, monkeypatch, capsys):
+    monkeypatch.setenv(env, value)
+    if isinstance(expected, str):
+        with pytest.raises(SystemExit) as ex:
+            _parse_args([])
+        assert ex.value.code == 2
+        assert expected in capsys.readouterr().err
+    else:
+        assert getattr(_parse_args([]), option) == expected
+
+
+@pytest.mark.parametrize(
+    "argv, error",
+    [
+        (["--watch", "--fix"], "--watch can't be combined with --fix"),
+        (["--watch", "--audit"], "--watch can't be combined with --audit"),
+        (["--watch", "--stats"], "--watch can't be combined with --stats"),
+        (["--watch", "--incremental"], "--watch can't be combined with --incremental"),
+        (["--audit", "--fix"], "--audit can't be combined with --fix"),
+    ],
+)
+def test_parse_args_conflicts(argv: list[str], error: str, capsys):
+    with pytest.raises(SystemExit) as ex:
+        _parse_args(argv)
+    assert ex.value.code == 2
+    assert error in capsys.readouterr().err
+
+
 @patch("pathlib.Path")
-@patch("check_gha_pinning.check_pinning")
-def test_main_success_no_args_no_files(mock_check_pinning: MagicMock, mock_path: MagicMock):
+@patch("check_gha_pinning.find_yaml_files")
+@patch("check_gha_pinning._load_uses")
+def test_main_success_no_args_no_files(
+    mock_load_uses: MagicMock, mock_find_yaml_files: MagicMock, mock_path: MagicMock
+):
     mock_path.return_value.is_file.return_value = False
     mock_path.return_value.is_dir.return_value = True
-    mock_path.return_value.rglob.return_value = []
+    mock_find_yaml_files.return_value = []
     with patch.object(sys, "argv", ["check_gha_pinning"]):
-        mock_check_pinning.return_value = []
+        mock_load_uses.return_value = []
         assert check_gha_pinning_main() == 0
 
-        mock_check_pinning.assert_not_called()
+        mock_load_uses.assert_not_called()
         mock_path.assert_called_with(".github/workflows")
 
 
+@patch("builtins.print")
+@patch("check_gha_pinning._get_action_tags")
+def test_main_resolves_each_repo_once(mock__get_action_tags: MagicMock, mock_print: MagicMock, tmp_path):
+    by_sha = {"aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d": ["v3", "v3.1"]}
+    mock__get_action_tags.return_value = ActionTags(_build_by_tags_from_by_sha(by_sha), by_sha)
+    files = []
+    for name in ("b.yml", "a.yml"):
+        files.append(tmp_path / name)
+        files[-1].write_text("""\
+jobs:
+  some_job:
+    steps:
+      - uses: actions/checkout@v3
+      - uses: actions/setup-python@v3
+""")
+    with patch.object(sys, "argv", ["check_gha_pinning", "--no-cache", *map(str, files)]):
+        assert check_gha_pinning_main() == 1
+    assert mock__get_action_tags.call_count == 2
+    sha = "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d"
+    assert mock_print.call_args_list == [
+        call(f"{file}:{line}: {action}@v3 is not pinned to commit (should be {sha} # v3.1)", flush=True)
+        for file in sorted(files)
+        for line, action in ((4, "actions/checkout"), (5, "actions/setup-python"))
+    ]
+
+
+@patch("builtins.print")
+@patch("check_gha_pinning._get_action_tags")
+def test_main_jobs(mock__get_action_tags: MagicMock, mock_print: MagicMock, tmp_path):
+    by_sha = {"aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d": ["v3"]}
+    mock__get_action_tags.return_value = ActionTags(_build_by_tags_from_by_sha(by_sha), by_sha)
+    for i in range(8):
+        (tmp_path / f"{i}.yml").write_text("""\
+jobs:
+  a:
+    steps:
+      - uses: actions/checkout@v3
+  b:
+    uses: org/wf/.github/workflows/w.yml@v3
+""")
+    (tmp_path / "invalid.yml").write_text("jobs: [uses")
+    with patch.object(sys, "argv", ["check_gha_pinning", "--no-cache", "--jobs", "3", str(tmp_path)]):
+        assert check_gha_pinning_main() == 1
+    assert mock__get_action_tags.call_count == 2
+
+    lines = [c.args[0] for c in mock_print.call_args_list]
+    assert len(lines) == 17
+    assert [line.split(":")[:2] for line in lines[:16]] == [
+        [str(tmp_path / f"{i}.yml"), line] for i in range(8) for line in ("4", "6")
+    ]
+    assert lines[16].startswith("Error parsing yaml:")
+
+
+@patch("builtins.print")
+@patch("check_gha_pinning._get_action_tags")
+def test_main_incremental(mock__get_action_tags: MagicMock, mock_print: MagicMock, tmp_path, monkeypatch):
+    monkeypatch.setenv("GHA_PINNING_CACHE_DIR", str(tmp_path / "cache"))
+    by_sha = {"aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d": ["v3", "v3.1"]}
+    mock__get_action_tags.return_value = ActionTags(_build_by_tags_from_by_sha(by_sha), by_sha)
+    unpinned = tmp_path / "unpinned.yml"
+    unpinned.write_text("jobs:\n  a:\n    steps:\n      - uses: actions/checkout@v3\n")
+    pinned = tmp_path / "pinned.yml"
+    pinned.write_text("jobs:\n  a:\n    uses: org/wf/w.yml@aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d\n")
+
+    def run(*args: str, sha: str = "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d") -> list[pathlib.Path]:
+        with patch("check_gha_pinning._load_uses", wraps=_load_uses) as mock_load_uses:
+            with patch.object(sys, "argv", ["check_gha_pinning", "--incremental", *args]):
+                assert check_gha_pinning_main() == 1
+        mock_print.assert_called_with(
+            f"{unpinned}:4: actions/checkout@v3 is not pinned to commit (should be {sha} # v3.1)", flush=True
+        )
+        return [c.args[0] for c in mock_load_uses.call_args_list]
+
+    assert run(str(unpinned), str(pinned)) == [pinned, unpinned]
+    assert run(str(unpinned), str(pinned)) == []
+    assert mock__get_action_tags.call_count == 1
+
+    pinned.write_text(pinned.read_text() + "# changed\n")
+    assert run(str(unpinned), str(pinned)) == [pinned]
+    # Results that needed a tag lookup expire with the tag cache, others are kept as long as the file is unchanged.
+    assert run("--cache-ttl=0", str(unpinned), str(pinned)) == [unpinned]
+    assert mock__get_action_tags.call_count == 2
+
+    # Tags that moved since the result was stored expire it, even before the cached tags expire.
+    moved = {"7c211433f02071597741e6ff5a8ea34789abbf43": ["v3", "v3.1"]}
+    mock__get_action_tags.return_value = ActionTags(_build_by_tags_from_by_sha(moved), moved)
+    with patch.object(sys, "argv", ["check_gha_pinning", "--cache-ttl=0", str(unpinned)]):
+        assert check_gha_pinning_main() == 1
+    assert run(str(unpinned), str(pinned), sha="7c211433f02071597741e6ff5a8ea34789abbf43") == [unpinned]
+    assert mock__get_action_tags.call_count == 3
+
+
+@patch("check_gha_pinning._get_action_tags")
+def test_main_fix(mock__get_action_tags: MagicMock, tmp_path, capsys):
+    sha = "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d"
+    by_sha = {sha: ["v3", "v3.1"]}
+    mock__get_action_tags.return_value = ActionTags(_build_by_tags_from_by_sha(by_sha), by_sha)
+    files = [tmp_path / name for name in ("a.yml", "b.yml")]
+    for file in files:
+        file.write_text("""\
+jobs:
+  a:
+    steps:
+      - name: Checkout
+        uses: actions/checkout@v3  # the checkout
+      - uses: actions/setup-python@v4
+      - uses: docker://alpine@3
+""")
+    with patch.object(sys, "argv", ["check_gha_pinning", "--no-cache", "--fix", *map(str, files)]):
+        assert check_gha_pinning_main() == 1
+    # Every repo was looked up once for all files.
+    assert mock__get_action_tags.call_count == 2
+    for file in files:
+        assert (
+            file.read_text()
+            == f"""\
+jobs:
+  a:
+    steps:
+      - name: Checkout
+        uses: actions/checkout@{sha}  # v3.1 # the checkout
+      - uses: actions/setup-python@v4
+      - uses: docker://alpine@3
+"""
+        )
+    out, err = capsys.readouterr()
+    # Only the problems that couldn't be fixed are reported.
+    assert out.splitlines() == [
+        f"{file}:{line}: {message}"
+        for file in files
+        for line, message in (
+            (6, "actions/setup-python@v4: tag v4 not found"),
+            (7, "docker://alpine@3 is not pinned to sha256"),
+        )
+    ]
+    assert err == f"Pinned 2 entries in 2 files: {files[0]}, {files[1]}\n"
+
+
+@patch("check_gha_pinning._get_action_tags")
+def test_checker(mock__get_action_tags: MagicMock):
+    sha = "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d"
+    by_sha = {sha: ["v3", "v3.1"]}
+    mock__get_action_tags.return_value = ActionTags(_build_by_tags_from_by_sha(by_sha), by_sha)
+    workflow = "jobs:\n  a:\n    steps:\n      - uses: actions/checkout@v3\n      - uses: docker://alpine@3\n"
+    expected = [
+        Problem(
+            "ci.yml",
+            4,
+            "actions/checkout@v3",
+            "unpinned-commit",
+            f"is not pinned to commit (should be {sha} # v3.1)",
+            f"{sha} # v3.1",
+        ),
+        Problem("ci.yml", 5, "docker://alpine@3", "unpinned-container", "is not pinned to sha256"),
+    ]
+    with Checker(engine="fast") as checker:
+        for content in (workflow, workflow.encode(), io.StringIO(workflow), io.BytesIO(workflow.encode())):
+            assert checker.check(content, "ci.yml") == expected
+        # The resolver is shared by the checks, also from several threads.
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(checker.check, [workflow] * 20, ["ci.yml"] * 20))
+        assert results == [expected] * 20
+        mock__get_action_tags.assert_called_once()
+
+        assert checker.check("name: no uses\n") == []
+        [error] = Checker().check("jobs: [uses", "broken.yml")
+        assert error.kind == "parse-error"
+        assert error.file == "broken.yml"
+        # The parser is reused after an error.
+        assert Checker().check(workflow, "ci.yml") == expected
+
+    with pytest.raises(ValueError, match="unknown engine"):
+        Checker(engine="nope")
+
+
+def test_main_shard_and_merge(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("GHA_PINNING_SKIP_GIT_CHECK", "1")
+    monkeypatch.chdir(tmp_path)
+    for i in range(20):
+        pathlib.Path(f"{i}.yml").write_text(f"jobs:\n  a:\n    steps:\n      - uses: org/repo{i}@v1\n")
+    pathlib.Path("container.yml").write_text("jobs:\n  a:\n    steps:\n      - uses: docker://alpine:3\n")
+
+    def run(*args: str) -> tuple[int, str, str]:
+        with patch.object(sys, "argv", ["check_gha_pinning", *args]):
+            status = check_gha_pinning_main()
+        return status, *capsys.readouterr()
+
+    _, everything, _ = run("--no-cache", "--format", "json-lines", ".")
+    reports = []
+    for i in range(1, 4):
+        status, out, _ = run("--no-cache", "--format", "json-lines", "--shard", f"{i}/3", ".")
+        assert status == (1 if out else 0)
+        # Shards are stable: the same files end up in the same shard every time.
+        assert run("--no-cache", "--format", "json-lines", "--shard", f"{i}/3", ".")[1] == out
+        reports.append(tmp_path / f"shard{i}.jsonl")
+        reports[-1].write_text(out)
+    assert all(report.read_text() for report in reports)
+    assert sorted(line for report in reports for line in report.read_text().splitlines()) == sorted(
+        everything.splitlines()
+    )
+
+    status, out, err = run("merge", *map(str, reports), str(reports[0]))
+    assert status == 1
+    assert out.splitlines() == sorted(
+        (str(Problem(**json.loads(line))) for line in everything.splitlines()), key=lambda line: line.split(":")[0]
+    )
+    assert err == "21 problems in 21 files from 4 reports: 20 unpinned-commit, 1 unpinned-container\n"
+
+    status, out, _ = run("merge", "--format", "json", *map(str, reports))
+    assert json.loads(out)["totals"] == {
+        "reports": 3,
+        "problems": 21,
+        "files": 21,
+        "degraded": 0,
+        "kinds": {"unpinned-commit": 20, "unpinned-container": 1},
+    }
+
+    reports[0].write_text("not json\n")
+    status, _, err = run("merge", str(reports[0]))
+    assert status == 2
+    assert err.startswith(f"check-gha-pinning merge: {reports[0]}:1: not a problem record")
+
+    with pytest.raises(SystemExit):
+        run("--shard", "4/3")
+
+
+@patch("check_gha_pinning._load_file")
+def test_main_since(mock_load_file: MagicMock, tmp_path, monkeypatch):
+    mock_load_file.return_value = []
+    monkeypatch.chdir(tmp_path)
+    _git("init", "-q")
+    workflows = tmp_path / ".github" / "workflows"
+    workflows.mkdir(parents=True)
+    for name in ("unchanged.yml", "changed.yml", "deleted.yml"):
+        (workflows / name).write_text("jobs: {}\n")
+    _git("add", ".")
+    _git("commit", "-q", "-m", "initial")
+    (workflows / "changed.yml").write_text("jobs: {}\non: push\n")
+    (workflows / "deleted.yml").unlink()
+    (workflows / "new.yml").write_text("jobs: {}\n")
+
+    with patch.object(sys, "argv", ["check_gha_pinning", "--since", "HEAD"]):
+        assert check_gha_pinning_main() == 0
+    assert sorted(c.args[0].name for c in mock_load_file.call_args_list) == ["changed.yml", "new.yml"]
+
+
+@patch("subprocess.check_output")
+def test_main_stats(mock_check_output: MagicMock, tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("GHA_PINNING_CACHE_DIR", str(tmp_path / "cache"))
+    mock_check_output.return_value = "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d\trefs/tags/v3\n"
+    for name in ("a.yml", "b.yml"):
+        (tmp_path / name).write_text("jobs:\n  a:\n    steps:\n      - uses: actions/checkout@v3\n")
+    (tmp_path / "c.yml").write_text("jobs: [uses")
+    expected = {"files": 3, "parse_errors": 1, "problems": 3, "uses": 2}
+    repo = "https://github.com/actions/checkout"
+    for counters, repos in (
+        ({"subprocesses": 1, "tag_cache_misses": 1}, [repo]),
+        ({"tag_cache_hits": 1}, []),
+    ):
+        with patch.object(sys, "argv", ["check_gha_pinning", "--stats", "json", str(tmp_path)]):
+            assert check_gha_pinning_main() == 1
+        stats = json.loads(capsys.readouterr().err)
+        assert stats["counters"] == expected | counters
+        assert list(stats["repos"]) == repos
+        assert {"discover", "parse", "check", "report", "total"} <= stats["phases"].keys()
+    assert mock_check_output.call_count == 1
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+@patch("check_gha_pinning._get_action_tags")
+def test_main_stats_jobs(mock__get_action_tags: MagicMock, jobs: str, tmp_path, capsys):
+    mock__get_action_tags.return_value = _action_tags({"v3": "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d"})
+    for i in range(4):
+        (tmp_path / f"{i}.yml").write_text("jobs:\n  a:\n    steps:\n      - uses: actions/checkout@v3\n")
+    (tmp_path / "plain.yml").write_text("on: push\n")
+    argv = ["check_gha_pinning", "--no-cache", "--jobs", jobs, "--stats", "json", str(tmp_path)]
+    with patch.object(sys, "argv", argv):
+        assert check_gha_pinning_main() == 1
+    stats = json.loads(capsys.readouterr().err)
+    # Files loaded in worker processes are counted and timed like the ones loaded in the main process.
+    assert stats["counters"]["skipped_files"] == 1
+    assert stats["phases"]["parse"] > 0
+
+
+@patch("check_gha_pinning._load_file")
+def test_main_git_ls_files(mock_load_file: MagicMock, tmp_path, monkeypatch):
+    mock_load_file.return_value = []
+    monkeypatch.chdir(tmp_path)
+    _git("init", "-q")
+    workflows = tmp_path / ".github" / "workflows"
+    workflows.mkdir(parents=True)
+    for name in ("tracked.yml", "untracked.yml", "README.md"):
+        (workflows / name).write_text("jobs: {}\n")
+    _git("add", ".github/workflows/tracked.yml", ".github/workflows/README.md")
+
+    with patch.object(sys, "argv", ["check_gha_pinning", "--git-ls-files"]):
+        assert check_gha_pinning_main() == 0
+    assert [c.args[0] for c in mock_load_file.call_args_list] == [pathlib.Path(".github/workflows/tracked.yml")]
+
+
 @patch("pathlib.Path")
 def test_main_success_args_files(mock_path: MagicMock):
     mock_path.return_value.is_file.return_value = True
     mock_path.return_value.is_dir.return_value = False
     mock_path.return_value.__hash__.side_effect = [1, 2]
     with patch.object(sys, "argv", ["check_gha_pinning", "file1", "file2"]):
-        with patch("check_gha_pinning.check_pinning") as mock_check_pinning:
-            mock_check_pinning.return_value = []
+        with patch("check_gha_pinning._load_uses") as mock_load_uses:
+            mock_load_uses.return_value = []
             assert check_gha_pinning_main() == 0
             mock_path.assert_has_calls([call("file1"), call("file2")], any_order=True)
 
-            mock_check_pinning.assert_called()
-            assert mock_check_pinning.call_count == 2
+            mock_load_uses.assert_called()
+            assert mock_load_uses.call_count == 2
 
 
-def test_main_success_args_dirs():
+@patch("check_gha_pinning.find_yaml_files")
+def test_main_success_args_dirs(mock_find_yaml_files: MagicMock):
     with patch("pathlib.Path") as mock_file:
         mock_file.return_value.is_file.return_value = True
         mock_file.return_value.__hash__.side_effect = [1, 2, 3, 4]
         with patch("pathlib.Path") as mock_path:
             mock_path.return_value.is_file.return_value = False
             mock_path.return_value.is_dir.return_value = True
-            mock_path.return_value.rglob.side_effect = [
+            mock_find_yaml_files.side_effect = [
                 [mock_file("file1"), mock_file("file2")],
                 [mock_file("file3"), mock_file("file4")],
             ]
             with patch.object(sys, "argv", ["check_gha_pinning", "dir1", "dir2"]):
-                with patch("check_gha_pinning.check_pinning") as mock_check_pinning:
-                    mock_check_pinning.return_value = []
+                with patch("check_gha_pinning._load_uses") as mock_load_uses:
+                    mock_load_uses.return_value = []
                     assert check_gha_pinning_main() == 0
                     mock_path.assert_has_calls([call("dir1"), call("dir2")], any_order=True)
+                    assert mock_find_yaml_files.call_count == 2
                     mock_file.assert_has_calls(
                         [call("file1"), call("file2"), call("file3"), call("file4")], any_order=True
                     )
 
-                    mock_check_pinning.assert_called()
-                    assert mock_check_pinning.call_count == 4
+                    mock_load_uses.assert_called()
+                    assert mock_load_uses.call_count == 4
 
 
 @patch("builtins.print")
 @patch("pathlib.Path")
-@patch("check_gha_pinning.check_pinning")
+@patch("check_gha_pinning._load_uses")
+@patch("check_gha_pinning._check_uses")
 def test_main_success_args_file_with_problems(
-    mock_check_pinning: MagicMock, mock_file: MagicMock, mock_print: MagicMock
+    mock_check_uses: MagicMock, mock_load_uses: MagicMock, mock_file: MagicMock, mock_print: MagicMock
 ):
     mock_file.return_value.is_file.return_value = True
     with patch.object(sys, "argv", ["check_gha_pinning", "file1"]):
-        mock_check_pinning.return_value = ["line1", "line2"]
+        mock_load_uses.return_value = []
+        problems = [
+            Problem("file1", None, None, "parse-error", "line1"),
+            Problem("file1", None, None, "parse-error", "line2"),
+        ]
+        mock_check_uses.return_value = iter(problems)
         assert check_gha_pinning_main() == 1
 
-        mock_check_pinning.assert_called()
-        mock_print.assert_called()
-        mock_print.assert_called_once_with("line1\nline2")
+        mock_check_uses.assert_called()
+        assert mock_print.call_args_list == [call("line1", flush=True), call("line2", flush=True)]
+
+
+@patch("builtins.print")
+def test_main_json_lines(mock_print: MagicMock, tmp_path, monkeypatch):
+    monkeypatch.setenv("GHA_PINNING_SKIP_GIT_CHECK", "1")
+    file = tmp_path / "workflow.yml"
+    file.write_text("jobs:\n  a:\n    steps:\n      - uses: actions/checkout@v3\n      - uses: docker://alpine@3\n")
+    invalid = tmp_path / "x-invalid.yml"
+    invalid.write_text("jobs: [uses")
+    with patch.object(sys, "argv", ["check_gha_pinning", "--format", "json-lines", str(tmp_path)]):
+        assert check_gha_pinning_main() == 1
+    records = [json.loads(c.args[0]) for c in mock_print.call_args_list]
+    assert records[:2] == [
+        {
+            "file": str(file),
+            "line": 4,
+            "action": "actions/checkout@v3",
+            "kind": "unpinned-commit",
+            "message": "is not pinned to commit",
+            "suggestion": None,
+            "degraded": False,
+        },
+        {
+            "file": str(file),
+            "line": 5,
+            "action": "docker://alpine@3",
+            "kind": "unpinned-container",
+            "message": "is not pinned to sha256",
+            "suggestion": None,
+            "degraded": False,
+        },
+    ]
+    assert len(records) == 3
+    assert records[2]["file"] == str(invalid)
+    assert records[2]["kind"] == "parse-error"
+
+
+@patch("check_gha_pinning._get_action_tags")
+def test_iter_problems(mock__get_action_tags: MagicMock, tmp_path):
+    by_sha = {"aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d": ["v3", "v3.1"]}
+    mock__get_action_tags.return_value = ActionTags(_build_by_tags_from_by_sha(by_sha), by_sha)
+    file = tmp_path / "workflow.yml"
+    file.write_text("jobs:\n  a:\n    steps:\n      - uses: actions/checkout@v3\n      - uses: actions/cache@v9\n")
+    problems = iter_problems(file)
+    assert next(problems) == Problem(
+        str(file),
+        4,
+        "actions/checkout@v3",
+        "unpinned-commit",
+        "is not pinned to commit (should be aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d # v3.1)",
+        "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d # v3.1",
+    )
+    assert mock__get_action_tags.call_count == 1
+    problem = next(problems)
+    assert problem.kind == "resolution-error"
+    assert str(problem) == f"{file}:5: actions/cache@v9: tag v9 not found"
+    assert next(problems, None) is None
+
+
+@pytest.mark.parametrize("poll", ["", "1"])
+@patch("check_gha_pinning._get_action_tags")
+def test_main_watch(mock__get_action_tags: MagicMock, poll: str, tmp_path, monkeypatch, capsys):
+    sha = "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d"
+    by_sha = {sha: ["v3", "v3.1"]}
+    mock__get_action_tags.return_value = ActionTags(_build_by_tags_from_by_sha(by_sha), by_sha)
+    monkeypatch.setenv("GHA_PINNING_WATCH_POLL", poll)
+    a, b = tmp_path / "a.yml", tmp_path / "b.yml"
+    a.write_text("jobs:\n  a:\n    steps:\n      - uses: actions/checkout@v3\n")
+    b.write_text("jobs:\n  a:\n    steps:\n      - uses: docker://alpine@3\n")
+
+    stop = threading.Event()
+    status = []
+    thread = threading.Thread(
+        target=lambda: status.append(_watch.main(_parse_args(["--no-cache", "--watch", str(tmp_path)]), stop))
+    )
+    thread.start()
+    out, err = "", ""
+
+    def read_until(text: str) -> None:
+        nonlocal out, err
+        deadline = time.monotonic() + 10
+        while text not in err and time.monotonic() < deadline:
+            time.sleep(0.01)
+            captured = capsys.readouterr()
+            out, err = out + captured.out, err + captured.err
+        assert text in err
+
+    try:
+        read_until("2 problems in 2 files, watching 2 files")
+        assert out.splitlines() == [
+            f"{a}:4: actions/checkout@v3 is not pinned to commit (should be {sha} # v3.1)",
+            f"{b}:4: docker://alpine@3 is not pinned to sha256",
+        ]
+
+        # Only the differences are printed, moved problems aren't.
+        out = err = ""
+        a.write_text(
+            "jobs:\n  a:\n    steps:\n      - uses: actions/setup-python@v3\n\n      - uses: actions/checkout@v3\n"
+        )
+        read_until("3 problems in 2 files")
+        assert out.splitlines() == [
+            f"+ {a}:4: actions/setup-python@v3 is not pinned to commit (should be {sha} # v3.1)"
+        ]
+
+        out = err = ""
+        b.unlink()
+        (tmp_path / "c.yml").write_text(f"jobs:\n  a:\n    steps:\n      - uses: actions/checkout@{sha}\n")
+        read_until("2 problems in 1 files, watching 2 files")
+        assert out.splitlines() == [f"- {b}:4: docker://alpine@3 is not pinned to sha256"]
+    finally:
+        stop.set()
+        thread.join()
+    assert status == [1]
+    # Tags were looked up once per repo for the whole session.
+    assert mock__get_action_tags.call_count == 2
+
+
+@patch("check_gha_pinning._get_action_tags")
+def test_main_audit(mock__get_action_tags: MagicMock, tmp_path, capsys):
+    old, new = "1" * 40, "2" * 40
+    by_sha = {old: ["v1.0.0"], new: ["v1", "v1.1.0"]}
+
+    def get_action_tags(action: str, timeout: float | None = None) -> ActionTags:
+        if action.startswith("org/missing"):
+            raise _RepoNotFoundError("repo https://github.com/org/missing not found")
+        return ActionTags(_build_by_tags_from_by_sha(by_sha), by_sha)
+
+    mock__get_action_tags.side_effect = get_action_tags
+    (tmp_path / "a.yml").write_text(f"""\
+jobs:
+  a:
+    steps:
+      - uses: org/action@{old}
+      - uses: org/action/sub@{new}
+      - uses: org/other@{"3" * 40}
+      - uses: org/missing@{old}
+      - uses: org/unpinned@v1
+""")
+    (tmp_path / "b.yml").write_text(f"jobs:\n  a:\n    steps:\n      - uses: org/action@{old}\n")
+    with patch.object(sys, "argv", ["check_gha_pinning", "--no-cache", "--audit", str(tmp_path)]):
+        assert check_gha_pinning_main() == 1
+    out, err = capsys.readouterr()
+    assert out.splitlines() == [
+        "org/action: 3 pins in 2 files, 2 behind (v1.0.0 -> v1.1.0)",
+        "org/missing: 1 pins in 1 files, not audited: repo https://github.com/org/missing not found",
+        "org/other: 1 pins in 1 files, 1 untagged (33333333)",
+    ]
+    assert err == "Audited 5 pins of 3 repos in 2 files: 2 behind, 1 untagged, 1 repos not audited\n"
+    # Each repo was looked up once for all its pins, and unpinned entries weren't looked up at all.
+    assert sorted(args[0].split("@")[0] for args, _ in mock__get_action_tags.call_args_list) == [
+        "org/action",
+        "org/missing",
+        "org/other",
+    ]
+
+    with patch.object(
+        sys, "argv", ["check_gha_pinning", "--no-cache", "--audit", "--format=json-lines", str(tmp_path)]
+    ):
+        check_gha_pinning_main()
+    first = json.loads(capsys.readouterr().out.splitlines()[0])
+    assert first["behind"] == [
+        {"sha": old, "tag": "v1.0.0", "newest": "v1.1.0", "pins": [f"{tmp_path}/a.yml:4", f"{tmp_path}/b.yml:4"]}
+    ]
+
+
+def test_resolver_backend_is_abstract():
+    class NoLookups(ResolverBackend):
+        pass
+
+    with pytest.raises(TypeError, match="get_action_tags"):
+        NoLookups()
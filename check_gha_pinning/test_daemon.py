@@ -0,0 +1,111 @@
+import json
+import os
+import pathlib
+import socket
+import sys
+import threading
+import time
+from collections.abc import Iterator
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from check_gha_pinning import ActionTags, _daemon
+from check_gha_pinning import main as check_gha_pinning_main
+
+pytestmark = pytest.mark.skipif(not _daemon.available(), reason="needs Unix sockets")
+
+_SHA = "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d"
+
+
+@pytest.fixture
+def socket_path(tmp_path: pathlib.Path) -> Iterator[pathlib.Path]:
+    # Unix socket paths are limited to about 100 characters, shorter than some temporary directories.
+    directory = pathlib.Path("/tmp") if len(str(tmp_path)) > 80 else tmp_path
+    path = directory / f"daemon-{os.getpid()}-{threading.get_ident()}.sock"
+    yield path
+    path.unlink(missing_ok=True)
+
+
+def _ask(path: pathlib.Path, argv: list[str], cwd: pathlib.Path, env: dict[str, str]) -> list[dict]:
+    """Send a request like `_daemon.request`, returning the messages instead of printing them."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(path))
+        with sock.makefile("rw", encoding="utf-8") as file:
+            file.write(json.dumps({"argv": argv, "cwd": str(cwd), "env": env}) + "\n")
+            file.flush()
+            return [json.loads(line) for line in file]
+
+
+def _wait_for(path: pathlib.Path) -> None:
+    deadline = time.monotonic() + 5
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+@patch("check_gha_pinning._get_action_tags")
+def test_daemon_keeps_caches_in_memory(mock__get_action_tags: MagicMock, socket_path: pathlib.Path, tmp_path):
+    mock__get_action_tags.return_value = ActionTags({"v3": _SHA}, {_SHA: ["v3"]})
+    (tmp_path / "workflows").mkdir()
+    (tmp_path / "workflows" / "ci.yml").write_text("jobs:\n  a:\n    steps:\n      - uses: actions/checkout@v3\n")
+    server = threading.Thread(target=_daemon.serve, args=(socket_path, _daemon.Session().check, 1))
+    server.start()
+    _wait_for(socket_path)
+    env = {"GHA_PINNING_CACHE_DIR": str(tmp_path / "cache")}
+    try:
+        first = _ask(socket_path, ["workflows", "--stats", "json"], tmp_path, env)
+        second = _ask(socket_path, ["workflows", "--stats", "json"], tmp_path, env)
+        invalid = _ask(socket_path, ["--engine", "nope"], tmp_path, env)
+    finally:
+        server.join()
+
+    expected = f"workflows/ci.yml:4: actions/checkout@v3 is not pinned to commit (should be {_SHA} # v3)\n"
+    for messages in (first, second):
+        assert messages[0] == {"stdout": expected}
+        assert messages[-1] == {"exit": 1}
+    assert json.loads(second[1]["stderr"])["counters"]["result_cache_hits"] == 1
+    mock__get_action_tags.assert_called_once()
+    assert invalid[-1] == {"exit": 2}
+    assert "invalid choice" in "".join(message.get("stderr", "") for message in invalid)
+    # The daemon exited after the idle timeout and cleaned up.
+    assert not socket_path.exists()
+    # The environment of a request is only used while answering it.
+    assert os.environ.get("GHA_PINNING_CACHE_DIR") != env["GHA_PINNING_CACHE_DIR"]
+
+
+def test_daemon_runs_once(socket_path: pathlib.Path):
+    server = threading.Thread(target=_daemon.serve, args=(socket_path, lambda argv: 0, 0.5))
+    server.start()
+    _wait_for(socket_path)
+    start = time.monotonic()
+    _daemon.serve(socket_path, lambda argv: 0, 10)
+    assert time.monotonic() - start < 1
+    server.join()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="the daemon is started in a new session")
+def test_main_daemon(socket_path: pathlib.Path, tmp_path: pathlib.Path, monkeypatch, capsys):
+    monkeypatch.setenv("GHA_PINNING_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("GHA_PINNING_SKIP_GIT_CHECK", "1")
+    monkeypatch.setenv("GHA_PINNING_DAEMON_IDLE_TIMEOUT", "2")
+    monkeypatch.chdir(tmp_path)
+    pathlib.Path("ci.yml").write_text("jobs:\n  a:\n    steps:\n      - uses: actions/checkout@v3\n")
+    with patch("check_gha_pinning._daemon.socket_path", return_value=socket_path):
+        for _ in range(2):
+            with patch.object(sys, "argv", ["check_gha_pinning", "--daemon", "ci.yml"]):
+                assert check_gha_pinning_main() == 1
+            assert capsys.readouterr().out == "ci.yml:4: actions/checkout@v3 is not pinned to commit\n"
+            assert socket_path.exists()
+
+
+def test_main_daemon_unreachable(tmp_path: pathlib.Path, monkeypatch, capsys):
+    monkeypatch.setenv("GHA_PINNING_SKIP_GIT_CHECK", "1")
+    file = tmp_path / "ci.yml"
+    file.write_text("jobs:\n  a:\n    steps:\n      - uses: actions/checkout@v3\n")
+    with (
+        patch("check_gha_pinning._daemon.request", return_value=None) as mock_request,
+        patch.object(sys, "argv", ["check_gha_pinning", "--daemon", "--no-cache", str(file)]),
+    ):
+        assert check_gha_pinning_main() == 1
+    mock_request.assert_called_once()
+    assert capsys.readouterr().out == f"{file}:4: actions/checkout@v3 is not pinned to commit\n"
@@ -0,0 +1,114 @@
+import os
+import pathlib
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from check_gha_pinning._discover import _parse_pattern, find_yaml_files, git_ls_files
+
+
+def _write(root: pathlib.Path, *names: str) -> None:
+    for name in names:
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_text("jobs: {}\n")
+
+
+def _found(root: pathlib.Path) -> list[str]:
+    return sorted(path.relative_to(root).as_posix() for path in find_yaml_files(root))
+
+
+@pytest.mark.parametrize(
+    "pattern, path, is_dir, expected",
+    [
+        ("node_modules", "node_modules", True, True),
+        ("node_modules", "a/b/node_modules", True, True),
+        ("node_modules/", "node_modules", False, False),
+        ("/build", "build", True, True),
+        ("/build", "a/build", True, False),
+        ("a/b", "a/b", False, True),
+        ("a/b", "x/a/b", False, False),
+        ("*.yml", "a/b.yml", False, True),
+        ("a/*.yml", "a/b/c.yml", False, False),
+        ("a/**/c.yml", "a/b/d/c.yml", False, True),
+        ("a/**/c.yml", "a/c.yml", False, True),
+        ("**/vendor", "x/y/vendor", True, True),
+        ("out/**", "out/x/y.yml", False, True),
+        ("file?.yml", "file1.yml", False, True),
+        ("file[0-9].yml", "filea.yml", False, False),
+        ("file[!0-9].yml", "filea.yml", False, True),
+        ("\\#hash", "#hash", False, True),
+        ("# comment", "# comment", False, False),
+    ],
+)
+def test_parse_pattern(pattern: str, path: str, is_dir: bool, expected: bool):
+    parsed = _parse_pattern(pattern)
+    matched = parsed is not None and (is_dir or not parsed.dir_only) and bool(parsed.regex.fullmatch(path))
+    assert matched == expected
+
+
+def test_find_yaml_files(tmp_path: pathlib.Path):
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".gitignore").write_text("node_modules/\n/build\n*.generated.yml\n")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / ".gitignore").write_text("local.yml\n!keep.generated.yml\n")
+    _write(
+        tmp_path,
+        ".github/workflows/ci.yml",
+        ".github/workflows/release.yaml",
+        ".github/workflows/README.md",
+        ".git/config.yml",
+        "action.yml",
+        "node_modules/pkg/action.yml",
+        "build/x.yml",
+        "sub/build/action.yml",
+        "a.generated.yml",
+        "sub/local.yml",
+        "sub/keep.generated.yml",
+    )
+    (tmp_path / "binary.bin").write_bytes(b"\0\1\2")
+
+    assert _found(tmp_path) == [
+        ".github/workflows/ci.yml",
+        ".github/workflows/release.yaml",
+        "action.yml",
+        "sub/build/action.yml",
+        "sub/keep.generated.yml",
+    ]
+    # Rules of the repo still apply when only a subdirectory is walked.
+    assert _found(tmp_path / "sub") == ["build/action.yml", "keep.generated.yml"]
+
+
+def test_find_yaml_files_prunes_ignored_directories(tmp_path: pathlib.Path):
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".gitignore").write_text("node_modules\n")
+    _write(tmp_path, ".github/workflows/ci.yml", *(f"node_modules/pkg{i}/action.yml" for i in range(10)))
+    scanned = []
+
+    def scandir(path):
+        scanned.append(pathlib.Path(path).relative_to(tmp_path).as_posix())
+        return os_scandir(path)
+
+    os_scandir = os.scandir
+    with patch("os.scandir", scandir):
+        assert _found(tmp_path) == [".github/workflows/ci.yml"]
+    assert sorted(scanned) == [".", ".github", ".github/workflows"]
+
+
+def test_find_yaml_files_does_not_follow_directory_symlinks(tmp_path: pathlib.Path):
+    _write(tmp_path, "a/action.yml")
+    (tmp_path / "a" / "loop").symlink_to(tmp_path, target_is_directory=True)
+    assert _found(tmp_path) == ["a/action.yml"]
+
+
+def test_git_ls_files(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.chdir(tmp_path)
+    subprocess.check_call(["git", "init", "-q"])
+    _write(tmp_path, ".github/workflows/ci.yml", ".github/workflows/deleted.yml", "docs/action.yaml", "docs/x.md")
+    subprocess.check_call(["git", "add", "."])
+    (tmp_path / ".github" / "workflows" / "deleted.yml").unlink()
+    _write(tmp_path, ".github/workflows/untracked.yml")
+
+    found = git_ls_files([pathlib.Path(".github"), pathlib.Path("docs")])
+    assert found == [pathlib.Path(".github/workflows/ci.yml"), pathlib.Path("docs/action.yaml")]
+    assert git_ls_files([]) == []
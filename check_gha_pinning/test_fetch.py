@@ -0,0 +1,141 @@
+import os
+import pathlib
+import shutil
+import subprocess
+import sys
+from collections.abc import Callable
+from unittest.mock import patch
+
+import pytest
+
+from check_gha_pinning import main as check_gha_pinning_main
+from check_gha_pinning._cache import DiskCache
+from check_gha_pinning._fetch import FetchError, GitFetcher
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="needs git")
+
+Commit = Callable[[str, dict[str, str]], str]
+
+
+@pytest.fixture
+def commit(tmp_path: pathlib.Path, monkeypatch) -> Commit:
+    """Commit files to local bare repos that stand in for the GitHub repos of the same name, returning the hash."""
+    root = tmp_path / "github"
+    monkeypatch.setenv("GIT_CONFIG_COUNT", "1")
+    monkeypatch.setenv("GIT_CONFIG_KEY_0", f"url.{root.as_uri()}/.insteadOf")
+    monkeypatch.setenv("GIT_CONFIG_VALUE_0", "https://github.com/")
+
+    def commit(repo: str, files: dict[str, str]) -> str:
+        git_dir = root / f"{repo}.git"
+        if not git_dir.exists():
+            subprocess.run(["git", "init", "--quiet", "--bare", str(git_dir)], check=True)
+        work_tree = tmp_path / "work" / repo
+        shutil.rmtree(work_tree, ignore_errors=True)
+        for name, content in files.items():
+            (work_tree / name).parent.mkdir(parents=True, exist_ok=True)
+            (work_tree / name).write_text(content)
+        git = ["git", f"--git-dir={git_dir}", f"--work-tree={work_tree}", "-c", "user.name=t", "-c", "user.email=t@t"]
+        subprocess.run([*git, "add", "--all"], check=True)
+        subprocess.run([*git, "commit", "--quiet", "--allow-empty", "-m", "commit"], check=True)
+        return subprocess.check_output([*git, "rev-parse", "HEAD"], text=True).strip()
+
+    return commit
+
+
+def test_git_fetcher(commit: Commit):
+    first = commit("org/action", {"action.yml": "name: first\n"})
+    commit("org/action", {"sub/action.yaml": "name: second\n"})
+    fetcher = GitFetcher()
+    try:
+        url = "https://github.com/org/action"
+        # Older commits can be fetched, not only the ones refs point to.
+        assert fetcher.read(url, first, ["action.yml", "action.yaml"]) == ("action.yml", b"name: first\n")
+        assert fetcher.read(url, first, ["sub/action.yml", "sub/action.yaml"]) is None
+        # Git failing to read the fetched commit isn't taken for a missing file.
+        with patch("subprocess.check_output", side_effect=subprocess.TimeoutExpired(["git"], 5)):
+            with pytest.raises(FetchError, match="timed out after 5s"):
+                fetcher.read(url, first, ["action.yml"])
+        with pytest.raises(FetchError):
+            fetcher.read("https://github.com/org/missing", first, ["action.yml"])
+        with pytest.raises(FetchError):
+            fetcher.read(url, "0" * 40, ["action.yml"])
+    finally:
+        fetcher.close()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="file URLs of the stand-in repos")
+def test_main_recursive(commit: Commit, tmp_path: pathlib.Path, monkeypatch, capsys):
+    monkeypatch.setenv("GHA_PINNING_SKIP_GIT_CHECK", "1")
+    monkeypatch.setenv("GHA_PINNING_CACHE_DIR", str(tmp_path / "cache"))
+    inner = commit("org/inner", {"action.yml": "runs:\n  using: composite\n  steps:\n    - uses: docker://alpine@3\n"})
+    deep = commit("org/deep", {"action.yml": f"runs:\n  using: composite\n  steps:\n    - uses: org/inner@{inner}\n"})
+    composite = commit(
+        "org/composite",
+        {
+            "nested/action.yml": f"""\
+runs:
+  using: composite
+  steps:
+    - uses: actions/checkout@v3
+    - uses: org/inner@{inner}
+    - uses: org/deep@{deep}
+    - uses: org/missing@{inner}
+    - uses: org/inner/sub@{inner}
+"""
+        },
+    )
+    workflow = commit(
+        "org/workflows", {".github/workflows/build.yml": f"jobs:\n  a:\n    uses: org/composite/nested@{composite}\n"}
+    )
+    file = tmp_path / "ci.yml"
+    file.write_text(f"""\
+jobs:
+  build:
+    uses: org/workflows/.github/workflows/build.yml@{workflow}
+  other:
+    steps:
+      - uses: org/composite/nested@{composite}
+""")
+
+    def run(*args: str) -> list[str]:
+        with patch.object(sys, "argv", ["check_gha_pinning", "--recursive", *args, str(file)]):
+            assert check_gha_pinning_main() == 1
+        return capsys.readouterr().out.splitlines()
+
+    nested = f"org/composite/nested@{composite} depends on org/composite/nested/action.yml"
+    checkout = f"{nested}:4: actions/checkout@v3 is not pinned to commit"
+    alpine = "org/inner/action.yml:4: docker://alpine@3 is not pinned to sha256"
+    inner_alpine = f"{nested}:5: org/inner@{inner} depends on {alpine}"
+    deep_alpine = f"{nested}:6: org/deep@{deep} depends on org/deep/action.yml:4: org/inner@{inner} depends on {alpine}"
+    missing = f"{nested}:7: org/missing@{inner}: dependencies not checked: "
+    sub = f"{nested}:8: org/inner/sub@{inner}: sub/action.yml or sub/action.yaml not found"
+    build = (
+        f"org/workflows/.github/workflows/build.yml@{workflow} depends on org/workflows/.github/workflows/build.yml:3"
+    )
+
+    def check(lines: list[str], expected: list[str]) -> None:
+        assert len(lines) == len(expected)
+        for line, prefix in zip(lines, expected):
+            assert line == prefix if not prefix.endswith(": ") else line.startswith(prefix)
+
+    # Through the reusable workflow, org/deep is 3 levels deep, so the actions it uses aren't checked anymore.
+    check(
+        run(),
+        [
+            *(f"{file}:3: {build}: {problem}" for problem in (checkout, inner_alpine, missing, sub)),
+            *(f"{file}:6: {problem}" for problem in (checkout, inner_alpine, deep_alpine, missing, sub)),
+        ],
+    )
+    # Files at a commit never change, so later runs only fetch what couldn't be fetched before.
+    with patch.object(GitFetcher, "read", side_effect=FetchError("offline")) as mock_read:
+        run()
+    assert {c.args[0] for c in mock_read.call_args_list} == {"https://github.com/org/missing"}
+
+    # Only the files defining the entries of ci.yml are checked, not what their pinned entries use.
+    assert run("--max-depth=1", "--no-cache") == [f"{file}:6: {checkout}"]
+
+    # --clear-cache removes the cached dependencies also without --recursive.
+    assert DiskCache("dependencies").directory.exists()
+    with patch.object(sys, "argv", ["check_gha_pinning", "--clear-cache", str(file)]):
+        assert check_gha_pinning_main() == 0
+    assert not DiskCache("dependencies").directory.exists()
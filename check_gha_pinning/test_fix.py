@@ -0,0 +1,81 @@
+import os
+import pathlib
+import stat
+
+import pytest
+
+from check_gha_pinning._fix import Fix, fix_file
+
+_SHA = "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d"
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("- uses: actions/checkout@v3", f"- uses: actions/checkout@{_SHA} # v3.1"),
+        ("- uses: actions/checkout@v3  ", f"- uses: actions/checkout@{_SHA} # v3.1"),
+        ('  uses: "actions/checkout@v3"', f'  uses: "actions/checkout@{_SHA}" # v3.1'),
+        ("  uses: 'actions/checkout@v3'", f"  uses: 'actions/checkout@{_SHA}' # v3.1"),
+        ("- uses: actions/checkout@v3   # v3", f"- uses: actions/checkout@{_SHA}   # v3.1"),
+        ("- uses: actions/checkout@v3 #v3.1", f"- uses: actions/checkout@{_SHA} # v3.1"),
+        ("- uses: actions/checkout@v3  # keep", f"- uses: actions/checkout@{_SHA}  # v3.1 # keep"),
+        ("- {uses: actions/checkout@v3, with: {a: 1}}", f"- {{uses: actions/checkout@{_SHA}, with: {{a: 1}}}} # v3.1"),
+        ("- uses: actions/checkout@v3.1", None),
+        ("- uses: actions/checkout@v3 ", f"- uses: actions/checkout@{_SHA} # v3.1"),
+        ("- run: echo actions/checkout@v3", None),
+    ],
+)
+def test_fix_file_line(tmp_path: pathlib.Path, line: str, expected: str | None):
+    file = tmp_path / "ci.yml"
+    file.write_text(f"{line}\n")
+    applied = fix_file(file, [Fix(1, "actions/checkout@v3", f"actions/checkout@{_SHA}", "v3.1")])
+    assert applied == ([] if expected is None else [Fix(1, "actions/checkout@v3", f"actions/checkout@{_SHA}", "v3.1")])
+    assert file.read_text() == f"{expected or line}\n"
+
+
+def test_fix_file(tmp_path: pathlib.Path):
+    file = tmp_path / "ci.yml"
+    file.write_bytes(
+        b"# workflow\r\n"
+        b"jobs:\r\n"
+        b"  a:\r\n"
+        b"    steps:\r\n"
+        b"      - name: Checkout\r\n"
+        b"        uses: actions/checkout@v3\r\n"
+        b"      - uses: actions/checkout@v3 # noqa: gha-pinning\r\n"
+        b"      - uses: actions/checkout@v3\r\n"
+        b"  b:\r\n"
+        b"    uses: org/repo/.github/workflows/w.yml@main"
+    )
+    file.chmod(0o640)
+    fixes = [
+        Fix(8, "actions/checkout@v3", f"actions/checkout@{_SHA}", "v3.1"),
+        Fix(5, "actions/checkout@v3", f"actions/checkout@{_SHA}", "v3.1"),
+        Fix(10, "org/repo/.github/workflows/w.yml@main", f"org/repo/.github/workflows/w.yml@{_SHA}", "main"),
+        Fix(10, "actions/missing@v1", f"actions/missing@{_SHA}", "v1"),
+    ]
+    assert sorted(fix_file(file, fixes, "noqa: gha-pinning")) == sorted(fixes[:3])
+    assert file.read_bytes() == (
+        b"# workflow\r\n"
+        b"jobs:\r\n"
+        b"  a:\r\n"
+        b"    steps:\r\n"
+        b"      - name: Checkout\r\n"
+        b"        uses: actions/checkout@" + _SHA.encode() + b" # v3.1\r\n"
+        b"      - uses: actions/checkout@v3 # noqa: gha-pinning\r\n"
+        b"      - uses: actions/checkout@" + _SHA.encode() + b" # v3.1\r\n"
+        b"  b:\r\n"
+        b"    uses: org/repo/.github/workflows/w.yml@" + _SHA.encode() + b" # main"
+    )
+    if os.name != "nt":
+        assert stat.S_IMODE(file.stat().st_mode) == 0o640
+    assert [path.name for path in tmp_path.iterdir()] == ["ci.yml"]
+
+
+def test_fix_file_unchanged(tmp_path: pathlib.Path):
+    file = tmp_path / "ci.yml"
+    file.write_text("jobs: {}\n")
+    mtime = file.stat().st_mtime_ns
+    assert fix_file(file, [Fix(1, "actions/checkout@v3", f"actions/checkout@{_SHA}", "v3.1")]) == []
+    assert file.stat().st_mtime_ns == mtime
+    assert [path.name for path in tmp_path.iterdir()] == ["ci.yml"]
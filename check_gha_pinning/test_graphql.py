@@ -0,0 +1,207 @@
+import http.server
+import json
+import pathlib
+import sys
+import threading
+from collections.abc import Iterator
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from check_gha_pinning import (
+    GraphQLBackend,
+    TagResolver,
+    _CircuitOpenError,
+    _LookupFailedError,
+    _RepoHasNoTagsError,
+    _action_tags,
+    _RepoNotFoundError,
+    check_pinning,
+)
+from check_gha_pinning import main as check_gha_pinning_main
+from check_gha_pinning._cache import DiskCache
+from check_gha_pinning._graphql import GraphQLClient, GraphQLError
+from check_gha_pinning._stats import collect_stats
+
+_SHA = "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d"
+_OTHER_SHA = "0a5c61591373683505ea898e09a3ea4f39ef2b9c"
+
+
+class _GitHub(http.server.ThreadingHTTPServer):
+    """Answers the tag queries of `GraphQLClient` from `repos`: repo -> tag -> (commit, annotated)."""
+
+    daemon_threads = True
+
+    def __init__(self, repos: dict[str, dict[str, tuple[str, bool]]]) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.repos = repos
+        self.requests: list[dict] = []
+        self.connections = 0
+        self.status = 200
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/graphql"
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: _GitHub
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(payload)
+        variables = payload["variables"]
+        data: dict = {}
+        errors = []
+        i = 0
+        while f"owner{i}" in variables:
+            repo = f"{variables[f'owner{i}']}/{variables[f'name{i}']}"
+            if repo not in self.server.repos:
+                data[f"r{i}"] = None
+                errors.append({"type": "NOT_FOUND", "path": [f"r{i}"], "message": f"Could not resolve {repo}"})
+            else:
+                tags = sorted(self.server.repos[repo])
+                start = int(variables[f"after{i}"] or 0)
+                nodes = []
+                for tag in tags[start : start + 100]:
+                    sha, annotated = self.server.repos[repo][tag]
+                    target = {"oid": "1" * 40, "target": {"oid": sha}} if annotated else {"oid": sha}
+                    nodes.append({"name": tag, "target": target})
+                page_info = {"hasNextPage": start + 100 < len(tags), "endCursor": str(start + 100)}
+                data[f"r{i}"] = {"refs": {"pageInfo": page_info, "nodes": nodes}}
+            i += 1
+        body = json.dumps({"data": data, "errors": errors} if errors else {"data": data}).encode()
+        self.send_response(self.server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def github() -> Iterator[_GitHub]:
+    repos = {
+        "actions/checkout": {"v3": (_SHA, False), "v3.1": (_SHA, True), "v3.10": (_OTHER_SHA, False)},
+        "example/empty": {},
+        "example/many-tags": {f"v1.{i}": (_OTHER_SHA, False) for i in range(250)},
+    }
+    for i in range(60):
+        repos[f"org/repo{i}"] = {"v1": (_SHA, False)}
+    server = _GitHub(repos)
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_tags(github: _GitHub):
+    client = GraphQLClient(github.url)
+    assert client.fetch_tags(["actions/checkout", "example/missing", "example/empty"]) == [
+        ("ok", {"v3": _SHA, "v3.1": _SHA, "v3.10": _OTHER_SHA}),
+        ("not-found", {}),
+        ("no-tags", {}),
+    ]
+    assert len(github.requests) == 1
+
+    (status, tags), *_ = client.fetch_tags(["example/many-tags", "org/repo0"])
+    assert len(tags) == 250
+    assert len(github.requests) == 4
+    assert github.connections == 1
+
+
+def test_fetch_tags_batches(github: _GitHub):
+    client = GraphQLClient(github.url)
+    results = client.fetch_tags([f"org/repo{i}" for i in range(60)])
+    assert results == [("ok", {"v1": _SHA})] * 60
+    assert [len(request["variables"]) // 3 for request in github.requests] == [50, 10]
+    assert github.connections == 1
+
+
+def test_fetch_tags_http_error(github: _GitHub):
+    github.status = 401
+    with pytest.raises(GraphQLError, match="HTTP 401"):
+        GraphQLClient(github.url).fetch_tags(["actions/checkout"])
+
+
+def test_graphql_backend_reconnects(github: _GitHub):
+    client = GraphQLClient(github.url)
+    client.fetch_tags(["actions/checkout"])
+    # Closing the pooled connection on the client's side is like the server closing an idle connection.
+    client._pool._idle.queue[0].sock.close()
+    client.fetch_tags(["actions/checkout"])
+    assert github.connections == 2
+
+
+def test_tag_resolver_graphql(github: _GitHub):
+    resolver = TagResolver(backend=GraphQLBackend(GraphQLClient(github.url)))
+    actions = ["actions/checkout@v3", "example/missing@v1", "example/empty@v1"]
+    actions += [f"org/repo{i}@v1" for i in range(60)]
+    with collect_stats() as stats:
+        resolver.prefetch(actions)
+        assert resolver.get_action_tags("actions/checkout@v3").by_sha[_SHA] == ["v3", "v3.1"]
+        with pytest.raises(_RepoNotFoundError):
+            resolver.get_action_tags("example/missing@v1")
+        with pytest.raises(_RepoHasNoTagsError):
+            resolver.get_action_tags("example/empty@v1")
+        for i in range(60):
+            assert resolver.get_action_tags(f"org/repo{i}@v1").by_tag == {"v1": _SHA}
+    resolver.close()
+    assert stats.counters["http_requests"] == 2
+    assert stats.counters["http_connections"] <= 2
+
+
+def test_check_pinning_graphql(github: _GitHub, tmp_path: pathlib.Path):
+    file = tmp_path / "workflow.yml"
+    file.write_text("jobs:\n  a:\n    steps:\n      - uses: actions/checkout@v3\n      - uses: actions/checkout@v4\n")
+    resolver = TagResolver(backend=GraphQLBackend(GraphQLClient(github.url)))
+    assert check_pinning(file, resolver) == [
+        f"{file}:4: actions/checkout@v3 is not pinned to commit (should be {_SHA} # v3.1)",
+        f"{file}:5: actions/checkout@v4: tag v4 not found",
+    ]
+
+
+def test_main_graphql(github: _GitHub, tmp_path: pathlib.Path, monkeypatch, capsys):
+    monkeypatch.setenv("GHA_PINNING_CACHE_DIR", str(tmp_path / "cache"))
+    for i in range(3):
+        (tmp_path / f"{i}.yml").write_text(f"jobs:\n  a:\n    uses: org/repo{i}/.github/workflows/w.yml@v1\n")
+    argv = ["check_gha_pinning", "--backend", "graphql", "--graphql-url", github.url, str(tmp_path)]
+    with patch.object(sys, "argv", argv):
+        assert check_gha_pinning_main() == 1
+    assert capsys.readouterr().out.splitlines() == [
+        f"{tmp_path / f'{i}.yml'}:3: org/repo{i}/.github/workflows/w.yml@v1 is not pinned to commit "
+        f"(should be {_SHA} # v1)"
+        for i in range(3)
+    ]
+    assert len(github.requests) == 1
+
+
+def test_tag_resolver_graphql_unavailable(github: _GitHub):
+    github.status = 502
+    resolver = TagResolver(backend=GraphQLBackend(GraphQLClient(github.url)), retries=1, max_failures=1, backoff=0)
+    resolver.prefetch(["actions/checkout@v3", "org/repo0@v1"])
+    with pytest.raises(_LookupFailedError, match="HTTP 502"):
+        resolver.get_action_tags("actions/checkout@v3")
+    with pytest.raises(_CircuitOpenError, match="gave up on 127.0.0.1"):
+        resolver.get_action_tags("org/repo1@v1")
+    assert len(github.requests) == 2
+
+
+@patch("check_gha_pinning._get_action_tags")
+def test_tag_cache_is_per_backend(mock__get_action_tags: MagicMock, github: _GitHub, tmp_path: pathlib.Path):
+    cache = DiskCache("tags", directory=tmp_path)
+    TagResolver(cache, backend=GraphQLBackend(GraphQLClient(github.url))).get_action_tags("actions/checkout@v3")
+    # The GraphQL backend doesn't list branches, its results would hide them from the git backend.
+    mock__get_action_tags.return_value = _action_tags({"v3": _SHA}, {"main": _OTHER_SHA})
+    assert TagResolver(cache).get_action_tags("actions/checkout@main").by_branch == {"main": _OTHER_SHA}
+    mock__get_action_tags.assert_called_once()
+    TagResolver(cache, backend=GraphQLBackend(GraphQLClient(github.url))).get_action_tags("actions/checkout@v3")
+    assert len(github.requests) == 1
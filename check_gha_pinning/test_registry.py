@@ -0,0 +1,210 @@
+import hashlib
+import http.server
+import json
+import pathlib
+import sys
+import threading
+from collections.abc import Iterator
+from unittest.mock import patch
+
+import pytest
+
+from check_gha_pinning import TagResolver, _ImageNotFoundError, _LookupFailedError, check_pinning
+from check_gha_pinning import main as check_gha_pinning_main
+from check_gha_pinning._registry import (
+    DOCKER_HUB,
+    ImageNotFoundError,
+    ImageReference,
+    RegistryClient,
+    RegistryError,
+    parse_image,
+)
+
+_MANIFEST = json.dumps({"schemaVersion": 2, "mediaType": "application/vnd.oci.image.index.v1+json"}).encode()
+_DIGEST = f"sha256:{hashlib.sha256(_MANIFEST).hexdigest()}"
+_TOKEN = "anonymous-pull-token"
+
+
+class _Registry(http.server.ThreadingHTTPServer):
+    """Serves `_MANIFEST` for the `images` (repository -> tags), to clients with a token from its `/token` endpoint."""
+
+    daemon_threads = True
+
+    def __init__(self, images: dict[str, list[str]]) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.images = images
+        self.requests: list[str] = []
+        self.connections = 0
+        self.status = 200
+        self.digest_header = True
+        self.token_body = json.dumps({"token": _TOKEN}).encode()
+
+    @property
+    def host(self) -> str:
+        return f"127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: _Registry
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _send(self, status: int, body: bytes = b"", headers: dict[str, str] | None = None) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        self.server.requests.append(f"{self.command} {self.path}")
+        if self.path.startswith("/token?"):
+            self._send(200, self.server.token_body)
+            return
+        if self.server.status != 200:
+            self._send(self.server.status)
+            return
+        repository, _, tag = self.path.removeprefix("/v2/").partition("/manifests/")
+        if self.headers.get("Authorization") != f"Bearer {_TOKEN}":
+            realm = f'Bearer realm="http://{self.server.host}/token",service="registry",scope="repository:{repository}:pull"'
+            self._send(401, headers={"WWW-Authenticate": realm})
+        elif tag not in self.server.images.get(repository, []):
+            self._send(404)
+        else:
+            headers = {"Content-Type": "application/vnd.oci.image.index.v1+json"}
+            if self.server.digest_header:
+                headers["Docker-Content-Digest"] = _DIGEST
+            self._send(200, _MANIFEST, headers)
+
+    do_HEAD = do_GET
+
+
+@pytest.fixture
+def registry() -> Iterator[_Registry]:
+    server = _Registry({"alpine": ["3", "latest"], "org/tool": ["v1"]})
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize(
+    "image, expected",
+    [
+        ("alpine", ImageReference(DOCKER_HUB, "library/alpine", "latest")),
+        ("alpine:3.19", ImageReference(DOCKER_HUB, "library/alpine", "3.19")),
+        ("docker.io/org/tool:v1", ImageReference(DOCKER_HUB, "org/tool", "v1")),
+        ("org/tool", ImageReference(DOCKER_HUB, "org/tool", "latest")),
+        ("ghcr.io/org/tool:v1", ImageReference("ghcr.io", "org/tool", "v1")),
+        ("localhost:5000/tool", ImageReference("localhost:5000", "tool", "latest")),
+        ("localhost/tool:1", ImageReference("localhost", "tool", "1")),
+    ],
+)
+def test_parse_image(image: str, expected: ImageReference):
+    assert parse_image(image) == expected
+
+
+def test_registry_client(registry: _Registry):
+    client = RegistryClient()
+    assert client.digest(f"{registry.host}/alpine:3") == _DIGEST
+    assert client.digest(f"{registry.host}/org/tool:v1") == _DIGEST
+    with pytest.raises(ImageNotFoundError, match="alpine:2 not found"):
+        client.digest(f"{registry.host}/alpine:2")
+    # The token is only requested once per repository, and every request went over the same connection.
+    assert registry.requests.count("GET /token?service=registry&scope=repository%3Aalpine%3Apull") == 1
+    assert len(registry.requests) == 7
+    assert registry.connections == 1
+    client.close()
+
+
+def test_registry_client_without_digest_header(registry: _Registry):
+    registry.digest_header = False
+    assert RegistryClient().digest(f"{registry.host}/alpine") == _DIGEST
+    assert registry.requests[-1] == "GET /v2/alpine/manifests/latest"
+
+
+def test_registry_client_unavailable(registry: _Registry):
+    registry.status = 503
+    with pytest.raises(RegistryError, match="HTTP 503"):
+        RegistryClient().digest(f"{registry.host}/alpine:3")
+    with pytest.raises(RegistryError, match="request to 127.0.0.1:1 failed"):
+        RegistryClient().digest("127.0.0.1:1/alpine:3")
+
+
+@pytest.mark.parametrize(
+    "body, message",
+    [(b"<html>", "returned invalid JSON"), (b"[]", "returned invalid JSON"), (b"{}", "returned no token")],
+)
+def test_registry_client_invalid_token_response(registry: _Registry, tmp_path: pathlib.Path, body: bytes, message: str):
+    registry.token_body = body
+    with pytest.raises(RegistryError, match=message):
+        RegistryClient().digest(f"{registry.host}/alpine:3")
+    # Reported like an unavailable registry instead of ending the run.
+    file = tmp_path / "workflow.yml"
+    file.write_text(f"jobs:\n  a:\n    steps:\n      - uses: docker://{registry.host}/alpine:3\n")
+    [problem] = check_pinning(file, TagResolver(registry=RegistryClient()))
+    assert problem.endswith(
+        f"is not pinned to sha256 (digest not looked up: token request to http://{registry.host}/token {message})"
+    )
+
+
+def test_tag_resolver_digests(registry: _Registry, tmp_path: pathlib.Path):
+    file = tmp_path / "workflow.yml"
+    file.write_text(f"""\
+jobs:
+  a:
+    steps:
+      - uses: docker://{registry.host}/alpine:3
+      - uses: docker://{registry.host}/alpine:3
+      - uses: docker://{registry.host}/alpine:2
+      - uses: docker://{registry.host}/alpine@3
+""")
+    resolver = TagResolver(registry=RegistryClient())
+    assert check_pinning(file, resolver) == [
+        *(
+            f"{file}:{line}: docker://{registry.host}/alpine:3 is not pinned to sha256 (should be {_DIGEST} # 3)"
+            for line in (4, 5)
+        ),
+        f"{file}:6: docker://{registry.host}/alpine:2: alpine:2 not found on {registry.host}",
+        f"{file}:7: docker://{registry.host}/alpine@3 is not pinned to sha256",
+    ]
+    with pytest.raises(_ImageNotFoundError):
+        resolver.get_image_digest(f"{registry.host}/alpine:2")
+    # Each image is looked up once.
+    assert len([request for request in registry.requests if request.startswith("HEAD")]) == 3
+
+    registry.status = 503
+    with pytest.raises(_LookupFailedError, match="HTTP 503"):
+        TagResolver(registry=RegistryClient()).get_image_digest(f"{registry.host}/alpine:3")
+
+
+def test_main_resolve_digests(registry: _Registry, tmp_path: pathlib.Path, monkeypatch, capsys):
+    monkeypatch.setenv("GHA_PINNING_CACHE_DIR", str(tmp_path / "cache"))
+    file = tmp_path / "ci.yml"
+    file.write_text(f"jobs:\n  a:\n    steps:\n      - uses: docker://{registry.host}/org/tool:v1\n")
+
+    def run(*args: str) -> int:
+        with patch.object(sys, "argv", ["check_gha_pinning", "--resolve-digests", *args, str(file)]):
+            return check_gha_pinning_main()
+
+    assert run() == 1
+    assert capsys.readouterr().out == (
+        f"{file}:4: docker://{registry.host}/org/tool:v1 is not pinned to sha256 (should be {_DIGEST} # v1)\n"
+    )
+    # The digest is cached per image:tag like the tags of repos.
+    requests = len(registry.requests)
+    assert run("--fix") == 0
+    assert len(registry.requests) == requests
+    assert (
+        file.read_text() == f"jobs:\n  a:\n    steps:\n      - uses: docker://{registry.host}/org/tool@{_DIGEST} # v1\n"
+    )
+    assert run() == 0
@@ -0,0 +1,209 @@
+import pathlib
+
+import pytest
+import ruamel.yaml
+
+from check_gha_pinning import IGNORE_PRAGMA, _load_uses, check_pinning
+from check_gha_pinning._scan import scan_uses
+
+_WORKFLOW = """\
+name: CI
+on:
+  push:
+    branches: [main]
+  pull_request:
+
+env:
+  FOO: "bar # not a comment"
+
+jobs:
+  # The reusable workflow
+  call:
+    uses: org/repo/.github/workflows/wf.yml@v1
+    with:
+      config: '{"a": 1}'
+    secrets: inherit
+  build:
+    runs-on: ${{ matrix.os }}
+    strategy:
+      matrix:
+        os: [ubuntu-latest, windows-latest]
+    steps:
+    - uses: actions/checkout@v4
+    - name: Setup
+      uses: actions/setup-python@0a5c61591373683505ea898e09a3ea4f39ef2b9c # v5.0.0
+      with:
+        python-version: "3.12"
+    - run: |
+        echo "uses: fake/action@v1"
+        - uses: not/a-step@v1
+
+    - uses: docker://alpine:3.18
+    -   uses: "quoted/action@v2"
+    - uses: 'single/quoted@v3'  # comment
+    - uses: ./local/action
+  test:
+    needs: [build]
+    steps:
+      -
+        uses: nested/item@v1
+      - run: >-
+          folded
+          text
+        uses: after/block@v1
+"""
+
+# Documents the scanner handles itself, so both engines have to find exactly the same entries.
+SCANNED = {
+    "workflow": _WORKFLOW,
+    "crlf": _WORKFLOW.replace("\n", "\r\n"),
+    "bom": "\ufeff" + _WORKFLOW,
+    "document start": "---\n" + _WORKFLOW,
+    "empty": "",
+    "comments only": "# nothing here\n",
+    "no jobs": "on: push\nname: x\n",
+    "top-level list": "- a\n- b\n",
+    "pragma": """\
+jobs:
+  a:
+    steps:
+      - uses: actions/checkout@v4 # noqa: gha-pinning
+      - uses: actions/checkout@v4  #noqa: gha-pinning  # <-- allowed
+      - uses: actions/checkout@v3
+""",
+    "job without steps": "jobs:\n  a:\n    runs-on: x\n",
+    "flow value outside jobs tree": "jobs:\n  a:\n    with: {a: b, c: [d, e]}\n    uses: org/wf/x.yml@v1\n",
+    "indented sequence": "jobs:\n  a:\n    steps:\n        - uses: a/b@v1\n        - uses: c/d@v1\n",
+    "value with hash": "jobs:\n  a:\n    steps:\n      - uses: a/b@v1#not-a-comment\n",
+    "empty block scalar": "jobs:\n  a:\n    steps:\n      - run: |\n      - uses: a/b@v1\n",
+    "nested sequence": "jobs:\n  a:\n    steps:\n      - uses: a/b@v1\n        with:\n          list:\n            - - x\n              - y\n",
+    "trailing whitespace": "jobs:  \n  a:\n    steps:   \n      - uses: a/b@v1   \n",
+    "tab in comment": "jobs:\n  a:\n    steps:\n      - uses: a/b@v1 # c\td\n",
+    "tab in quoted scalar": 'jobs:\n  a:\n    steps:\n      - uses: "a/b@v1\tx"\n',
+    "composite action": """\
+name: My action
+runs:
+  using: composite
+  steps:
+    - run: echo hi
+      shell: bash
+    - uses: actions/checkout@v4
+    - uses: actions/cache@v4 # noqa: gha-pinning
+""",
+    "javascript action": "runs:\n  using: node20\n  main: index.js\n",
+    "composite action without steps": "runs:\n  using: composite\n  steps:\n",
+}
+
+# Documents the scanner leaves to ruamel, either because ruamel has to report an error or because the scanner can't
+# decide which entries are ignored.
+FALLBACK = {
+    "flow step": "jobs:\n  a:\n    steps:\n      - {uses: a/b@v1}\n",
+    "flow steps": "jobs:\n  a:\n    steps: [{uses: a/b@v1}]\n",
+    "flow jobs": "jobs: {a: {uses: a/b@v1}}\n",
+    "anchor": "jobs:\n  a: &a\n    uses: a/b@v1\n  b: *a\n",
+    "merge key": "x: &x\n  uses: a/b@v1\njobs:\n  a:\n    <<: *x\n",
+    "tag": "jobs:\n  a:\n    uses: !!str a/b@v1\n",
+    "multi-line plain scalar": "jobs:\n  a:\n    uses: a/b@v1\n      continued\n",
+    "multi-line quoted scalar": 'jobs:\n  a:\n    uses: "a/b@v1\n      continued"\n',
+    "multi-line flow": "jobs:\n  a:\n    with: {a: b,\n      c: d}\n    uses: a/b@v1\n",
+    "block scalar uses": "jobs:\n  a:\n    uses: |\n      a/b@v1\n",
+    "escaped uses": 'jobs:\n  a:\n    uses: "a/b\\x40v1"\n',
+    "numeric uses": "jobs:\n  a:\n    uses: 1.5\n",
+    "null uses": "jobs:\n  a:\n    uses:\n",
+    "duplicate key": "jobs:\n  a:\n    uses: a/b@v1\n    uses: c/d@v1\n",
+    "pragma on other line": "jobs:\n  a:\n    steps:\n      - uses: a/b@v1\n        # noqa: gha-pinning\n      - uses: c/d@v1\n",
+    "pragma on other key": "jobs:\n  a:\n    steps:\n      - uses: a/b@v1\n        name: x # noqa: gha-pinning\n",
+    "pragma before step": "jobs:\n  a:\n    steps:\n      -\n        # noqa: gha-pinning\n        uses: a/b@v1\n",
+    "tab indentation": "jobs:\n\ta:\n\t\tuses: a/b@v1\n",
+    "bad indentation": "jobs:\n  a:\n    uses: a/b@v1\n   name: x\n",
+    "mapping in scalar": "jobs:\n  a:\n    uses: a/b@v1: x\n",
+    "trailing tab": "jobs:\n  a:\n    steps:\n      - uses: foo/bar@v1\t\n",
+    "tab before comment": "jobs:\n  a:\n    steps:\n      - uses: foo/bar@v1 \t# c\n",
+    "tab in plain scalar": "jobs:\n  a:\n    steps:\n      - uses: foo\tbar@v1\n",
+    "tab after quoted scalar": 'jobs:\n  a:\n    steps:\n      - uses: "foo/bar@v1"\t\n',
+    "tab after flow collection": "jobs:\n  a:\n    steps:\n      - uses: a/b@v1\n        with: {a: b}\t\n",
+    "tab after other value": "jobs:\n  a:\n    steps:\n      - uses: a/b@v1\n        name: x\t\n",
+    "jobs is a list": "jobs:\n  - uses: a/b@v1\n",
+    "job is a string": "jobs:\n  a: uses\n",
+    "steps is null": "jobs:\n  a:\n    steps:\n",
+    "string step": "jobs:\n  a:\n    steps:\n      - uses\n",
+    "second document": "jobs: {}\n---\njobs: {}\n",
+    "directive": "%YAML 1.2\n---\njobs:\n  a:\n    uses: a/b@v1\n",
+    "block scalar indentation indicator": "jobs:\n  a:\n    steps:\n      - run: |2\n          x\n        uses: a/b@v1\n",
+    "quoted key": 'jobs:\n  a:\n    "uses": a/b@v1\n',
+    "invalid": "jobs:\n  a: [\n",
+    "composite string step": "runs:\n  using: composite\n  steps:\n    - uses\n",
+    "numeric using": "runs:\n  using: 1\n  steps:\n    - uses: a/b@v1\n",
+}
+
+
+def _ruamel_uses(file: pathlib.Path) -> list | str:
+    try:
+        return [(line, str(action)) for line, action in _load_uses(file, "ruamel")]
+    except ruamel.yaml.YAMLError as ex:
+        return f"error: {type(ex).__name__}"
+    except (AttributeError, TypeError) as ex:
+        return f"crash: {type(ex).__name__}"
+
+
+def _fast_uses(file: pathlib.Path) -> list | str:
+    try:
+        return [(line, str(action)) for line, action in _load_uses(file, "fast")]
+    except ruamel.yaml.YAMLError as ex:
+        return f"error: {type(ex).__name__}"
+    except (AttributeError, TypeError) as ex:
+        return f"crash: {type(ex).__name__}"
+
+
+@pytest.mark.parametrize("text", SCANNED.values(), ids=SCANNED.keys())
+def test_scanned_parity(tmp_path: pathlib.Path, text: str):
+    file = tmp_path / "workflow.yml"
+    file.write_bytes(text.encode())
+    found = scan_uses(text, IGNORE_PRAGMA)
+    assert found is not None
+    assert found == _ruamel_uses(file)
+    assert _fast_uses(file) == _ruamel_uses(file)
+
+
+@pytest.mark.parametrize("text", FALLBACK.values(), ids=FALLBACK.keys())
+def test_fallback_parity(tmp_path: pathlib.Path, text: str):
+    file = tmp_path / "workflow.yml"
+    file.write_bytes(text.encode())
+    assert scan_uses(text, IGNORE_PRAGMA) is None
+    assert _fast_uses(file) == _ruamel_uses(file)
+
+
+def test_scan_workflow():
+    assert scan_uses(_WORKFLOW, IGNORE_PRAGMA) == [
+        (13, "org/repo/.github/workflows/wf.yml@v1"),
+        (23, "actions/checkout@v4"),
+        (24, "actions/setup-python@0a5c61591373683505ea898e09a3ea4f39ef2b9c"),
+        (32, "docker://alpine:3.18"),
+        (33, "quoted/action@v2"),
+        (34, "single/quoted@v3"),
+        (35, "./local/action"),
+        (40, "nested/item@v1"),
+        (41, "after/block@v1"),
+    ]
+
+
+def test_repo_workflows_parity():
+    for file in (pathlib.Path(__file__).parent.parent / ".github").rglob("*.yml"):
+        assert scan_uses(file.read_text(), IGNORE_PRAGMA) is not None
+        assert _fast_uses(file) == _ruamel_uses(file)
+
+
+@pytest.mark.parametrize("engine", ["ruamel", "fast"])
+def test_check_pinning_engine(tmp_path: pathlib.Path, engine: str, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("GHA_PINNING_SKIP_GIT_CHECK", "1")
+    file = tmp_path / "workflow.yml"
+    file.write_text(_WORKFLOW)
+    assert check_pinning(file, engine=engine) == [
+        f"{file}:13: org/repo/.github/workflows/wf.yml@v1 is not pinned to commit",
+        f"{file}:23: actions/checkout@v4 is not pinned to commit",
+        f"{file}:32: docker://alpine:3.18 is not pinned to sha256",
+        f"{file}:33: quoted/action@v2 is not pinned to commit",
+        f"{file}:34: single/quoted@v3 is not pinned to commit",
+        f"{file}:40: nested/item@v1 is not pinned to commit",
+        f"{file}:41: after/block@v1 is not pinned to commit",
+    ]
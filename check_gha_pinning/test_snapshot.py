@@ -0,0 +1,184 @@
+import pathlib
+import sqlite3
+import subprocess
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from check_gha_pinning import (
+    ActionTags,
+    SnapshotBackend,
+    TagResolver,
+    _LookupFailedError,
+    _NotInSnapshotError,
+    _RepoHasNoTagsError,
+    _RepoNotFoundError,
+    check_pinning,
+)
+from check_gha_pinning import main as check_gha_pinning_main
+from check_gha_pinning._snapshot import (
+    STATUS_NO_TAGS,
+    STATUS_NOT_FOUND,
+    STATUS_OK,
+    Snapshot,
+    SnapshotError,
+    write_snapshot,
+)
+
+_SHA = "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d"
+_OTHER_SHA = "0a5c61591373683505ea898e09a3ea4f39ef2b9c"
+
+_ENTRIES = [
+    ("https://github.com/actions/checkout", STATUS_OK, {"v3": _SHA, "v3.1": _SHA, "v3.10": _OTHER_SHA, "v30": _SHA}),
+    ("https://github.com/example/missing", STATUS_NOT_FOUND, {}),
+    ("https://github.com/example/empty", STATUS_NO_TAGS, {}),
+]
+
+
+@pytest.fixture
+def snapshot(tmp_path: pathlib.Path) -> Snapshot:
+    write_snapshot(tmp_path / "snapshot.db", _ENTRIES)
+    return Snapshot(tmp_path / "snapshot.db")
+
+
+def test_snapshot_lookup(snapshot: Snapshot):
+    assert snapshot.lookup("https://github.com/actions/checkout") == (STATUS_OK, _ENTRIES[0][2])
+    assert snapshot.lookup("https://github.com/example/missing") == (STATUS_NOT_FOUND, {})
+    assert snapshot.lookup("https://github.com/actions/cache") is None
+
+
+def test_snapshot_write_is_atomic(tmp_path: pathlib.Path):
+    path = tmp_path / "snapshot.db"
+    write_snapshot(path, _ENTRIES)
+
+    def entries():
+        yield _ENTRIES[0]
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        write_snapshot(path, entries())
+    assert Snapshot(path).lookup("https://github.com/example/empty") == (STATUS_NO_TAGS, {})
+    assert [p.name for p in tmp_path.iterdir()] == ["snapshot.db"]
+
+
+def test_snapshot_invalid(tmp_path: pathlib.Path):
+    with pytest.raises(SnapshotError):
+        Snapshot(tmp_path / "missing.db")
+    (tmp_path / "garbage.db").write_text("not a database")
+    with pytest.raises(SnapshotError):
+        Snapshot(tmp_path / "garbage.db")
+    with sqlite3.connect(tmp_path / "old.db") as db:
+        db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        db.execute("INSERT INTO meta VALUES ('version', '0')")
+    with pytest.raises(SnapshotError, match="unsupported format"):
+        Snapshot(tmp_path / "old.db")
+
+
+@patch("subprocess.check_output")
+def test_tag_resolver_snapshot(mock_check_output: MagicMock, snapshot: Snapshot):
+    resolver = TagResolver(backend=SnapshotBackend(snapshot))
+    assert resolver.get_action_tags("actions/checkout@v3").by_sha[_SHA][:2] == ["v3", "v3.1"]
+    with pytest.raises(_RepoNotFoundError):
+        resolver.get_action_tags("example/missing@v1")
+    with pytest.raises(_RepoHasNoTagsError):
+        resolver.get_action_tags("example/empty@v1")
+    with pytest.raises(_NotInSnapshotError, match="not in snapshot"):
+        resolver.get_action_tags("actions/cache@v4")
+    mock_check_output.assert_not_called()
+
+
+@patch("subprocess.check_output")
+def test_check_pinning_snapshot(mock_check_output: MagicMock, snapshot: Snapshot, tmp_path: pathlib.Path):
+    file = tmp_path / "workflow.yml"
+    file.write_text("jobs:\n  a:\n    steps:\n      - uses: actions/checkout@v3\n      - uses: actions/cache@v4\n")
+    assert check_pinning(file, TagResolver(backend=SnapshotBackend(snapshot))) == [
+        f"{file}:4: actions/checkout@v3 is not pinned to commit (should be {_SHA} # v3.1)",
+        f"{file}:5: actions/cache@v4: repo https://github.com/actions/cache is not in snapshot {snapshot.path}",
+    ]
+    mock_check_output.assert_not_called()
+
+
+@patch("check_gha_pinning._get_action_tags")
+def test_main_snapshot(mock__get_action_tags: MagicMock, tmp_path: pathlib.Path, monkeypatch, capsys):
+    monkeypatch.setenv("GHA_PINNING_CACHE_DIR", str(tmp_path / "cache"))
+
+    def get_action_tags(action: str, timeout: float | None = None) -> ActionTags:
+        if action.startswith("example/missing"):
+            raise _RepoNotFoundError("not found")
+        return ActionTags({"v3": _SHA, "v3.1": _SHA}, {_SHA: ["v3", "v3.1"]})
+
+    mock__get_action_tags.side_effect = get_action_tags
+    workflows = tmp_path / "workflows"
+    workflows.mkdir()
+    (workflows / "ci.yml").write_text(f"""\
+jobs:
+  a:
+    uses: example/missing/.github/workflows/x.yml@v1
+    steps:
+      - uses: actions/checkout@v3
+      - uses: actions/checkout@v3.1
+      - uses: actions/setup-python@{_SHA}
+      - uses: ./local
+      - uses: docker://alpine@sha256:{"0" * 64}
+""")
+    output = tmp_path / "snapshot.db"
+    argv = ["check_gha_pinning", "snapshot", "-o", str(output), "--repo", "actions/cache", str(workflows)]
+    with patch.object(sys, "argv", argv):
+        assert check_gha_pinning_main() == 0
+    assert capsys.readouterr().out == f"Saved the tags of 4 repos to {output}\n"
+    assert sorted(c.args[0].split("@")[0] for c in mock__get_action_tags.call_args_list) == [
+        "actions/cache",
+        "actions/checkout",
+        "actions/setup-python",
+        "example/missing/.github/workflows/x.yml",
+    ]
+
+    mock__get_action_tags.reset_mock()
+    monkeypatch.setenv("GHA_PINNING_SNAPSHOT", str(output))
+    with patch.object(sys, "argv", ["check_gha_pinning", str(workflows)]):
+        assert check_gha_pinning_main() == 1
+    mock__get_action_tags.assert_not_called()
+    assert capsys.readouterr().out.splitlines() == [
+        f"{workflows / 'ci.yml'}:3: example/missing/.github/workflows/x.yml@v1: "
+        "repo https://github.com/example/missing not found",
+        f"{workflows / 'ci.yml'}:5: actions/checkout@v3 is not pinned to commit (should be {_SHA} # v3.1)",
+        f"{workflows / 'ci.yml'}:6: actions/checkout@v3.1 is not pinned to commit (should be {_SHA} # v3.1)",
+    ]
+
+
+def test_main_snapshot_invalid(tmp_path: pathlib.Path, capsys):
+    with patch.object(sys, "argv", ["check_gha_pinning", "--snapshot", str(tmp_path / "missing.db")]):
+        with pytest.raises(SystemExit) as ex:
+            check_gha_pinning_main()
+    assert ex.value.code == 2
+    assert "can't read snapshot" in capsys.readouterr().err
+
+
+@patch("time.sleep")
+@patch("check_gha_pinning._get_action_tags")
+def test_main_snapshot_failed_lookups(
+    mock__get_action_tags: MagicMock, mock_sleep: MagicMock, tmp_path: pathlib.Path, capsys
+):
+    def get_action_tags(action: str, timeout: float | None = None) -> ActionTags:
+        if action == "example/offline":
+            raise _LookupFailedError("git ls-remote failed: Could not resolve host: github.com")
+        if action == "example/broken":
+            raise subprocess.CalledProcessError(1, ["git", "ls-remote"])
+        return ActionTags({"v3": _SHA}, {_SHA: ["v3"]})
+
+    mock__get_action_tags.side_effect = get_action_tags
+    output = tmp_path / "snapshot.db"
+    repos = ["--repo", "actions/checkout", "--repo", "example/offline", "--repo", "example/broken"]
+    with patch.object(sys, "argv", ["check_gha_pinning", "snapshot", "-o", str(output), *repos, str(tmp_path)]):
+        assert check_gha_pinning_main() == 1
+    out, err = capsys.readouterr()
+    assert out == f"Saved the tags of 1 repos to {output}\n"
+    assert "The tags of 2 repos couldn't be looked up" in err
+    assert "https://github.com/example/offline: git ls-remote failed: Could not resolve host" in err
+    assert "https://github.com/example/broken: Command" in err
+    # Failed lookups are retried like in checks.
+    offline = [c for c in mock__get_action_tags.call_args_list if c.args[0] == "example/offline"]
+    assert len(offline) == 3
+    assert Snapshot(output).lookup("https://github.com/actions/checkout") == (STATUS_OK, {"v3": _SHA})
+    assert Snapshot(output).lookup("https://github.com/example/offline") is None
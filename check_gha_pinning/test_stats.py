@@ -0,0 +1,49 @@
+import json
+import threading
+
+from check_gha_pinning import _stats
+from check_gha_pinning._stats import Stats, collect_stats
+
+
+def test_stats_inactive():
+    _stats.count("files")
+    with _stats.timer("parse"):
+        pass
+    with collect_stats() as stats:
+        pass
+    assert stats.as_dict() == {"phases": {}, "repos": {}, "counters": {}}
+
+
+def test_collect_stats():
+    stats = Stats()
+    with collect_stats(stats) as active:
+        assert active is stats
+        threads = [threading.Thread(target=lambda: [_stats.count("uses") for _ in range(100)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with _stats.timer("parse"):
+            pass
+        _stats.add_repo_latency("https://github.com/a/b", 0.5)
+        _stats.add_repo_latency("https://github.com/a/b", 0.25)
+        with collect_stats() as inner:
+            _stats.count("uses")
+    _stats.count("uses")
+
+    assert stats.counters == {"uses": 400}
+    assert inner.counters == {"uses": 1}
+    assert list(stats.phases) == ["parse"]
+    assert stats.repos == {"https://github.com/a/b": 0.75}
+    assert json.loads(stats.to_json())["counters"] == {"uses": 400}
+    assert str(stats).splitlines()[-3:] == ["  uses: 400", "repo resolution:", "  https://github.com/a/b: 0.750s"]
+
+
+def test_merge():
+    worker = Stats()
+    worker.count("skipped_files", 2)
+    worker.add_time("parse", 0.5)
+    with collect_stats() as stats:
+        _stats.count("skipped_files")
+        _stats.merge(worker.as_dict())
+    assert stats.as_dict() == {"phases": {"parse": 0.5}, "repos": {}, "counters": {"skipped_files": 3}}
@@ -0,0 +1,65 @@
+import pytest
+
+from check_gha_pinning._tags import BranchesByName, TagIndex, TagsBySha, TagsByTag
+
+_A = "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d"
+_B = "7c211433f02071597741e6ff5a8ea34789abbf43"
+
+
+def test_tag_index():
+    index = TagIndex([("v3.1", _A), ("v2", _B), ("v3", _B), ("v3", _A), ("v10", _B)])
+    assert index.count() == 4
+    assert list(index.names()) == ["v10", "v2", "v3", "v3.1"]
+    assert list(index.shas()) == [_B, _A]
+    assert index.sha("v3") == _A
+    assert index.sha("v4") is None
+    assert index.sha("") is None
+    assert index.tags(_A) == ["v3", "v3.1"]
+    assert index.tags(_B) == ["v10", "v2"]
+    assert index.tags("0" * 40) == []
+    assert index.tags("not a sha") == []
+    assert index.tags(_A[:10]) == []
+
+
+def test_tag_index_branches():
+    index = TagIndex([("v1", _A)], [("main", _B), ("release/v1", _A), ("dev", "a" * 40)])
+    assert index.count() == 1
+    assert index.count(branches=True) == 3
+    assert list(index.names(branches=True)) == ["dev", "main", "release/v1"]
+    assert list(index.refs()) == [("v1", _A)]
+    assert list(index.refs(branches=True)) == [("dev", "a" * 40), ("main", _B), ("release/v1", _A)]
+    assert index.sha("main") is None
+    assert index.sha("main", branches=True) == _B
+    assert index.sha("v1", branches=True) is None
+    assert index.tags(_A) == ["v1"]
+    assert index.tags(_A, branches=True) == ["release/v1"]
+    # Commits only pointed to by branches aren't listed with the tags.
+    assert list(index.shas()) == [_A]
+
+    assert index.commits("aaf4c61") == [_A]
+    assert index.commits("7") == [_B]
+    # Short hashes matching several commits are expanded to all of them, also with an odd number of digits.
+    assert index.commits("a") == ["a" * 40, _A]
+    assert index.commits("aa") == ["a" * 40, _A]
+    assert index.commits("aaa") == ["a" * 40]
+    assert index.commits("b") == []
+    assert index.commits("xyz") == []
+
+
+def test_tag_views():
+    index = TagIndex([("v3", _A), ("v3.1", _A), ("v2", _B)])
+    by_tag, by_sha, by_branch = TagsByTag(index), TagsBySha(index), BranchesByName(index)
+    assert by_tag == {"v2": _B, "v3": _A, "v3.1": _A}
+    assert by_sha == {_A: ["v3", "v3.1"], _B: ["v2"]}
+    assert len(by_sha) == 2
+    assert by_tag.get("v1") is None
+    assert "v3.1" in by_tag
+    assert by_sha.get(_A) == ["v3", "v3.1"]
+    with pytest.raises(KeyError):
+        by_sha["0" * 40]
+    assert repr(by_sha) == repr({_B: ["v2"], _A: ["v3", "v3.1"]})
+    assert by_branch == {}
+
+    empty = TagIndex([])
+    assert TagsByTag(empty) == {}
+    assert TagsBySha(empty) == {}
@@ -0,0 +1,48 @@
+import pathlib
+import sys
+
+import pytest
+
+from check_gha_pinning._watch import InotifyWatcher, PollingWatcher, Watcher, watcher
+
+
+@pytest.fixture(params=["inotify", "polling"])
+def make_watcher(request, tmp_path: pathlib.Path):
+    if request.param == "inotify" and not sys.platform.startswith("linux"):
+        pytest.skip("inotify is only available on Linux")
+    watchers = []
+
+    def make() -> Watcher:
+        if request.param == "inotify":
+            watchers.append(InotifyWatcher([tmp_path]))
+        else:
+            watchers.append(PollingWatcher(lambda: sorted(tmp_path.rglob("*.yml")), interval=0.01))
+        return watchers[-1]
+
+    yield make
+    for w in watchers:
+        w.close()
+
+
+def test_watcher(make_watcher, tmp_path: pathlib.Path):
+    (tmp_path / "a.yml").write_text("a")
+    w = make_watcher()
+    assert w.wait(timeout=0.05) == set()
+
+    (tmp_path / "a.yml").write_text("ab")
+    assert tmp_path / "a.yml" in w.wait(timeout=5)
+
+    # Files in new directories are seen as well.
+    (tmp_path / "sub").mkdir()
+    w.wait(timeout=0.05)
+    (tmp_path / "sub" / "b.yml").write_text("b")
+    assert tmp_path / "sub" / "b.yml" in w.wait(timeout=5)
+
+    (tmp_path / "a.yml").unlink()
+    assert tmp_path / "a.yml" in w.wait(timeout=5)
+
+
+def test_watcher_polling(tmp_path: pathlib.Path, monkeypatch):
+    assert isinstance(watcher([tmp_path], list, poll=True), PollingWatcher)
+    monkeypatch.setattr(sys, "platform", "darwin")
+    assert isinstance(watcher([tmp_path], list), PollingWatcher)